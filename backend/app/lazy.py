@@ -0,0 +1,54 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/lazy.py:
+"""
+Imports sob demanda, para que `import app.main` não carregue os stacks pesados de IA
+(numpy, torch, transformers, crewai, guardrails, ...). Routers e lifespan referenciam os serviços
+pelos `LazyModule` definidos no fim deste arquivo; o módulo real só é importado no primeiro acesso
+a um atributo, ou seja, na primeira requisição do endpoint que precisa dele (ou no pré-aquecimento
+do lifespan). Dentro de app/services os imports continuam normais.
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """Proxy para um módulo importado no primeiro acesso a qualquer atributo."""
+
+    def __init__(self, name: str, package: Optional[str] = None):
+        """`name` pode ser relativo (ex: "..services.rag_service") quando `package` é informado."""
+        self._name = name
+        self._package = package
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock: # O pré-aquecimento roda em uma thread e pode concorrer com uma requisição
+                if self._module is None:
+                    self._module = importlib.import_module(self._name, self._package)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyModule '{self._name}' ({'carregado' if self.loaded else 'pendente'})>"
+
+
+
+# Serviços usados pelos routers e pelo lifespan. Nomes relativos ao pacote da app para funcionar
+# tanto com 'app.main' quanto com 'backend.app.main'.
+_SERVICES = f"{__package__}.services"
+rag_service = LazyModule(f"{_SERVICES}.rag_service")
+crew_service = LazyModule(f"{_SERVICES}.crew_service")
+crew_jobs = LazyModule(f"{_SERVICES}.crew_jobs")
+guardrails_service = LazyModule(f"{_SERVICES}.guardrails_service")
+spec_registry = LazyModule(f"{_SERVICES}.spec_registry")
+embedding_service = LazyModule(f"{_SERVICES}.embedding_service")
+resources = LazyModule(f"{_SERVICES}.resources")
+admission = LazyModule(f"{_SERVICES}.admission")
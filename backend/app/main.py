@@ -1,31 +1,24 @@
 # Copie e cole para criar/atualizar o arquivo backend/app/main.py:
-import os
-import sys
+# Este módulo deve continuar barato de importar: os serviços (e seus stacks pesados de IA) são
+# carregados sob demanda via app/lazy.py. tests/test_startup.py impõe esse orçamento.
+import asyncio
+import time
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import PlainTextResponse
 import logging
 from contextlib import asynccontextmanager
-import importlib # Para importar routers dinamicamente
-
-# Adiciona o diretório 'backend' ao sys.path para permitir imports relativos como 'from app...'
-# quando uvicorn é executado da raiz do projeto (ex: uvicorn backend.app.main:app)
-# OU quando executado de dentro de backend/ (ex: uvicorn app.main:app)
-# Ajuste: Usar o diretório pai do arquivo atual (__file__) para mais robustez
-current_dir = os.path.dirname(os.path.abspath(__file__))
-backend_dir = os.path.dirname(current_dir) # Isso deve ser /path/to/atlas/backend
-if backend_dir not in sys.path:
-     sys.path.insert(0, backend_dir)
-     print(f"Adicionado {backend_dir} ao sys.path")
-
-# Carrega variáveis do .env localizado DENTRO da pasta backend
-dotenv_path = os.path.join(backend_dir, '.env') # Caminho correto para backend/.env
-load_dotenv(dotenv_path=dotenv_path)
-print(f"Tentando carregar .env de: {dotenv_path}, Existe: {os.path.exists(dotenv_path)}")
+
+from .settings import get_settings
+from . import telemetry # Só stdlib; o OpenTelemetry é importado apenas com a exportação ativa
+
+# sys.path e os dois arquivos .env (backend/.env e .env.local da raiz) são tratados uma única vez aqui
+settings = get_settings()
 
 # Configura logging básico
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(name)s] - %(message)s')
 logger = logging.getLogger(__name__) # Logger para este módulo
+logger.info(f"Configuração carregada de: {settings.backend_dotenv_path}, Existe: {settings.backend_dotenv_found}")
 
 # --- Importação de Routers ---
 # Tenta importar os routers definidos. Se falhar, a API ainda funciona, mas sem esses endpoints.
@@ -41,21 +34,49 @@ except Exception as e:
     logger.error(f"Erro inesperado ao importar routers: {e}", exc_info=True)
 
 
+async def _prewarm() -> None:
+    """
+    Pré-aquecimento em segundo plano: importa os stacks pesados em uma thread (sem bloquear o
+    event loop nem atrasar o startup), abre o índice vetorial local e compila as specs Guardrails.
+    Depois segue como watcher do hot reload das specs.
+    """
+    from . import lazy
+    started = time.perf_counter()
+    for service in (lazy.rag_service, lazy.guardrails_service, lazy.spec_registry):
+        await asyncio.to_thread(service.load)
+    # Specs Guardrails compiladas uma vez; o watcher recompila arquivos alterados (hot reload)
+    registry = await asyncio.to_thread(lazy.spec_registry.get_registry)
+    # O índice vetorial local carrega em segundo plano; até terminar, /rag-query responde 503
+    await lazy.rag_service.initialize_vector_store()
+    logger.info(f"Pré-aquecimento concluído em {time.perf_counter() - started:.2f}s.")
+    if lazy.spec_registry.RELOAD_INTERVAL_SECONDS > 0:
+        await registry.watch()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Código de inicialização (ex: carregar modelos, conectar DBs)
     logger.info("API Iniciando...")
     # TODO Fase 7: Adicionar inicialização de serviços (LLMs, Vector DBs) aqui
-    # Ex: await rag_service.initialize_vector_store(), crew_service.initialize_llm()
-    openai_key_present = os.getenv("OPENAI_API_KEY") is not None and len(os.getenv("OPENAI_API_KEY", "")) > 5
-    supabase_conn_present = os.getenv("SUPABASE_DB_CONNECTION_STRING") is not None and "postgres:" in os.getenv("SUPABASE_DB_CONNECTION_STRING", "")
-    logger.info(f"Verificação de chaves: OpenAI Key Presente? {openai_key_present}, Supabase Conn String Presente? {supabase_conn_present}")
-    if not openai_key_present:
+    # Ex: crew_service.initialize_llm()
+    from . import lazy
+    # Pool Postgres e cliente HTTP compartilhados, com conexões já aquecidas antes do primeiro request
+    await lazy.resources.get_resources()
+    # Workers da fila de Crews; retomam jobs que estavam pendentes antes do reinício
+    await lazy.crew_jobs.get_job_manager()
+    # Sem APP_PREWARM, cada stack carrega na primeira requisição que precisar dele (e sem hot reload de specs)
+    prewarm_task = asyncio.create_task(_prewarm()) if settings.prewarm else None
+    logger.info(f"Verificação de chaves: OpenAI Key Presente? {settings.openai_key_present}, Supabase Conn String Presente? {settings.supabase_conn_present}")
+    if not settings.openai_key_present:
         logger.warning("Chave OPENAI_API_KEY não encontrada ou muito curta no .env!")
-    if not supabase_conn_present:
+    if not settings.supabase_conn_present:
          logger.warning("String de conexão SUPABASE_DB_CONNECTION_STRING não encontrada ou inválida no .env!")
     yield
     # Código de finalização (ex: fechar conexões)
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    await lazy.crew_jobs.shutdown_job_manager()
+    await lazy.resources.shutdown_resources()
     logger.info("API Finalizando...")
 
 # Cria a instância da aplicação FastAPI
@@ -68,22 +89,8 @@ app = FastAPI(
 
 # --- Configuração de CORS ---
 # Lista de origens permitidas. Essencial para o frontend poder chamar a API.
-# Tenta obter a URL do site principal do .env do frontend (se existir)
-# Para isso, precisamos carregar o .env da raiz também (ou ter a var no .env do backend)
-# Ajuste: Usar o diretório pai de backend_dir para encontrar a raiz
-root_dir = os.path.dirname(backend_dir) # Isso deve ser /path/to/atlas
-root_dotenv_path = os.path.join(root_dir, '.env.local') # Assume .env.local na raiz
-load_dotenv(dotenv_path=root_dotenv_path, override=False) # Não sobrescreve vars já carregadas
-frontend_url = os.getenv("NEXT_PUBLIC_SITE_URL", "http://localhost:3000") # Default para localhost:3000
-
-origins = [
-    frontend_url, # URL principal do frontend (lida do .env.local da raiz)
-     "http://localhost:8000", # Permitir acesso da própria API (para testes/docs)
-     # Adicione outras URLs de desenvolvimento/produção aqui se necessário
-     # Ex: URL do Codespaces, Vercel Preview, etc.
-]
-# Filtra origens nulas ou vazias e remove duplicatas
-allowed_origins = list(set(filter(None, origins)))
+# A URL do frontend vem de NEXT_PUBLIC_SITE_URL (.env.local da raiz), lida em app/settings.py
+allowed_origins = list(settings.allowed_origins)
 
 # Se não houver origens específicas definidas, permita tudo (NÃO recomendado para produção)
 if not allowed_origins:
@@ -100,6 +107,13 @@ app.add_middleware(
     allow_headers=["*"],    # Permite todos os headers HTTP
 )
 
+# --- Telemetria ---
+# Latência por rota e profiler sob demanda (header X-Profile: 1, só com PROFILING_ENABLED=true).
+# Adicionado depois do CORS, fica por fora dele e mede também as respostas de preflight.
+if telemetry.METRICS_ENABLED or telemetry.PROFILING_ENABLED:
+    app.add_middleware(telemetry.TelemetryMiddleware)
+telemetry.configure_tracing(app)
+
 # --- Inclusão de Routers ---
 # Inclui os endpoints definidos nos módulos de router importados
 api_prefix = "/api/v1" # Define um prefixo base para todas as rotas de API
@@ -118,12 +132,29 @@ async def read_root():
     logger.info("Endpoint raiz ('/') acessado.")
     return {"message": "API de IA está operacional!"}
 
+# --- Métricas (formato texto do Prometheus) ---
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(telemetry.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/profiles/{profile_id}", include_in_schema=False)
+async def metrics_profile(profile_id: str):
+    """
+    Pilhas amostradas (formato collapsed, entrada do flamegraph.pl/speedscope) durante uma requisição com
+    X-Profile. Cobrem o event loop inteiro nessa janela, não só a requisição (ver app.telemetry).
+    """
+    profile = telemetry.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado (expirado ou profiling desativado).")
+    return PlainTextResponse(profile)
+
 # --- Execução com Uvicorn (para desenvolvimento local/Codespaces) ---
 # Esta parte só executa se o script for rodado diretamente (python backend/app/main.py)
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv("PORT", 8000)) # Usa a porta 8000 por padrão
-    host = os.getenv("HOST", "0.0.0.0") # Ouve em todas as interfaces
+    port = settings.port # Usa a porta 8000 por padrão
+    host = settings.host # Ouve em todas as interfaces
     logger.info(f"Iniciando servidor Uvicorn em {host}:{port} (Modo de execução direta)")
     # Use reload=True apenas para desenvolvimento
     # O Uvicorn espera o caminho no formato 'modulo:objeto'
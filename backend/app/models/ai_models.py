@@ -2,15 +2,21 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
+BATCH_MAX_ITEMS = 1000 # Itens por requisição nos endpoints em lote
+
 # --- Modelos para RAG ---
 class RagQueryInput(BaseModel):
     question: str = Field(..., description="Pergunta para a base RAG", examples=["Qual o status do projeto X?"])
     session_id: Optional[str] = Field(None, description="ID de sessão opcional para histórico")
+    filters: Optional[Dict[str, Any]] = Field(None, description="Filtros de metadata (chave: valor ou lista de valores)", examples=[{"source": "docs/pgvector.md"}])
 
 class RagResponse(BaseModel):
     answer: str = Field(..., description="Resposta gerada pelo RAG")
     sources: Optional[List[Dict[str, Any]]] = Field([], description="Lista de fontes usadas")
 
+class RagBatchInput(BaseModel):
+    items: List[RagQueryInput] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS, description="Consultas do lote; idênticas são processadas uma vez")
+
 # --- Modelos para CrewAI ---
 class CrewInput(BaseModel):
     topic: str = Field(..., description="Tópico ou objetivo para a Crew executar")
@@ -20,12 +26,34 @@ class CrewResponse(BaseModel):
     result: Any = Field(..., description="Resultado final da execução da Crew")
     logs: Optional[List[str]] = Field([], description="Logs ou métricas da execução (opcional)")
 
+class CrewJobInput(CrewInput):
+    tenant_id: str = Field("default", description="Tenant dono do job (limite de execuções simultâneas por tenant)")
+    priority: int = Field(0, description="Prioridade do job; valores maiores executam antes")
+
+class CrewJobStatus(BaseModel):
+    job_id: str = Field(..., description="ID do job")
+    status: str = Field(..., description="queued, running, succeeded ou failed")
+    topic: str = Field(..., description="Tópico da Crew")
+    tenant_id: str = Field(..., description="Tenant dono do job")
+    priority: int = Field(..., description="Prioridade do job")
+    result: Any = Field(None, description="Resultado final (quando succeeded)")
+    logs: List[str] = Field([], description="Logs produzidos até o momento")
+    error: Optional[str] = Field(None, description="Mensagem de erro (quando failed)")
+    created_at: float = Field(..., description="Timestamp (epoch) de criação")
+    started_at: Optional[float] = Field(None, description="Timestamp (epoch) de início")
+    finished_at: Optional[float] = Field(None, description="Timestamp (epoch) de término")
+
 # --- Modelos para Guardrails ---
 class GuardrailsInput(BaseModel):
     prompt: str = Field(..., description="Prompt para gerar a saída estruturada")
     spec_name: str = Field(..., description="Nome da especificação Guardrails (.rail ou classe Pydantic)")
     num_reasks: int = Field(default=1, ge=0, description="Número de tentativas de correção")
+    num_candidates: int = Field(default=1, ge=1, le=8, description="Candidatos gerados em paralelo (>1 ativa o modo multi-candidato; limitado por GUARDRAILS_MAX_CANDIDATES)")
 
 class GuardrailsResponse(BaseModel):
      validated_data: Optional[Dict | List | str] = Field(None, description="Dados validados e estruturados")
-     error: Optional[str] = Field(None, description="Mensagem de erro se a validação falhar")
\ No newline at end of file
+     error: Optional[str] = Field(None, description="Mensagem de erro se a validação falhar")
+     usage: Optional[Dict[str, Any]] = Field(None, description="Candidatos gerados/abortados/cancelados e tokens estimados")
+
+class GuardrailsBatchInput(BaseModel):
+    items: List[GuardrailsInput] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS, description="Pedidos do lote; idênticos são processados uma vez")
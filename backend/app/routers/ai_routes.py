@@ -1,24 +1,110 @@
 # Copie e cole para criar/atualizar o arquivo backend/app/routers/ai_routes.py:
-from fastapi import APIRouter, HTTPException, Body, status
+from fastapi import APIRouter, HTTPException, Body, Request, status
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import json
 import logging
+import math
 # Importe os models Pydantic
-from ..models.ai_models import RagQueryInput, RagResponse, CrewInput, CrewResponse, GuardrailsInput, GuardrailsResponse
-# Importe os services (a lógica real estará lá)
-# Estes imports podem dar erro no editor AGORA, mas devem funcionar quando a API rodar
-from ..services import rag_service, crew_service, guardrails_service
+from ..models.ai_models import (RagQueryInput, RagResponse, RagBatchInput, CrewInput, CrewResponse, CrewJobInput,
+                                CrewJobStatus, GuardrailsInput, GuardrailsResponse, GuardrailsBatchInput)
+# Services carregados sob demanda (ver app/lazy.py): importar este router não carrega os stacks de IA
+from ..lazy import rag_service, crew_service, crew_jobs, guardrails_service, embedding_service, resources, admission
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+async def _admit(request: Request, route: str) -> Tuple[Any, Any]:
+    """
+    Vaga da rota no controle de admissão e prazo da requisição (header X-Request-Timeout).
+    Com a rota saturada, responde 503 na hora em vez de enfileirar sem limite.
+    """
+    controller = admission.get_controller()
+    deadline = controller.deadline_for(route, request.headers.get(admission.DEADLINE_HEADER))
+    try:
+        return await controller.admit(route, deadline), deadline
+    except admission.OverloadedError as e:
+        raise _overloaded(e)
+
+def _overloaded(e: Exception) -> HTTPException:
+    logger.warning(f"Requisição recusada por sobrecarga: {e}")
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e),
+                         headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+def _deadline_exceeded(e: Exception) -> HTTPException:
+    logger.warning(f"Prazo da requisição esgotado: {e}")
+    return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+
+async def _ndjson_stream(request: Request, first_event: Dict[str, Any], events: AsyncIterator[Dict[str, Any]],
+                         permit: Optional[Any] = None):
+    """
+    Serializa os eventos como NDJSON (um objeto JSON por linha).
+    Se o cliente desconectar, fecha o gerador do serviço, o que interrompe a geração no LLM.
+    `permit` (vaga do controle de admissão) é liberado quando o stream termina.
+    """
+    failed = False
+    try:
+        yield json.dumps(first_event, ensure_ascii=False, default=str) + "\n"
+        async for event in events:
+            if await request.is_disconnected():
+                logger.info("Cliente desconectou; interrompendo o stream.")
+                break
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    except Exception as e:
+        # O status HTTP já foi enviado; o erro vai como último evento do stream
+        logger.error(f"Erro durante o stream: {e}", exc_info=True)
+        failed = isinstance(e, admission.ADMISSION_ERRORS)
+        yield json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        await events.aclose()
+        if permit is not None:
+            permit.release(failed)
+
+async def _batch_events(events: AsyncIterator[Dict[str, Any]],
+                        item_errors: Tuple[Tuple[type, int], ...]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Eventos de um endpoint em lote. O `error` de cada item traz a exceção, convertida aqui no
+    `status_code` que a rota unitária responderia (`item_errors` + erros do controle de admissão).
+    """
+    try:
+        async for event in events:
+            if event["type"] == "error":
+                e = event.pop("exception")
+                status_code = next((code for error_type, code in item_errors if isinstance(e, error_type)), None)
+                if isinstance(e, admission.OverloadedError):
+                    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+                    event["retry_after"] = max(1, math.ceil(e.retry_after))
+                elif isinstance(e, admission.DeadlineExceededError):
+                    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+                message = str(e)
+                if status_code is None:
+                    logger.error(f"Erro inesperado no item {event['index']} do lote: {e}", exc_info=e)
+                    status_code, message = status.HTTP_500_INTERNAL_SERVER_ERROR, "Erro ao processar o item."
+                event.update(error=message, status_code=status_code)
+                if getattr(e, "usage", None) is not None:
+                    event["usage"] = e.usage
+            yield event
+    finally:
+        await events.aclose() # Cliente desconectou: cancela os itens em andamento
+
 @router.post("/rag-query", response_model=RagResponse, summary="Consulta RAG")
-async def handle_rag_query(query: RagQueryInput = Body(...)):
+async def handle_rag_query(request: Request, query: RagQueryInput = Body(...)):
     """Recebe uma pergunta e retorna uma resposta via RAG."""
     logger.info(f"Recebida consulta RAG: {query.question}")
+    permit, deadline = await _admit(request, "rag")
     try:
         # Chama o serviço RAG (implementação virá na Fase 7)
         # Await necessário pois as funções de serviço serão async
-        answer, sources = await rag_service.query_knowledge_base(query.question)
+        with permit:
+            answer, sources = await rag_service.query_knowledge_base(query.question, query.filters, deadline,
+                                                                     query.session_id)
         return RagResponse(answer=answer, sources=sources)
+    except admission.OverloadedError as e:
+        raise _overloaded(e)
+    except admission.DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
     except rag_service.VectorStoreNotReadyError as e: # Exemplo de erro específico
          logger.warning(f"Erro RAG (Vector Store não pronto): {e}")
          raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
@@ -26,13 +112,102 @@ async def handle_rag_query(query: RagQueryInput = Body(...)):
         logger.error(f"Erro inesperado na consulta RAG: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao processar consulta RAG.")
 
+@router.post("/rag-query/stream", summary="Consulta RAG com streaming (NDJSON)")
+async def handle_rag_query_stream(request: Request, query: RagQueryInput = Body(...)):
+    """
+    Versão streaming de /rag-query. Emite `sources` assim que a recuperação termina,
+    depois um evento `token` por trecho da resposta e, por fim, `done`.
+    """
+    logger.info(f"Recebida consulta RAG (stream): {query.question}")
+    permit, deadline = await _admit(request, "rag")
+    events = rag_service.stream_knowledge_base(query.question, query.filters, deadline, query.session_id)
+    try:
+        # Puxa o primeiro evento antes de responder, para erros iniciais virarem status HTTP
+        with permit.released_on_error():
+            first_event = await anext(events)
+    except admission.OverloadedError as e:
+        raise _overloaded(e)
+    except admission.DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
+    except rag_service.VectorStoreNotReadyError as e:
+         logger.warning(f"Erro RAG (Vector Store não pronto): {e}")
+         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro inesperado na consulta RAG (stream): {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao processar consulta RAG.")
+    return StreamingResponse(_ndjson_stream(request, first_event, events, permit), media_type=NDJSON_MEDIA_TYPE)
+
+@router.post("/rag-query/batch", summary="Consultas RAG em lote (NDJSON)")
+async def handle_rag_query_batch(request: Request, batch: RagBatchInput = Body(...)):
+    """
+    Processa várias consultas compartilhando embedding e busca. Emite `accepted`, um evento
+    `result` (ou `error`, com `status_code`) por item, identificado pelo `index` no lote e na ordem
+    em que termina, e `done` com o resumo. A falha de um item não interrompe os demais.
+    """
+    logger.info(f"Recebido lote RAG com {len(batch.items)} consultas")
+    permit, deadline = await _admit(request, "batch")
+    events = _batch_events(rag_service.stream_batch([item.model_dump() for item in batch.items], deadline),
+                           ((rag_service.VectorStoreNotReadyError, status.HTTP_503_SERVICE_UNAVAILABLE),))
+    try:
+        with permit.released_on_error():
+            first_event = await anext(events)
+    except rag_service.VectorStoreNotReadyError as e:
+         logger.warning(f"Erro RAG (Vector Store não pronto): {e}")
+         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro inesperado no lote RAG: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao processar lote RAG.")
+    return StreamingResponse(_ndjson_stream(request, first_event, events, permit), media_type=NDJSON_MEDIA_TYPE)
+
+@router.get("/rag-cache/stats", summary="Métricas do cache de respostas RAG")
+async def handle_rag_cache_stats():
+    """Retorna hits/misses por nível, hit ratio e tempo economizado pelo cache de respostas."""
+    return rag_service.get_cache_stats()
+
+@router.get("/rag-sessions/stats", summary="Métricas do armazenamento de sessões RAG")
+async def handle_rag_session_stats():
+    """Retorna sessões em memória, bytes ocupados, evicções e o backend de persistência."""
+    return rag_service.get_session_stats()
+
+@router.delete("/rag-sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Encerra uma sessão RAG")
+async def handle_rag_session_delete(session_id: str):
+    """Descarta o histórico da sessão (memória e backend). Idempotente."""
+    await rag_service.delete_session(session_id)
+
+@router.get("/embedding-batcher/stats", summary="Métricas do micro-batcher de embeddings")
+async def handle_embedding_batcher_stats():
+    """Retorna profundidade da fila, tamanho médio dos lotes e textos deduplicados."""
+    return embedding_service.get_batcher_stats()
+
+@router.get("/resources/health", summary="Saúde do pool Postgres e do cliente HTTP")
+async def handle_resources_health():
+    """Retorna 200 se os recursos compartilhados estão saudáveis e 503 caso contrário."""
+    res = await resources.get_resources()
+    health = await res.health()
+    if not health["ok"]:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=health)
+    return health
+
+@router.get("/resources/stats", summary="Métricas de saturação dos pools de conexão")
+async def handle_resources_stats():
+    """Retorna tamanho, conexões ociosas/em uso, espera por conexão e requisições HTTP em voo."""
+    return (await resources.get_resources()).stats()
+
+@router.get("/admission/stats", summary="Limites adaptativos e filas do controle de admissão")
+async def handle_admission_stats():
+    """Retorna, por rota e por provedor, o limite atual, vagas em uso, fila e recusas."""
+    return admission.get_stats()
+
 @router.post("/run-crew", response_model=CrewResponse, summary="Executa uma Crew AI")
-async def handle_run_crew(crew_input: CrewInput = Body(...)):
+async def handle_run_crew(request: Request, crew_input: CrewInput = Body(...)):
     """Inicia uma tarefa complexa usando uma equipe de agentes AI."""
     logger.info(f"Recebido pedido para rodar crew sobre: {crew_input.topic}")
+    # O prazo só limita a espera por vaga: a Crew roda em uma thread, que não pode ser interrompida
+    permit, _ = await _admit(request, "crew")
     try:
         # Chama o serviço CrewAI (implementação virá na Fase 7)
-        result, logs = await crew_service.run_specific_crew(crew_input.topic, crew_input.parameters)
+        with permit:
+            result, logs = await crew_service.run_specific_crew(crew_input.topic, crew_input.parameters)
         return CrewResponse(result=result, logs=logs)
     except ValueError as e: # Exemplo: Tópico não suportado
          logger.warning(f"Erro Crew (Input inválido): {e}")
@@ -41,23 +216,58 @@ async def handle_run_crew(crew_input: CrewInput = Body(...)):
         logger.error(f"Erro inesperado ao rodar Crew: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro ao executar a Crew AI.")
 
+@router.post("/crew-jobs", response_model=CrewJobStatus, status_code=status.HTTP_202_ACCEPTED, summary="Enfileira uma Crew AI")
+async def handle_submit_crew_job(job_input: CrewJobInput = Body(...)):
+    """Enfileira a execução da Crew e retorna imediatamente o job (use o job_id para acompanhar)."""
+    logger.info(f"Recebido job de crew sobre: {job_input.topic} (tenant={job_input.tenant_id})")
+    manager = await crew_jobs.get_job_manager()
+    return await manager.submit(job_input.topic, job_input.parameters, job_input.tenant_id, job_input.priority)
+
+@router.get("/crew-jobs/{job_id}", response_model=CrewJobStatus, summary="Status e resultado de um job de Crew")
+async def handle_get_crew_job(job_id: str):
+    """Retorna status, logs até o momento e, quando concluído, o resultado do job."""
+    manager = await crew_jobs.get_job_manager()
+    try:
+        return manager.get(job_id)
+    except crew_jobs.JobNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+
+@router.get("/crew-jobs/{job_id}/logs", summary="Acompanha os logs de um job de Crew (NDJSON)")
+async def handle_stream_crew_job_logs(request: Request, job_id: str):
+    """Emite um evento `log` por linha produzida pela Crew e `done` quando o job termina."""
+    manager = await crew_jobs.get_job_manager()
+    events = manager.stream_logs(job_id)
+    try:
+        first_event = await anext(events)
+    except crew_jobs.JobNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
+    return StreamingResponse(_ndjson_stream(request, first_event, events), media_type=NDJSON_MEDIA_TYPE)
+
 @router.post("/generate-structured", response_model=GuardrailsResponse, summary="Gera dados estruturados com validação")
-async def handle_generate_structured(guard_input: GuardrailsInput = Body(...)):
+async def handle_generate_structured(request: Request, guard_input: GuardrailsInput = Body(...)):
     """Usa Guardrails para gerar e validar dados a partir de um prompt."""
     logger.info(f"Recebido pedido para gerar dados estruturados com spec: {guard_input.spec_name}")
+    permit, deadline = await _admit(request, "structured")
     try:
         # Chama o serviço Guardrails (implementação virá na Fase 7)
-        validated_data = await guardrails_service.generate_and_validate(
-            guard_input.prompt,
-            guard_input.spec_name,
-            guard_input.num_reasks
-        )
+        with permit:
+            validated_data, usage = await guardrails_service.generate_and_validate_with_usage(
+                guard_input.prompt,
+                guard_input.spec_name,
+                guard_input.num_reasks,
+                deadline,
+                guard_input.num_candidates
+            )
         # Retorna sucesso com os dados validados
-        return GuardrailsResponse(validated_data=validated_data, error=None)
+        return GuardrailsResponse(validated_data=validated_data, error=None, usage=usage)
+    except admission.OverloadedError as e:
+        raise _overloaded(e)
+    except admission.DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
     except guardrails_service.GuardrailsValidationError as e: # Exemplo erro específico
         logger.warning(f"Erro Guardrails (Validação falhou): {e}")
         # Retorna sucesso (status 200), mas com erro na resposta
-        return GuardrailsResponse(validated_data=None, error=str(e))
+        return GuardrailsResponse(validated_data=None, error=str(e), usage=e.usage)
     except FileNotFoundError as e: # Exemplo: Spec não encontrada
          logger.error(f"Erro Guardrails (Spec não encontrada): {e}")
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
@@ -65,6 +275,61 @@ async def handle_generate_structured(guard_input: GuardrailsInput = Body(...)):
         logger.error(f"Erro inesperado na geração com Guardrails: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro na geração estruturada.")
 
+@router.post("/generate-structured/stream", summary="Gera dados estruturados com streaming (NDJSON)")
+async def handle_generate_structured_stream(request: Request, guard_input: GuardrailsInput = Body(...)):
+    """
+    Versão streaming de /generate-structured. Emite um evento `field` por campo validado,
+    `usage` com candidatos e tokens gastos e `done` com o resultado completo; falhas de
+    validação viram um evento `error`.
+    """
+    logger.info(f"Recebido pedido para gerar dados estruturados (stream) com spec: {guard_input.spec_name}")
+    permit, deadline = await _admit(request, "structured")
+    events = guardrails_service.stream_generate_and_validate(
+        guard_input.prompt,
+        guard_input.spec_name,
+        guard_input.num_reasks,
+        deadline,
+        guard_input.num_candidates
+    )
+    try:
+        with permit.released_on_error():
+            first_event = await anext(events)
+    except admission.OverloadedError as e:
+        raise _overloaded(e)
+    except admission.DeadlineExceededError as e:
+        raise _deadline_exceeded(e)
+    except guardrails_service.GuardrailsValidationError as e:
+        logger.warning(f"Erro Guardrails (Validação falhou): {e}")
+        first_event = {"type": "error", "error": str(e)}
+    except FileNotFoundError as e:
+         logger.error(f"Erro Guardrails (Spec não encontrada): {e}")
+         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erro inesperado na geração com Guardrails (stream): {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro na geração estruturada.")
+    return StreamingResponse(_ndjson_stream(request, first_event, events, permit), media_type=NDJSON_MEDIA_TYPE)
+
+@router.post("/generate-structured/batch", summary="Gera dados estruturados em lote (NDJSON)")
+async def handle_generate_structured_batch(request: Request, batch: GuardrailsBatchInput = Body(...)):
+    """
+    Versão em lote de /generate-structured. Emite `accepted`, um `result` ({"validated_data", "usage"})
+    ou `error` (com `status_code`; 422 para falha de validação) por item, identificado pelo `index`,
+    na ordem em que termina, e `done` com o resumo.
+    """
+    logger.info(f"Recebido lote de geração estruturada com {len(batch.items)} pedidos")
+    permit, deadline = await _admit(request, "batch")
+    item_errors = ((guardrails_service.GuardrailsValidationError, status.HTTP_422_UNPROCESSABLE_ENTITY),
+                   (FileNotFoundError, status.HTTP_404_NOT_FOUND))
+    events = _batch_events(guardrails_service.stream_batch([item.model_dump() for item in batch.items], deadline),
+                           item_errors)
+    try:
+        with permit.released_on_error():
+            first_event = await anext(events)
+    except Exception as e:
+        logger.error(f"Erro inesperado no lote de geração estruturada: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erro na geração estruturada.")
+    return StreamingResponse(_ndjson_stream(request, first_event, events, permit), media_type=NDJSON_MEDIA_TYPE)
+
 @router.get("/ping", summary="Verifica atividade do router AI")
 async def ping():
     """Endpoint simples para verificar se o router AI está ativo."""
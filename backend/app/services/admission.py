@@ -0,0 +1,381 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/admission.py:
+"""
+Controle de admissão compartilhado pelas rotas de IA e pelas chamadas aos provedores (LLM/embeddings).
+
+- Limite de concorrência por rota ("rag", "structured", "crew") e por provedor ("llm", "embedding"),
+  ajustado por AIMD: cada chamada mais lenta que a latência alvo (ou que falha) reduz o limite
+  multiplicativamente; as demais o aumentam em 1/limite. Só reduz uma vez por "janela": chamadas que
+  começaram antes da última redução não contam de novo.
+- Fila limitada: com o limite ocupado, espera no máximo ADMISSION_QUEUE_TIMEOUT_SECONDS (ou o que resta
+  do prazo) e, com a fila cheia, falha na hora com OverloadedError (503 + Retry-After nas rotas).
+  Chamadas `bulk` (ingestão) ficam em uma fila própria, sem limite nem timeout além do prazo, e só
+  recebem uma vaga quando não há chamadas interativas esperando.
+- Token buckets de RPM e TPM por provedor: a reserva é feita antes da chamada e, se a espera pelos
+  tokens passar do prazo da requisição, falha na hora em vez de estourar o rate limit do provedor.
+- `Deadline`: prazo da requisição (header X-Request-Timeout ou padrão por rota), repassado aos
+  serviços para reduzir a profundidade da recuperação e o número de re-asks quando o tempo está curto.
+"""
+import asyncio
+import collections
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Deque, Dict, Iterator, Optional, TypeVar
+
+from .. import telemetry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9")) # Fator da redução multiplicativa
+DEADLINE_HEADER = "x-request-timeout" # Segundos; limitado ao prazo padrão da rota
+CHARS_PER_TOKEN = 4 # Estimativa de tokens para o TPM (sem depender de um tokenizer)
+LLM_OUTPUT_TOKENS = int(os.getenv("ADMISSION_LLM_OUTPUT_TOKENS", "512")) # Reservados por chamada ao LLM
+
+
+def _env(scope: str, name: str, default: float) -> float:
+    return float(os.getenv(f"ADMISSION_{scope.upper()}_{name}", str(default)))
+
+
+# (concorrência máxima, latência alvo em segundos, prazo padrão em segundos)
+# "batch" (endpoints em lote) tem vagas próprias, para lotes longos não ocuparem as rotas interativas
+ROUTE_DEFAULTS = {"rag": (64, 10.0, 30.0), "structured": (32, 15.0, 60.0), "crew": (16, 60.0, 300.0),
+                  "batch": (4, 300.0, 1800.0)}
+# (concorrência máxima, latência alvo em segundos, RPM, TPM); RPM/TPM 0 = sem limite
+PROVIDER_DEFAULTS = {"llm": (32, 20.0, 0, 0), "embedding": (16, 2.0, 0, 0)}
+
+
+class OverloadedError(Exception):
+    """Sem capacidade para atender agora; `retry_after` sugere quando tentar de novo (segundos)."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """O prazo da requisição terminou antes de um estágio começar."""
+
+
+ADMISSION_ERRORS = (OverloadedError, DeadlineExceededError) # Contam como falha no AIMD
+
+
+class Deadline:
+    __slots__ = ("seconds", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self, stage: str) -> None:
+        if self.remaining() <= 0:
+            raise DeadlineExceededError(f"Prazo de {self.seconds:g}s esgotado antes de '{stage}'.")
+
+
+def _remaining(deadline: Optional[Deadline]) -> float:
+    return deadline.remaining() if deadline is not None else math.inf
+
+
+async def run_within(deadline: Optional[Deadline], stage: str, awaitable: Awaitable[T]) -> T:
+    """Aguarda `awaitable` no máximo pelo tempo que resta do prazo."""
+    if deadline is None:
+        return await awaitable
+    deadline.check(stage)
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError(f"Prazo de {deadline.seconds:g}s esgotado durante '{stage}'.") from None
+
+
+def estimate_tokens(*texts: str) -> int:
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN + 1
+
+
+class AdaptiveLimiter:
+    """Semáforo com limite AIMD e fila de espera limitada (FIFO)."""
+
+    def __init__(self, name: str, max_limit: int, latency_target: float, max_queue: Optional[int] = None,
+                 min_limit: int = 1, backoff: float = ADMISSION_BACKOFF):
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.max_queue = max_limit if max_queue is None else max_queue
+        self.backoff = backoff
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._bulk_waiters: Deque[asyncio.Future] = collections.deque()
+        self._last_decrease = 0.0
+        self._stats = {"admitted": 0, "rejected": 0, "decreases": 0}
+
+    async def acquire(self, timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS, bulk: bool = False) -> float:
+        """Ocupa uma vaga e retorna o instante de início (passe-o para release)."""
+        if self.in_flight < int(self.limit) and not self._waiters and not self._bulk_waiters:
+            self.in_flight += 1
+        else:
+            if timeout <= 0 or (not bulk and len(self._waiters) >= self.max_queue):
+                self._reject("queue_full" if timeout > 0 else "deadline")
+            waiters = self._bulk_waiters if bulk else self._waiters
+            future = asyncio.get_running_loop().create_future()
+            waiters.append(future)
+            try:
+                # Ao ser acordado, a vaga já foi transferida
+                await asyncio.wait_for(future, None if math.isinf(timeout) else timeout)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout")
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    self._release_slot() # Vaga recebida junto com o cancelamento: repassa adiante
+                raise
+            finally:
+                if future in waiters:
+                    waiters.remove(future)
+        self._stats["admitted"] += 1
+        return time.monotonic()
+
+    def release(self, started: float, failed: bool = False, abandoned: bool = False) -> None:
+        """Devolve a vaga. `abandoned` (chamada interrompida pelo cliente) não conta para o AIMD nem para a latência."""
+        if abandoned:
+            self._release_slot()
+            return
+        latency = time.monotonic() - started
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if failed or latency > self.latency_target:
+            if started >= self._last_decrease: # Uma redução por janela, não uma por chamada lenta
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self._last_decrease = time.monotonic()
+                self._stats["decreases"] += 1
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        # Com o limite reduzido abaixo do que está em voo, a vaga some em vez de ser repassada
+        if self.in_flight <= int(self.limit):
+            future = self._next_waiter()
+            if future is not None:
+                future.set_result(None)
+                self._wake_waiters() # O aumento aditivo pode ter aberto mais vagas
+                return
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self.in_flight < int(self.limit):
+            future = self._next_waiter()
+            if future is None:
+                return
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """Interativos primeiro; a fila bulk só anda quando ninguém mais espera."""
+        for waiters in (self._waiters, self._bulk_waiters):
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    return future
+        return None
+
+    def _reject(self, reason: str) -> None:
+        self._stats["rejected"] += 1
+        telemetry.ADMISSION_REJECTIONS.inc(scope=self.name, reason=reason)
+        # Tempo estimado até uma vaga abrir: latência típica de uma chamada
+        raise OverloadedError(f"'{self.name}' saturado ({reason}); tente novamente.",
+                              retry_after=self.latency_ewma or 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "limit": round(self.limit, 2),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "queued_bulk": len(self._bulk_waiters),
+            "max_queue": self.max_queue,
+            "latency_ewma_seconds": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "latency_target_seconds": self.latency_target,
+        }
+
+
+class TokenBucket:
+    """Rate limit por minuto (RPM ou TPM). Reservas podem deixar o saldo negativo: o déficit vira espera."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Debita `amount` e retorna quantos segundos esperar antes de usá-los."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self.tokens -= min(amount, self.capacity) # Um pedido maior que o balde nunca caberia
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        self.tokens += min(amount, self.capacity)
+
+
+class ProviderGate:
+    """Concorrência adaptativa + RPM/TPM de um provedor upstream."""
+
+    def __init__(self, name: str, limiter: AdaptiveLimiter, rpm: float = 0, tpm: float = 0):
+        self.name = name
+        self.limiter = limiter
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def expected_latency(self) -> float:
+        return self.limiter.latency_ewma or 0.0
+
+    @asynccontextmanager
+    async def call(self, tokens: int, deadline: Optional[Deadline] = None, bulk: bool = False) -> AsyncIterator[None]:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait > 0:
+            if wait > _remaining(deadline): # Sem prazo (ex: ingestão), espera o rate limit o quanto for preciso
+                if self.requests is not None:
+                    self.requests.refund(1)
+                if self.tokens is not None:
+                    self.tokens.refund(tokens)
+                telemetry.ADMISSION_REJECTIONS.inc(scope=self.name, reason="rate_limit")
+                raise OverloadedError(f"Rate limit de '{self.name}' esgotado; tente novamente.", retry_after=wait)
+            await asyncio.sleep(wait)
+        queue_timeout = _remaining(deadline) if bulk else min(_remaining(deadline), ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        started = await self.limiter.acquire(queue_timeout, bulk)
+        failed = abandoned = True
+        try:
+            yield
+            failed = abandoned = False
+        except (GeneratorExit, asyncio.CancelledError):
+            # Stream fechado ou cliente desconectado: não diz nada sobre o provedor
+            failed = False
+            raise
+        except BaseException:
+            abandoned = False
+            raise
+        finally:
+            self.limiter.release(started, failed, abandoned)
+
+
+class Permit:
+    """Vaga de uma rota; liberada ao sair do `with` ou explicitamente (fim de um stream)."""
+
+    def __init__(self, limiter: Optional[AdaptiveLimiter], started: float):
+        self._limiter = limiter
+        self._started = started
+        self._released = False
+
+    def release(self, failed: bool = False) -> None:
+        if not self._released:
+            self._released = True
+            if self._limiter is not None:
+                self._limiter.release(self._started, failed)
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.release(failed=isinstance(exc, ADMISSION_ERRORS))
+
+    @contextmanager
+    def released_on_error(self) -> Iterator[None]:
+        """Para streams: a vaga acompanha a resposta, mas é liberada se a abertura do stream falhar."""
+        try:
+            yield
+        except BaseException as e:
+            self.release(failed=isinstance(e, ADMISSION_ERRORS))
+            raise
+
+
+class AdmissionController:
+    def __init__(self, routes: Dict[str, AdaptiveLimiter], deadlines: Dict[str, float],
+                 providers: Dict[str, ProviderGate]):
+        self.routes = routes
+        self.deadlines = deadlines
+        self.providers = providers
+
+    def deadline_for(self, route: str, header_value: Optional[str] = None) -> Deadline:
+        """Prazo pedido pelo cliente (X-Request-Timeout), nunca maior que o padrão da rota."""
+        seconds = self.deadlines[route]
+        if header_value:
+            try:
+                seconds = min(seconds, max(0.0, float(header_value)))
+            except ValueError:
+                logger.debug(f"[admission] {DEADLINE_HEADER} inválido ignorado: '{header_value}'")
+        return Deadline(seconds)
+
+    async def admit(self, route: str, deadline: Optional[Deadline] = None) -> Permit:
+        if not ADMISSION_ENABLED:
+            return Permit(None, 0.0)
+        limiter = self.routes[route]
+        return Permit(limiter, await limiter.acquire(min(_remaining(deadline), ADMISSION_QUEUE_TIMEOUT_SECONDS)))
+
+    @asynccontextmanager
+    async def provider(self, name: str, tokens: int, deadline: Optional[Deadline] = None,
+                       bulk: bool = False) -> AsyncIterator[None]:
+        """Vaga em um provedor; `bulk` (trabalho em segundo plano) espera sem timeout, atrás dos interativos."""
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        async with self.providers[name].call(tokens, deadline, bulk):
+            yield
+
+    def expected_latency(self, provider: str) -> float:
+        return self.providers[provider].expected_latency()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "routes": {name: limiter.stats() for name, limiter in self.routes.items()},
+            "providers": {name: gate.limiter.stats() for name, gate in self.providers.items()},
+        }
+
+
+def create_controller() -> AdmissionController:
+    """Limites de ROUTE_DEFAULTS/PROVIDER_DEFAULTS, sobrescritos por ADMISSION_<ROTA>_* / ADMISSION_<PROVEDOR>_*."""
+    routes, deadlines, providers = {}, {}, {}
+    for name, (concurrency, target, deadline) in ROUTE_DEFAULTS.items():
+        concurrency = int(_env(name, "MAX_CONCURRENCY", concurrency))
+        routes[name] = AdaptiveLimiter(name, concurrency, _env(name, "LATENCY_TARGET_SECONDS", target),
+                                       max_queue=int(_env(name, "MAX_QUEUE", concurrency)))
+        deadlines[name] = _env(name, "DEADLINE_SECONDS", deadline)
+    for name, (concurrency, target, rpm, tpm) in PROVIDER_DEFAULTS.items():
+        concurrency = int(_env(name, "MAX_CONCURRENCY", concurrency))
+        limiter = AdaptiveLimiter(name, concurrency, _env(name, "LATENCY_TARGET_SECONDS", target),
+                                  max_queue=int(_env(name, "MAX_QUEUE", concurrency * 4)))
+        providers[name] = ProviderGate(name, limiter, rpm=_env(name, "RPM", rpm), tpm=_env(name, "TPM", tpm))
+    return AdmissionController(routes, deadlines, providers)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_controller() -> AdmissionController:
+    """Controller do event loop atual (as filas de espera são futures de um único loop)."""
+    global _controller, _controller_loop
+    loop = asyncio.get_running_loop()
+    if _controller is None or _controller_loop is not loop:
+        _controller, _controller_loop = create_controller(), loop
+    return _controller
+
+
+def get_stats() -> Dict[str, Any]:
+    return _controller.stats() if _controller is not None else create_controller().stats()
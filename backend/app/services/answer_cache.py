@@ -0,0 +1,163 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/answer_cache.py:
+"""
+Cache de respostas do RAG em dois níveis, na frente de rag_service.query_knowledge_base.
+
+1. Exato: hash SHA-256 da pergunta normalizada (minúsculas, espaços colapsados).
+2. Semântico: a pergunta mais parecida já respondida, por similaridade de cosseno entre
+   embeddings, desde que acima de `similarity_threshold`.
+
+Os dois níveis compartilham as mesmas entradas, com eviction LRU, TTL e limite total em bytes.
+Cada entrada guarda a versão do corpus em que foi gerada; uma consulta com outra versão trata a
+entrada como miss. Com o índice local, a versão é a apontada por CURRENT, que cada worker relê
+(rag_service._refresh_local_index): uma reindexação feita por outro worker invalida as respostas
+deste na próxima verificação. Sem índice local a versão é None e só `invalidate()` limpa o cache,
+apenas no processo que reindexou.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_ENTRY_OVERHEAD_BYTES = 256 # Estimativa do custo fixo de cada entrada (objetos Python, chave, etc.)
+
+
+def normalize_question(question: str) -> str:
+    return _WHITESPACE_RE.sub(" ", question.strip().lower())
+
+
+@dataclass
+class _Entry:
+    key: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    slot: int                 # Linha em `_matrix` com o embedding da pergunta
+    corpus_version: Optional[str]
+    created_at: float
+    latency_seconds: float    # Custo original (embedding + busca + geração) economizado a cada hit
+    size_bytes: int
+
+
+class SemanticAnswerCache:
+    def __init__(self, dim: int, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600.0,
+                 similarity_threshold: float = 0.95):
+        self.dim = dim
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict() # Ordem LRU: mais antigo primeiro
+        self._matrix = np.zeros((64, dim), dtype=np.float32)
+        self._slot_keys: List[Optional[str]] = [None] * 64
+        self._free_slots = list(range(63, -1, -1))
+        self._bytes = 0
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                       "invalidations": 0, "saved_seconds": 0.0}
+
+    # --- Consulta ---
+
+    def get_exact(self, question: str, corpus_version: Optional[str]) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        entry = self._entries.get(self._key(question))
+        if entry is None or not self._is_fresh(entry, corpus_version):
+            return None
+        return self._hit(entry, "exact_hits")
+
+    def get_similar(self, embedding: np.ndarray, corpus_version: Optional[str]) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """Nível semântico; registra um miss se nenhuma entrada válida passar do limiar."""
+        if self._entries:
+            scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            for slot in np.argsort(-scores):
+                if scores[slot] < self.similarity_threshold:
+                    break
+                key = self._slot_keys[slot]
+                entry = self._entries.get(key) if key is not None else None
+                if entry is not None and self._is_fresh(entry, corpus_version):
+                    return self._hit(entry, "semantic_hits")
+        self._stats["misses"] += 1
+        return None
+
+    # --- Escrita e eviction ---
+
+    def put(self, question: str, embedding: np.ndarray, answer: str, sources: List[Dict[str, Any]],
+            corpus_version: Optional[str], latency_seconds: float) -> None:
+        key = self._key(question)
+        if key in self._entries:
+            self._remove(key)
+        size = (len(answer.encode("utf-8")) + len(json.dumps(sources, default=str).encode("utf-8"))
+                + self.dim * 4 + _ENTRY_OVERHEAD_BYTES)
+        if size > self.max_bytes:
+            return
+        while self._bytes + size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+        slot = self._allocate_slot()
+        self._matrix[slot] = embedding
+        self._slot_keys[slot] = key
+        self._entries[key] = _Entry(key, answer, sources, slot, corpus_version, time.monotonic(), latency_seconds, size)
+        self._bytes += size
+
+    def invalidate(self) -> None:
+        """Remove todas as entradas (ex: o corpus mudou neste processo)."""
+        for key in list(self._entries):
+            self._remove(key)
+        self._stats["invalidations"] += 1
+        logger.info("[answer_cache] Cache de respostas invalidado.")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "saved_seconds": round(self._stats["saved_seconds"], 3),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+        }
+
+    # --- Auxiliares ---
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+    def _is_fresh(self, entry: _Entry, corpus_version: Optional[str]) -> bool:
+        if entry.corpus_version != corpus_version:
+            self._remove(entry.key)
+            self._stats["invalidations"] += 1
+            return False
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._remove(entry.key)
+            self._stats["expirations"] += 1
+            return False
+        return True
+
+    def _hit(self, entry: _Entry, kind: str) -> Tuple[str, List[Dict[str, Any]]]:
+        self._entries.move_to_end(entry.key)
+        self._stats[kind] += 1
+        self._stats["saved_seconds"] += entry.latency_seconds
+        return entry.answer, entry.sources
+
+    def _allocate_slot(self) -> int:
+        if not self._free_slots:
+            capacity = len(self._matrix)
+            self._matrix = np.vstack([self._matrix, np.zeros((capacity, self.dim), dtype=np.float32)])
+            self._slot_keys.extend([None] * capacity)
+            self._free_slots = list(range(2 * capacity - 1, capacity - 1, -1))
+        return self._free_slots.pop()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._matrix[entry.slot] = 0.0 # Linha zerada nunca passa do limiar
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
+        self._bytes -= entry.size_bytes
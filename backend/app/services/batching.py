@@ -0,0 +1,65 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/batching.py:
+"""
+Auxiliares dos endpoints em lote (/rag-query/batch e /generate-structured/batch).
+
+- `group_duplicates`: agrupa itens idênticos do lote; cada grupo é processado uma única vez.
+- `fan_out`: executa um job por grupo com concorrência limitada e emite um evento por item
+  original assim que o job do seu grupo termina (fora de ordem). Falhas ficam no item: o evento
+  `error` carrega a exceção, e o router decide o status de cada uma; o lote segue com os demais.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+Job = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def group_duplicates(items: List[Dict[str, Any]], keep_apart: Optional[Callable[[Dict[str, Any]], bool]] = None
+                     ) -> List[List[int]]:
+    """Índices dos itens agrupados por conteúdo, na ordem da primeira ocorrência. `keep_apart` isola itens."""
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        key = f"#{i}" if keep_apart is not None and keep_apart(item) else json.dumps(item, sort_keys=True, default=str)
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+def failed_job(error: BaseException) -> Job:
+    """Job de um item cuja etapa compartilhada (ex: embedding do lote) falhou."""
+    async def job() -> Dict[str, Any]:
+        raise error
+    return job
+
+
+async def fan_out(groups: List[List[int]], jobs: List[Job], concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Roda `jobs[g]` para cada grupo `groups[g]` com até `concurrency` em voo. Emite `result` ou `error`
+    para cada índice do grupo e, ao final, `done` com o resumo. Fechar o gerador cancela o que falta.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(g: int):
+        async with semaphore:
+            try:
+                return g, await jobs[g](), None
+            except Exception as e:
+                return g, None, e
+
+    tasks = [asyncio.create_task(run(g)) for g in range(len(groups))]
+    succeeded = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            g, result, error = await next_done
+            for i in groups[g]:
+                duplicate = i != groups[g][0]
+                if error is None:
+                    succeeded += 1
+                    yield {"type": "result", "index": i, "duplicate": duplicate, **result}
+                else:
+                    failed += 1
+                    yield {"type": "error", "index": i, "duplicate": duplicate, "exception": error}
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    yield {"type": "done", "items": succeeded + failed, "unique": len(groups), "succeeded": succeeded, "failed": failed}
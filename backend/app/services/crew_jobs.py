@@ -0,0 +1,398 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/crew_jobs.py:
+"""
+Fila de jobs para execuções de Crew AI fora do ciclo da requisição HTTP.
+
+- `submit()` grava o job no SQLite e retorna o id imediatamente.
+- Workers assíncronos escolhem o próximo job por prioridade (maior primeiro, depois FIFO),
+  respeitando um limite de jobs simultâneos por tenant.
+- A execução (crew_service.kickoff_crew, bloqueante) roda em um ThreadPoolExecutor limitado.
+  Usamos threads e não processos porque objetos da CrewAI e o callback de logs não são picklable.
+- Cada linha de log é gravada assim que chega, na própria thread da crew, em uma tabela append-only
+  (crew_job_logs), e pode ser acompanhada por `stream_logs()`; cada consumidor guarda o seu cursor.
+- Vários processos podem compartilhar o mesmo banco: um job só roda depois de ser assumido com um
+  UPDATE condicional (queued -> running), então nunca roda duas vezes ao mesmo tempo.
+- Enquanto roda, o job renova um heartbeat. Jobs "running" cujo heartbeat passou de CREW_JOB_LEASE_SECONDS
+  (processo que caiu) voltam para a fila, no start() e periodicamente.
+- Um erro ao escalonar ou gravar um job (ex: "database is locked") marca só aquele job como falho;
+  o worker segue para o próximo.
+- No shutdown(), as crews em andamento têm até CREW_SHUTDOWN_GRACE_SECONDS para terminar antes de o
+  banco ser fechado; depois disso, os logs que ainda chegarem são descartados.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from .. import telemetry
+from . import crew_service
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("CREW_JOBS_DB_PATH", ".crew_jobs.sqlite3")
+MAX_WORKERS = int(os.getenv("CREW_MAX_WORKERS", "4"))
+MAX_PER_TENANT = int(os.getenv("CREW_MAX_JOBS_PER_TENANT", "2"))
+LEASE_SECONDS = float(os.getenv("CREW_JOB_LEASE_SECONDS", "60"))
+LOG_POLL_SECONDS = float(os.getenv("CREW_LOG_POLL_SECONDS", "1.0")) # Releitura do banco (job rodando em outro processo)
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("CREW_SHUTDOWN_GRACE_SECONDS", "10"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS crew_jobs (
+    id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS crew_job_logs (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+)
+"""
+
+
+class JobNotFoundError(KeyError):
+    pass
+
+
+class JobStore:
+    """Persistência dos jobs em SQLite (substituível por uma tabela no Postgres)."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(crew_jobs)")}
+        if "heartbeat_at" not in columns: # Banco criado antes do lease
+            self._conn.execute("ALTER TABLE crew_jobs ADD COLUMN heartbeat_at REAL")
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO crew_jobs (id, topic, parameters, tenant_id, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["job_id"], job["topic"], json.dumps(job["parameters"]), job["tenant_id"], job["priority"], job["status"], job["created_at"]),
+            )
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE crew_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str, logs_from: int = 0) -> Optional[Dict[str, Any]]:
+        """Job com as linhas de log a partir da posição `logs_from` (cursor de quem acompanha)."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM crew_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            lines = self._conn.execute(
+                "SELECT line FROM crew_job_logs WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, logs_from),
+            ).fetchall()
+        return {**self._to_job(row), "logs": [line for (line,) in lines]}
+
+    def append_log(self, job_id: str, seq: int, line: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT INTO crew_job_logs (job_id, seq, line) VALUES (?, ?, ?)", (job_id, seq, line))
+
+    def queued(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM crew_jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def claim(self, job_id: str, now: float) -> bool:
+        """Passa o job de "queued" para "running"; False se outro worker já o assumiu."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE crew_jobs SET status = ?, started_at = ?, heartbeat_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, now, job_id, QUEUED),
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._conn.execute("DELETE FROM crew_job_logs WHERE job_id = ?", (job_id,)) # Retomado: recomeça do zero
+        return True
+
+    def heartbeat(self, job_id: str, now: float) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE crew_jobs SET heartbeat_at = ? WHERE id = ? AND status = ?", (now, job_id, RUNNING))
+
+    def requeue_stale(self, stale_before: float) -> List[Dict[str, Any]]:
+        """Devolve à fila os jobs "running" sem heartbeat desde `stale_before` e retorna os que voltaram."""
+        stale = "status = ? AND coalesce(heartbeat_at, started_at, 0) < ?"
+        requeued = []
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM crew_jobs WHERE {stale} ORDER BY created_at", (RUNNING, stale_before)).fetchall()
+            for row in rows:
+                cursor = self._conn.execute(
+                    f"UPDATE crew_jobs SET status = ?, started_at = NULL, heartbeat_at = NULL WHERE id = ? AND {stale}",
+                    (QUEUED, row["id"], RUNNING, stale_before),
+                )
+                if cursor.rowcount == 1: # Outro processo pode ter recolocado o mesmo job antes
+                    requeued.append(self._to_job(row))
+        return requeued
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "topic": row["topic"],
+            "parameters": json.loads(row["parameters"]),
+            "tenant_id": row["tenant_id"],
+            "priority": row["priority"],
+            "status": row["status"],
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+
+class CrewJobManager:
+    def __init__(self, db_path: Optional[str] = None, max_workers: int = MAX_WORKERS, max_per_tenant: int = MAX_PER_TENANT,
+                 lease_seconds: float = LEASE_SECONDS):
+        self.store = JobStore(db_path or DB_PATH)
+        self.max_workers = max_workers
+        self.max_per_tenant = max_per_tenant
+        self.lease_seconds = lease_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew")
+        self._pending: List[Tuple[int, int, str, str]] = [] # heap de (-priority, ordem, job_id, tenant_id)
+        self._order = itertools.count()
+        self._running_per_tenant: Dict[str, int] = {}
+        self._changed = asyncio.Condition()
+        self._log_changed = asyncio.Condition()
+        self._log_versions: Dict[str, int] = {} # Jobs rodando neste processo -> nº de notificações de log
+        self._workers: List[asyncio.Task] = []
+        self._running: Set[Future] = set() # Crews em execução nas threads do executor
+        self._closed = False
+        self._close_lock = threading.Lock() # Ordena o fechamento com os logs gravados pelas threads das crews
+
+    async def start(self) -> None:
+        self._requeue_stale()
+        already_pending = {entry[2] for entry in self._pending}
+        for job in self.store.queued():
+            if job["job_id"] not in already_pending:
+                self._enqueue(job["job_id"], job["tenant_id"], job["priority"])
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        self._workers.append(asyncio.create_task(self._reaper()))
+        logger.info(f"[crew_jobs] {self.max_workers} workers iniciados ({len(self._pending)} jobs pendentes).")
+
+    async def shutdown(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._running: # As threads não podem ser interrompidas: espera as crews até o limite
+            _, still_running = await asyncio.to_thread(wait, set(self._running), SHUTDOWN_GRACE_SECONDS)
+            if still_running:
+                logger.warning(f"[crew_jobs] {len(still_running)} crews ainda rodando no desligamento; seus logs serão descartados.")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.close()
+
+    def close(self) -> None:
+        """Fecha o banco; a partir daqui, logs das crews que ainda rodam são ignorados."""
+        with self._close_lock:
+            self._closed = True
+            self.store.close()
+
+    # --- API pública ---
+
+    async def submit(self, topic: str, parameters: Optional[Dict[str, Any]] = None,
+                     tenant_id: str = "default", priority: int = 0) -> Dict[str, Any]:
+        job = {
+            "job_id": uuid.uuid4().hex, "topic": topic, "parameters": parameters or {}, "tenant_id": tenant_id,
+            "priority": priority, "status": QUEUED, "created_at": time.time(),
+        }
+        self.store.insert(job)
+        async with self._changed:
+            self._enqueue(job["job_id"], tenant_id, priority)
+            self._changed.notify_all()
+        logger.info(f"[crew_jobs] Job {job['job_id']} enfileirado (tenant={tenant_id}, prioridade={priority}).")
+        return self.get(job["job_id"])
+
+    def get(self, job_id: str) -> Dict[str, Any]:
+        job = self.store.get(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job '{job_id}' não encontrado.")
+        return job
+
+    async def stream_logs(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Emite {"type": "log"} para cada nova linha e {"type": "done"} quando o job termina."""
+        sent = 0
+        while True:
+            version = self._log_versions.get(job_id) # Lida antes do banco: nada notificado depois disso se perde
+            job = await asyncio.to_thread(self.store.get, job_id, sent)
+            if job is None:
+                raise JobNotFoundError(f"Job '{job_id}' não encontrado.")
+            for line in job["logs"]:
+                yield {"type": "log", "line": line}
+            sent += len(job["logs"])
+            if job["status"] in FINISHED_STATUSES:
+                yield {"type": "done", "status": job["status"], "result": job["result"], "error": job["error"]}
+                return
+            async with self._log_changed:
+                try:
+                    await asyncio.wait_for(
+                        self._log_changed.wait_for(lambda: self._log_versions.get(job_id) != version), LOG_POLL_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    # --- Escalonamento ---
+
+    def _enqueue(self, job_id: str, tenant_id: str, priority: int) -> None:
+        heapq.heappush(self._pending, (-priority, next(self._order), job_id, tenant_id))
+
+    def _requeue_stale(self) -> int:
+        requeued = self.store.requeue_stale(time.time() - self.lease_seconds)
+        for job in requeued:
+            logger.warning(f"[crew_jobs] Job {job['job_id']} estava sem heartbeat (processo interrompido); recolocando na fila.")
+            self._enqueue(job["job_id"], job["tenant_id"], job["priority"])
+        return len(requeued)
+
+    async def _reaper(self) -> None:
+        """Recoloca periodicamente os jobs cujo lease expirou (ex: outro processo caiu no meio da execução)."""
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            async with self._changed:
+                if self._requeue_stale():
+                    self._changed.notify_all()
+
+    def _pop_eligible(self) -> Optional[Tuple[str, str]]:
+        """Job de maior prioridade cujo tenant ainda está abaixo do limite de concorrência."""
+        for entry in sorted(self._pending):
+            tenant_id = entry[3]
+            if self._running_per_tenant.get(tenant_id, 0) < self.max_per_tenant:
+                self._pending.remove(entry)
+                heapq.heapify(self._pending)
+                return entry[2], tenant_id
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._changed:
+                picked = self._pop_eligible()
+                while picked is None:
+                    await self._changed.wait()
+                    picked = self._pop_eligible()
+                job_id, tenant_id = picked
+                self._running_per_tenant[tenant_id] = self._running_per_tenant.get(tenant_id, 0) + 1
+            try:
+                await self._run(job_id)
+            except Exception as e: # Ex: banco bloqueado por outro processo; o worker não pode morrer
+                logger.error(f"[crew_jobs] Erro ao processar o job {job_id}: {e}", exc_info=True)
+                await self._fail(job_id, e)
+            finally:
+                async with self._changed:
+                    self._running_per_tenant[tenant_id] -= 1
+                    self._changed.notify_all()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        loop = asyncio.get_running_loop()
+        started_at = time.time()
+        if not self.store.claim(job_id, started_at):
+            logger.info(f"[crew_jobs] Job {job_id} já foi assumido por outro worker; ignorando.")
+            return
+        telemetry.STAGE_SECONDS.observe(started_at - job["created_at"], stage="crew.queue_wait")
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        self._log_versions[job_id] = 0
+        seq = itertools.count()
+
+        def on_log(line: str) -> None: # Chamado na thread da crew: a escrita no SQLite não ocupa o event loop
+            with self._close_lock:
+                if self._closed: # Crew que sobreviveu ao shutdown: banco e loop já não existem
+                    return
+                self.store.append_log(job_id, next(seq), line)
+                asyncio.run_coroutine_threadsafe(self._notify_logs(job_id), loop)
+
+        future = self._executor.submit(crew_service.kickoff_crew, job["topic"], job["parameters"], on_log)
+        self._running.add(future)
+        try:
+            result, _ = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self._log_versions.pop(job_id, None)
+            raise # Desligamento: o job continua "running" e volta para a fila quando o lease expirar
+        except Exception as e:
+            logger.error(f"[crew_jobs] Job {job_id} falhou: {e}", exc_info=True)
+            self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        else:
+            # Os logs já foram gravados pela thread antes de kickoff_crew retornar
+            self.store.update(job_id, status=SUCCEEDED, result=result, finished_at=time.time())
+            logger.info(f"[crew_jobs] Job {job_id} concluído.")
+        finally:
+            heartbeat.cancel()
+            if future.done(): # Cancelado no desligamento, segue em `_running` até a crew terminar
+                self._running.discard(future)
+        await self._notify_logs(job_id, finished=True)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                self.store.heartbeat(job_id, time.time())
+            except Exception as e: # Falha pontual: tenta de novo no próximo ciclo, bem antes do lease expirar
+                logger.warning(f"[crew_jobs] Heartbeat do job {job_id} falhou: {e}")
+
+    async def _fail(self, job_id: str, error: Exception) -> None:
+        """Marca o job como falho depois de um erro fora da crew (se o banco permitir) e libera quem o acompanha."""
+        try:
+            self.store.update(job_id, status=FAILED, error=str(error), finished_at=time.time())
+        except Exception as e:
+            logger.error(f"[crew_jobs] Não foi possível marcar o job {job_id} como falho: {e}")
+        await self._notify_logs(job_id, finished=True)
+
+    async def _notify_logs(self, job_id: str, finished: bool = False) -> None:
+        """Acorda os consumidores de `stream_logs`; ao terminar, o job sai de `_log_versions`."""
+        async with self._log_changed:
+            if finished:
+                self._log_versions.pop(job_id, None)
+            elif job_id in self._log_versions:
+                self._log_versions[job_id] += 1
+            self._log_changed.notify_all()
+
+
+_manager: Optional[CrewJobManager] = None
+_manager_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_job_manager() -> CrewJobManager:
+    """Manager do event loop atual, iniciado sob demanda (ou pelo lifespan da app)."""
+    global _manager, _manager_loop
+    loop = asyncio.get_running_loop()
+    if _manager is None or _manager_loop is not loop:
+        if _manager is not None: # Loop anterior encerrado (ex: testes); seus workers já não existem
+            _manager.close()
+        _manager, _manager_loop = CrewJobManager(), loop
+        await _manager.start()
+    return _manager
+
+
+async def shutdown_job_manager() -> None:
+    global _manager, _manager_loop
+    if _manager is not None:
+        await _manager.shutdown()
+        _manager, _manager_loop = None, None
@@ -1,29 +1,56 @@
 # Copie e cole para criar/atualizar o arquivo backend/app/services/crew_service.py:
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Callable
 import asyncio
 import logging
+import time
+
+from .. import telemetry
 
 logger = logging.getLogger(__name__)
 
-# Marcar a função como async
-async def run_specific_crew(topic: str, parameters: Optional[Dict[str, Any]] = None) -> Tuple[Any, Optional[List[str]]]:
+def kickoff_crew(topic: str, parameters: Optional[Dict[str, Any]] = None,
+                 on_log: Optional[Callable[[str], None]] = None) -> Tuple[Any, List[str]]:
     """
-    Placeholder para executar uma crew AI específica.
+    Placeholder (síncrono) para executar uma crew AI específica.
     Na Fase 7, esta função conterá a lógica para:
     1. Selecionar/Criar a Crew apropriada com base no 'topic'.
     2. Definir Agentes (com roles, goals, backstories, LLM, tools).
     3. Definir Tasks (com descriptions, expected_outputs, agents, context).
     4. Instanciar a Crew (com agents, tasks, process).
-    5. Executar a Crew com `crew.kickoff(inputs={...})`.
+    5. Executar a Crew com `crew.kickoff(inputs={...})` (bloqueante, por isso é síncrona).
     6. Formatar e retornar o resultado e logs/métricas.
+    `on_log` recebe cada linha de log assim que é produzida (ex: step_callback da Crew).
+    Deve rodar fora do event loop (thread), nunca diretamente em uma rota async.
     """
     logger.info(f"[crew_service] Iniciando crew (placeholder) para tópico: '{topic}' com params: {parameters}")
-    await asyncio.sleep(0.3) # Simula execução assíncrona
+    logs: List[str] = []
+
+    def log(line: str) -> None:
+        logs.append(line)
+        if on_log is not None:
+            on_log(line)
+
+    # TODO Fase 7: medir cada passo via step_callback/task_callback da Crew
+    with telemetry.span("crew.kickoff"):
+        log(f"INFO: Crew para '{topic}' iniciada.")
+        with telemetry.span("crew.setup"):
+            time.sleep(0.1) # Simula trabalho dos agentes
+        log("DEBUG: Agente Pesquisador buscando...")
+        with telemetry.span("crew.research"):
+            time.sleep(0.1)
+        log("DEBUG: Agente Escritor formatando...")
+        with telemetry.span("crew.writing"):
+            time.sleep(0.1)
     result = {
         "summary": f"Resultado placeholder para a análise do tópico '{topic}'.",
         "details": "Esta é uma resposta simulada pela crew placeholder.",
         "confidence": 0.5
     }
-    logs = [f"INFO: Crew para '{topic}' iniciada.", "DEBUG: Agente Pesquisador buscando...", "DEBUG: Agente Escritor formatando...", f"INFO: Crew para '{topic}' finalizada."]
+    log(f"INFO: Crew para '{topic}' finalizada.")
     logger.info(f"[crew_service] Crew (placeholder) finalizada.")
-    return result, logs
\ No newline at end of file
+    return result, logs
+
+# Marcar a função como async
+async def run_specific_crew(topic: str, parameters: Optional[Dict[str, Any]] = None) -> Tuple[Any, Optional[List[str]]]:
+    """Executa kickoff_crew em uma thread para não bloquear o event loop."""
+    return await asyncio.to_thread(kickoff_crew, topic, parameters)
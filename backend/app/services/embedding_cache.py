@@ -0,0 +1,66 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/embedding_cache.py:
+"""
+Cache persistente de embeddings da ingestão, por (modelo, hash do chunk).
+
+A ingestão identifica cada chunk pelo hash do seu texto normalizado (ingestion_pipeline.content_hash);
+chunks que já passaram por uma execução anterior, de qualquer fonte, não voltam ao provedor.
+Guardado em SQLite (um arquivo local, sem servidor); trocar EMBEDDING_MODEL invalida naturalmente
+as entradas, pois o modelo faz parte da chave.
+"""
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+
+from . import embedding_service
+
+_SQLITE_MAX_PARAMS = 500 # Hashes por consulta IN (...), abaixo do limite de parâmetros do SQLite
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, model: str = embedding_service.EMBEDDING_MODEL):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                           "(model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, hash))")
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Embeddings (float32) encontrados para os `hashes`; os ausentes ficam de fora."""
+        found = {}
+        for key, blob in self._select("hash, vector", hashes):
+            found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def contains_many(self, hashes: Iterable[str]) -> Set[str]:
+        """Quais `hashes` têm embedding no cache (sem ler os vetores; usado no dry run)."""
+        return {key for (key,) in self._select("hash", hashes)}
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        records = [(self.model, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)", records)
+            self._conn.execute("COMMIT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model,)).fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _select(self, columns: str, hashes: Iterable[str]) -> List[tuple]:
+        keys = list(dict.fromkeys(hashes))
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                part = keys[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(part))
+                rows.extend(self._conn.execute(
+                    f"SELECT {columns} FROM embeddings WHERE model = ? AND hash IN ({placeholders})", (self.model, *part)
+                ).fetchall())
+        return rows
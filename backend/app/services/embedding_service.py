@@ -0,0 +1,186 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/embedding_service.py:
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .. import telemetry
+from . import admission
+
+logger = logging.getLogger(__name__)
+
+# Dimensão DEVE corresponder à coluna 'embedding vector(1536)' de public.documents
+EMBEDDING_DIM = 1536
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _hash_embedding(text: str) -> np.ndarray:
+    """Embedding determinístico por feature hashing (bag-of-words), normalizado (L2)."""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % EMBEDDING_DIM
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[bucket] += sign
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+# Marcar a função como async
+async def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Placeholder para gerar embeddings de uma lista de textos.
+    Na Fase 7, esta função chamará o modelo de embedding (ex: OpenAI EMBEDDING_MODEL).
+    Por enquanto usa feature hashing: textos com palavras em comum ficam próximos,
+    o que basta para exercitar busca, cache e indexação localmente.
+    Retorna uma matriz float32 [len(texts), EMBEDDING_DIM] com linhas normalizadas.
+    """
+    logger.debug(f"[embedding_service] Gerando embeddings (placeholder) para {len(texts)} textos")
+    await asyncio.sleep(0.05) # Simula a chamada ao provedor
+    if not texts:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    return np.stack([_hash_embedding(text) for text in texts])
+
+
+# --- Micro-batching de chamadas de embedding ---
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64")) # Itens por chamada ao provedor
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5")) # Espera máxima para juntar pedidos
+
+
+class EmbeddingBatcher:
+    """
+    Junta pedidos de embedding de corrotinas concorrentes em uma única chamada ao provedor.
+    Um lote é enviado quando acumula `max_batch` textos ou quando o mais antigo espera
+    `max_wait_ms`. Textos idênticos pendentes ou em voo compartilham o mesmo resultado.
+    """
+
+    def __init__(self, max_batch: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._enqueued_at: Dict[str, float] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"requests": 0, "texts": 0, "deduplicated": 0, "batches": 0, "batched_texts": 0,
+                       "max_queue_depth": 0, "total_wait_seconds": 0.0, "errors": 0}
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        self._stats["requests"] += 1
+        self._stats["texts"] += len(texts)
+        futures = []
+        for text in texts:
+            future = self._pending.get(text) or self._in_flight.get(text)
+            if future is not None:
+                self._stats["deduplicated"] += 1
+            else:
+                future = loop.create_future()
+                self._pending[text] = future
+                self._enqueued_at[text] = loop.time()
+            futures.append(future)
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._pending))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        if not futures:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        # shield: o cancelamento de um chamador não cancela o resultado compartilhado com outros
+        return np.stack([await asyncio.shield(future) for future in futures])
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "total_wait_seconds": round(self._stats["total_wait_seconds"], 4),
+            "queue_depth": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "avg_batch_size": round(self._stats["batched_texts"] / batches, 2) if batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        loop = asyncio.get_running_loop()
+        while len(self._pending) >= self.max_batch or (self._pending and self._timer is None):
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                text, future = self._pending.popitem(last=False)
+                self._in_flight[text] = future
+                self._stats["total_wait_seconds"] += loop.time() - self._enqueued_at.pop(text)
+                batch.append((text, future))
+            task = loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            if self._pending and len(self._pending) < self.max_batch:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        self._stats["batches"] += 1
+        self._stats["batched_texts"] += len(batch)
+        try:
+            texts = [text for text, _ in batch]
+            # Lote compartilhado entre requisições: sem prazo próprio, cada chamador limita a sua espera
+            async with admission.get_controller().provider("embedding", admission.estimate_tokens(*texts)):
+                with telemetry.span("embedding.batch", size=len(batch)):
+                    embeddings = await embed_texts(texts)
+        except Exception as e:
+            self._stats["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception() # Marca como lida: nem todo waiter chega a aguardar este future
+        else:
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        finally:
+            for text, _ in batch:
+                self._in_flight.pop(text, None)
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_batcher() -> EmbeddingBatcher:
+    """Batcher compartilhado do event loop atual (futures pertencem a um único loop)."""
+    global _batcher, _batcher_loop
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher_loop is not loop:
+        _batcher, _batcher_loop = EmbeddingBatcher(), loop
+    return _batcher
+
+
+async def embed_coalesced(texts: List[str]) -> np.ndarray:
+    """Como embed_texts, mas passando pelo micro-batcher compartilhado entre requisições."""
+    return await get_batcher().embed(texts)
+
+
+async def embed_bulk(texts: List[str]) -> np.ndarray:
+    """
+    Embeddings de um lote já montado pelo chamador (ex: ingestão, por orçamento de tokens) em uma única
+    chamada ao provedor: não passa pelo micro-batcher, então não é dividido em EMBED_MAX_BATCH.
+    A vaga do provedor é pedida como `bulk`: espera atrás das consultas interativas, sem o timeout da fila.
+    """
+    async with admission.get_controller().provider("embedding", admission.estimate_tokens(*texts), bulk=True):
+        with telemetry.span("embedding.bulk", size=len(texts)):
+            return await embed_texts(texts)
+
+
+def get_batcher_stats() -> Dict[str, Any]:
+    return _batcher.stats() if _batcher is not None else EmbeddingBatcher().stats()
@@ -1,28 +1,340 @@
 # Copie e cole para criar/atualizar o arquivo backend/app/services/guardrails_service.py:
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, AsyncIterator, Tuple
 import asyncio
+import contextlib
+import json
 import logging
+import os
+
+from .. import telemetry
+from . import admission, batching, spec_registry
 
 logger = logging.getLogger(__name__)
 
+PLACEHOLDER_LLM_SECONDS = 0.1 # Latência simulada da chamada ao LLM (placeholder)
+PLACEHOLDER_CHUNK_CHARS = 16 # Tamanho dos chunks simulados do stream do LLM (modo multi-candidato)
+# Modo multi-candidato (num_candidates > 1): teto de candidatos gerados em paralelo por requisição
+MAX_CANDIDATES = int(os.getenv("GUARDRAILS_MAX_CANDIDATES", "4"))
+BATCH_CONCURRENCY = int(os.getenv("GUARDRAILS_BATCH_CONCURRENCY", "8")) # Itens em voo por lote (stream_batch)
+
 # Exceção customizada para Guardrails (exemplo)
 class GuardrailsValidationError(ValueError):
-    pass
+    def __init__(self, message: str, usage: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.usage = usage # Candidatos e tokens gastos até a falha (quando disponível)
 
 # Marcar a função como async
-async def generate_and_validate(prompt: str, spec_name: str, num_reasks: int = 1) -> Optional[Union[Dict, List, str]]:
+async def generate_and_validate(prompt: str, spec_name: str, num_reasks: int = 1,
+                                deadline: Optional[admission.Deadline] = None,
+                                num_candidates: int = 1) -> Optional[Union[Dict, List, str]]:
+    """Versão não-streaming: consome stream_generate_and_validate e retorna os dados validados."""
+    validated_data, _ = await generate_and_validate_with_usage(prompt, spec_name, num_reasks, deadline, num_candidates)
+    return validated_data
+
+async def generate_and_validate_with_usage(prompt: str, spec_name: str, num_reasks: int = 1,
+                                           deadline: Optional[admission.Deadline] = None,
+                                           num_candidates: int = 1) -> Tuple[Optional[Union[Dict, List, str]], Dict[str, Any]]:
+    """Como generate_and_validate, mas também retorna o consumo (candidatos e tokens, ver _new_usage)."""
+    validated_data, usage = None, {}
+    async for event in stream_generate_and_validate(prompt, spec_name, num_reasks, deadline, num_candidates):
+        if event["type"] == "usage":
+            usage = event["usage"]
+        elif event["type"] == "done":
+            validated_data = event["validated_data"]
+    return validated_data, usage
+
+async def stream_batch(items: List[Dict[str, Any]],
+                       deadline: Optional[admission.Deadline] = None) -> AsyncIterator[Dict[str, Any]]:
     """
-    Placeholder para geração validada usando Guardrails.
+    Lote de pedidos ({"prompt", "spec_name", "num_reasks", "num_candidates"}): itens idênticos rodam
+    uma vez e os demais com até BATCH_CONCURRENCY em voo (cada chamada ao LLM ainda passa pela vaga
+    do provedor). Emite `accepted`, um `result` ({"validated_data", "usage"}) ou `error` por item,
+    na ordem em que terminam, e `done`.
+    """
+    groups = batching.group_duplicates(items)
+    yield {"type": "accepted", "items": len(items), "unique": len(groups)}
+    jobs = [_batch_job(items[group[0]], deadline) for group in groups]
+    async for event in batching.fan_out(groups, jobs, BATCH_CONCURRENCY):
+        yield event
+
+def _batch_job(item: Dict[str, Any], deadline: Optional[admission.Deadline]) -> batching.Job:
+    async def job() -> Dict[str, Any]:
+        validated_data, usage = await generate_and_validate_with_usage(
+            item["prompt"], item["spec_name"], item["num_reasks"], deadline, item["num_candidates"])
+        return {"validated_data": validated_data, "usage": usage}
+    return job
+
+async def stream_generate_and_validate(prompt: str, spec_name: str, num_reasks: int = 1,
+                                       deadline: Optional[admission.Deadline] = None,
+                                       num_candidates: int = 1) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Placeholder para geração validada usando Guardrails, emitida como eventos:
+    um {"type": "field"} por campo aceito (saídas em dict), {"type": "usage"} com candidatos e tokens
+    gastos e {"type": "done"} com o resultado completo. No modo serial com modelo Pydantic, cada campo
+    sai assim que a validação incremental o aceita, enquanto o LLM ainda gera os seguintes; os que só
+    passam pelo Guard (ou que ele corrige) saem ao final.
     Na Fase 7, esta função conterá a lógica para:
     1. Carregar a especificação Guardrails (arquivo .rail ou modelo Pydantic de app/specs).
     2. Inicializar o objeto `Guard` com a especificação.
-    3. Chamar o LLM através do método `guard()` ou `guard.parse()`.
+    3. Chamar o LLM através de `guard(..., stream=True)`, repassando os campos validados parciais.
     4. Tratar o resultado (output validado ou erro/histórico de validação).
     5. Retornar os dados validados ou levantar `GuardrailsValidationError`.
+    Como é um gerador, fechá-lo (cliente desconectou) interrompe a geração.
+    Com `deadline`, a chamada ao LLM não começa com o prazo esgotado e os re-asks são reduzidos
+    ao que cabe no tempo restante.
+    Com `num_candidates` > 1 (opt-in), em vez do ciclo serial gerar -> validar -> re-ask, gera vários
+    candidatos em paralelo e fica com o primeiro válido (ver _generate_candidates).
     """
     logger.info(f"[guardrails_service] Gerando e validando (placeholder) prompt com spec '{spec_name}' (reasks={num_reasks})")
-    await asyncio.sleep(0.2) # Simula chamada LLM + validação assíncrona
+    spec = spec_registry.get_registry().get(spec_name) # Guard já compilado no startup
+    controller = admission.get_controller()
+    llm_tokens = admission.estimate_tokens(prompt) + admission.LLM_OUTPUT_TOKENS
+    if deadline is not None:
+        deadline.check("guardrails.llm_call")
+    usage = _new_usage(prompt, candidates=1)
+    sent: Dict[str, Any] = {} # Campos já emitidos -> valor
+    if spec is None:
+        async with controller.provider("llm", llm_tokens, deadline):
+            with telemetry.span("guardrails.llm_call"):
+                await asyncio.sleep(PLACEHOLDER_LLM_SECONDS) # Simula o início da chamada LLM + validação assíncrona
+        validated_data = _placeholder_output(spec_name)
+        telemetry.GUARDRAILS_VALIDATIONS.inc(spec=spec_name, path="placeholder", outcome="passed")
+    elif num_candidates > 1:
+        validated_data, usage = await _generate_candidates(prompt, spec, min(num_candidates, MAX_CANDIDATES),
+                                                           num_reasks, deadline)
+    else:
+        validator = IncrementalValidator(spec)
+        async with controller.provider("llm", llm_tokens, deadline):
+            with telemetry.span("guardrails.llm_call"):
+                async with contextlib.aclosing(_stream_llm(prompt, spec, 0)) as chunks:
+                    async for chunk in chunks:
+                        usage["completion_tokens"] += admission.estimate_tokens(chunk)
+                        validator.feed(chunk)
+                        # Sem modelo Pydantic, validate_field não valida nada: os campos esperam o Guard
+                        for name, value in validator.fields[len(sent):] if spec.model is not None else ():
+                            sent[name] = value
+                            yield {"type": "field", "name": name, "value": value}
+        raw_output = validator.text
+        # Caminho rápido: saída já válida na primeira tentativa dispensa o Guard e os re-asks
+        with telemetry.span("guardrails.validate_fast"):
+            validated_data = spec.validate_fast(raw_output)
+        if validated_data is None:
+            num_reasks = _affordable_reasks(num_reasks, deadline, controller.expected_latency("llm"))
+            with telemetry.span("guardrails.validate_guard"):
+                validated_data = await _validate_with_guard(spec, raw_output, num_reasks, usage)
+        else:
+            telemetry.GUARDRAILS_VALIDATIONS.inc(spec=spec_name, path="fast", outcome="passed")
+    telemetry.LLM_TOKENS.inc(usage["completion_tokens"], service="guardrails")
+    if isinstance(validated_data, dict): # Campos que faltaram (ou que o Guard corrigiu)
+        for name, value in validated_data.items():
+            if name not in sent or sent[name] != value:
+                yield {"type": "field", "name": name, "value": value}
+    yield {"type": "usage", "usage": usage}
+    yield {"type": "done", "validated_data": validated_data}
+
+def _new_usage(prompt: str, candidates: int) -> Dict[str, Any]:
+    """Consumo de uma geração; tokens estimados (admission.estimate_tokens), não os cobrados pelo provedor."""
+    return {
+        "mode": "parallel" if candidates > 1 else "serial",
+        "candidates": candidates, # Gerações iniciadas
+        "completed": 0, # Gerações que chegaram ao fim sem serem abortadas ou canceladas
+        "aborted_early": 0, # Abortadas pela validação incremental
+        "cancelled": 0, # Canceladas porque outro candidato passou antes
+        "failed": 0, # Erro na chamada ao LLM
+        "winner": None, # Índice do candidato aceito
+        "reasks": 0,
+        "prompt_tokens": admission.estimate_tokens(prompt) * candidates,
+        "completion_tokens": 0,
+    }
+
+class IncrementalValidator:
+    """
+    Acompanha a saída do LLM chunk a chunk e valida cada campo de nível superior do objeto JSON
+    assim que ele termina (spec.validate_field). Um campo inválido ou uma saída que não é um
+    objeto JSON condena o candidato antes do fim da geração. Os campos aceitos até o primeiro
+    erro ficam em `fields`, na ordem em que chegaram.
+    """
+
+    def __init__(self, spec: spec_registry.CompiledSpec):
+        self.spec = spec
+        self.text = ""
+        self.error: Optional[str] = None
+        self.fields: List[Tuple[str, Any]] = []
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._field_start: Optional[int] = None # Início do campo corrente (após '{' ou ',')
+        self._closed = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Acrescenta um chunk; retorna a mensagem de erro se o candidato já está condenado."""
+        self.text += chunk
+        text = self.text
+        for i in range(self._scanned, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char.isspace():
+                continue
+            elif self._depth == 0 and (self._closed or char != "{"):
+                self.error = "saída não é um único objeto JSON"
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._field_start = i + 1
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._closed = True
+                    self._check_field(text[self._field_start:i])
+            elif char == "," and self._depth == 1:
+                self._check_field(text[self._field_start:i])
+                self._field_start = i + 1
+            if self.error is not None:
+                break
+        self._scanned = len(text)
+        return self.error
+
+    def _check_field(self, segment: str) -> None:
+        if not segment.strip(): # Objeto vazio
+            return
+        try:
+            field = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            self.error = "JSON malformado"
+            return
+        for name, value in field.items():
+            self.error = self.error or self.spec.validate_field(name, value)
+            if self.error is None:
+                self.fields.append((name, value))
+
+async def _generate_candidates(prompt: str, spec: spec_registry.CompiledSpec, num_candidates: int, num_reasks: int,
+                               deadline: Optional[admission.Deadline]) -> Tuple[Union[Dict, List, str], Dict[str, Any]]:
+    """
+    Gera `num_candidates` saídas em paralelo (cada uma ocupa uma vaga de LLM no controle de admissão),
+    valida cada uma incrementalmente enquanto chega e retorna a primeira que passa no caminho rápido,
+    cancelando as demais. Se nenhuma passar, a última saída completa vai para o Guard com os re-asks
+    que couberem no prazo; sem Guard, levanta GuardrailsValidationError.
+    """
+    usage = _new_usage(prompt, num_candidates)
+    completed_outputs: List[str] = []
+    errors: List[BaseException] = []
+    tasks = [asyncio.create_task(_run_candidate(i, prompt, spec, deadline, usage)) for i in range(num_candidates)]
+    validated_data = None
+    try:
+        with telemetry.span("guardrails.candidates", spec=spec.name, candidates=num_candidates):
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    index, raw_output, validated = await next_done
+                except Exception as e: # Falha de um candidato não derruba os outros
+                    usage["failed"] += 1
+                    errors.append(e)
+                    continue
+                if raw_output is not None:
+                    completed_outputs.append(raw_output)
+                if validated is not None:
+                    validated_data, usage["winner"] = validated, index
+                    break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                usage["cancelled"] += 1
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for outcome in ("completed", "aborted_early", "cancelled", "failed"):
+        telemetry.GUARDRAILS_CANDIDATES.inc(usage[outcome], spec=spec.name, outcome=outcome)
+
+    if validated_data is not None:
+        telemetry.GUARDRAILS_VALIDATIONS.inc(spec=spec.name, path="candidates", outcome="passed")
+        return validated_data, usage
+    if not completed_outputs:
+        admission_errors = [e for e in errors if isinstance(e, admission.ADMISSION_ERRORS)]
+        if admission_errors: # Sem capacidade para nenhum candidato: vira 503/504 na rota
+            raise admission_errors[0]
+        telemetry.GUARDRAILS_VALIDATIONS.inc(spec=spec.name, path="candidates", outcome="failed")
+        raise GuardrailsValidationError(
+            f"Nenhum dos {num_candidates} candidatos gerou saída válida para a spec '{spec.name}'.", usage=usage)
+    num_reasks = _affordable_reasks(num_reasks, deadline, admission.get_controller().expected_latency("llm"))
+    try:
+        with telemetry.span("guardrails.validate_guard"):
+            return await _validate_with_guard(spec, completed_outputs[-1], num_reasks, usage), usage
+    except GuardrailsValidationError as e:
+        e.usage = usage
+        raise
+
+async def _run_candidate(index: int, prompt: str, spec: spec_registry.CompiledSpec,
+                         deadline: Optional[admission.Deadline],
+                         usage: Dict[str, Any]) -> Tuple[int, Optional[str], Optional[Union[Dict, List, str]]]:
+    """Gera um candidato; retorna (índice, saída completa ou None se abortado, dados validados ou None)."""
+    validator = IncrementalValidator(spec)
+    llm_tokens = admission.estimate_tokens(prompt) + admission.LLM_OUTPUT_TOKENS
+    async with admission.get_controller().provider("llm", llm_tokens, deadline):
+        # aclosing: ao abortar (ou ser cancelado), fecha o stream e interrompe a geração no LLM
+        async with contextlib.aclosing(_stream_llm(prompt, spec, index)) as chunks:
+            async for chunk in chunks:
+                usage["completion_tokens"] += admission.estimate_tokens(chunk)
+                if validator.feed(chunk) is not None:
+                    usage["aborted_early"] += 1
+                    logger.info(f"[guardrails_service] Candidato {index} da spec '{spec.name}' abortado: {validator.error}")
+                    return index, None, None
+    usage["completed"] += 1
+    return index, validator.text, spec.validate_fast(validator.text)
+
+async def _call_llm(prompt: str, spec: spec_registry.CompiledSpec) -> str:
+    """Placeholder para a chamada ao LLM que gera a saída bruta (JSON) para a spec."""
+    # TODO Fase 7: chamar o LLM com o prompt formatado pela spec (ex: litellm.acompletion)
+    await asyncio.sleep(PLACEHOLDER_LLM_SECONDS)
+    return json.dumps({"name": "Placeholder User", "age": 30, "interests": ["AI", "Cloud"]})
+
+async def _stream_llm(prompt: str, spec: spec_registry.CompiledSpec, candidate: int) -> AsyncIterator[str]:
+    """Placeholder para a chamada ao LLM com streaming (modo serial e cada candidato do multi-candidato)."""
+    # TODO Fase 7: litellm.acompletion(..., stream=True) com temperatura > 0 para os candidatos divergirem
+    raw_output = await _call_llm(prompt, spec)
+    for start in range(0, len(raw_output), PLACEHOLDER_CHUNK_CHARS):
+        await asyncio.sleep(0) # Simula a chegada do próximo chunk
+        yield raw_output[start:start + PLACEHOLDER_CHUNK_CHARS]
+
+async def _validate_with_guard(spec: spec_registry.CompiledSpec, raw_output: str, num_reasks: int,
+                               usage: Optional[Dict[str, Any]] = None) -> Union[Dict, List, str]:
+    """Validação completa pelo Guard compartilhado (com re-asks), usada quando o caminho rápido falha."""
+    if spec.guard is None:
+        raise GuardrailsValidationError(f"Saída inválida para a spec '{spec.name}' e guardrails-ai indisponível para re-ask.")
+    # TODO Fase 7: passar llm_api para que os re-asks chamem o LLM novamente (via admission, como _call_llm)
+    outcome = await spec.guard.parse(raw_output, num_reasks=num_reasks)
+    reasks = _reasks_used(spec.guard)
+    telemetry.GUARDRAILS_REASKS.inc(reasks, spec=spec.name)
+    if usage is not None:
+        usage["reasks"] = reasks
+    telemetry.GUARDRAILS_VALIDATIONS.inc(spec=spec.name, path="guard", outcome="passed" if outcome.validation_passed else "failed")
+    if not outcome.validation_passed:
+        raise GuardrailsValidationError(f"Falha na validação para a spec '{spec.name}': {outcome.error}", usage=usage)
+    return outcome.validated_output
+
+def _affordable_reasks(num_reasks: int, deadline: Optional[admission.Deadline], llm_latency: float) -> int:
+    """Re-asks que cabem no prazo restante, estimando cada um pela latência recente do LLM."""
+    if deadline is None or llm_latency <= 0:
+        return num_reasks
+    affordable = min(num_reasks, int(deadline.remaining() // llm_latency))
+    if affordable < num_reasks:
+        logger.info(f"[guardrails_service] Prazo curto ({deadline.remaining():.1f}s); re-asks reduzidos de {num_reasks} para {affordable}.")
+    return affordable
+
+def _reasks_used(guard: Any) -> int:
+    """Re-asks da última chamada (iterações do histórico do Guard além da primeira)."""
+    try:
+        return max(0, len(guard.history.last.iterations) - 1)
+    except (AttributeError, TypeError):
+        return 0
 
+def _placeholder_output(spec_name: str) -> Union[Dict, List, str]:
     # Simula um resultado validado baseado na spec (exemplo)
     if spec_name == "UserProfileSpec":
         logger.debug(f"Retornando placeholder para UserProfileSpec")
@@ -37,4 +349,4 @@ async def generate_and_validate(prompt: str, spec_name: str, num_reasks: int = 1
         logger.debug(f"Retornando placeholder genérico para spec Pydantic/outra '{spec_name}'")
         return f"Resultado placeholder validado para spec '{spec_name}'."
 
-# Funções auxiliares para carregar specs podem ser adicionadas aqui na Fase 7
\ No newline at end of file
+# Funções auxiliares para carregar specs podem ser adicionadas aqui na Fase 7
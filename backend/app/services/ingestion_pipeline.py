@@ -0,0 +1,841 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/ingestion_pipeline.py:
+"""
+Pipeline de ingestão em estágios (streaming) usado por rag_service.load_and_index_data.
+
+    leitura -> chunking (process pool) -> embeddings (lotes por orçamento de tokens) -> gravação
+
+Cada estágio é uma corrotina ligada ao próximo por uma `asyncio.Queue` limitada: se a gravação
+fica lenta, as filas enchem e os estágios anteriores param de ler (backpressure), então a
+memória fica constante independentemente do tamanho do corpus.
+
+Os estágios preservam a ordem dos documentos (cada um recebe um `seq`). Isso permite um
+checkpoint compacto: "todos os documentos com seq < next_seq estão gravados", mais o ponto
+de retomada de cada destino (sink). Após uma falha, a próxima execução pula esses documentos
+e descarta o que foi gravado depois do checkpoint.
+
+Reindexação incremental: cada chunk é identificado pelo hash do seu texto normalizado e cada
+documento pela sua chave de origem (`source_id` ou metadata["source"]; documentos que repetem a
+origem, como as páginas de um PDF, viram "origem#2", "origem#3"...). Um manifesto em SQLite
+(IngestionManifest) guarda, por origem, o hash do documento e os hashes dos chunks da última
+execução concluída; ele é consultado origem a origem e a execução em andamento é gravada em disco,
+então o manifesto também não cresce na memória com o corpus. Na execução seguinte:
+- documentos inalterados não são re-chunkados nem reembedados;
+- de documentos alterados, só os chunks novos vão para o provedor de embeddings (e os que já
+  estão no EmbeddingCache, de qualquer origem, também não);
+- os destinos recebem só o delta (`apply_delta`): o Postgres insere os chunks novos e apaga em
+  lote os órfãos e as origens removidas. O índice local é imutável por versão, então é
+  reescrito por inteiro (`full_rewrite`), mas com os embeddings vindos do cache.
+`plan()` (dry run) calcula o mesmo delta sem gravar nada e estima o custo em embeddings.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .. import telemetry
+from . import embedding_service
+from .embedding_cache import EmbeddingCache
+from .resources import INSERT_DOCUMENT_SQL, to_vector_literal
+from .vector_index import LocalIndexWriter
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = (".txt", ".md")
+_DONE = object() # Sentinela de fim de fila
+_MANIFEST_PAGE = 500 # Origens por gravação / por página do delta no manifesto
+
+
+# --- Fontes e chunking ---
+
+def iter_directory_documents(directory: str) -> Iterator[Dict[str, Any]]:
+    """Lê arquivos .txt/.md (e .pdf, se pypdf estiver instalado) em ordem determinística."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relpath = os.path.relpath(path, directory)
+            if name.lower().endswith(TEXT_EXTENSIONS):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    content = f.read()
+            elif name.lower().endswith(".pdf"):
+                try:
+                    from pypdf import PdfReader
+                except ImportError:
+                    logger.warning(f"[ingestion] pypdf não instalado; ignorando '{relpath}'.")
+                    continue
+                content = "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+            else:
+                continue
+            yield {"source_id": relpath, "content": content, "metadata": {"source": relpath}}
+
+
+def split_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """Divisor simples por caracteres com sobreposição (substituir por um Text Splitter na Fase 7)."""
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+    step = chunk_size - overlap
+    return [text[start:start + chunk_size] for start in range(0, len(text) - overlap, step)]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata (~4 caracteres por token) usada para montar lotes de embedding."""
+    return len(text) // 4 + 1
+
+
+# --- Identidade de documentos e chunks (reindexação incremental) ---
+
+def content_hash(text: str) -> str:
+    """Hash do texto com espaços normalizados: identifica um chunk entre execuções e origens."""
+    return hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def document_hash(doc: Dict[str, Any]) -> str:
+    """Hash do conteúdo bruto e do metadata: qualquer mudança no documento o marca como alterado."""
+    metadata = json.dumps(doc.get("metadata") or {}, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{doc['content']}\0{metadata}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def document_key(doc: Dict[str, Any], doc_hash: str) -> str:
+    """Origem do documento; sem `source_id` nem metadata["source"], o próprio conteúdo o identifica."""
+    return doc.get("source_id") or (doc.get("metadata") or {}).get("source") or f"hash:{doc_hash}"
+
+
+def hash_chunks(texts: List[str]) -> List[Tuple[str, str]]:
+    return [(content_hash(text), text) for text in texts]
+
+
+# --- Métricas ---
+
+def _new_delta() -> Dict[str, int]:
+    return dict.fromkeys(("documents_new", "documents_changed", "documents_unchanged", "documents_removed",
+                          "chunks_new", "chunks_reused", "chunks_orphaned", "embeddings_computed", "embeddings_cached"), 0)
+
+
+@dataclass
+class StageStats:
+    name: str
+    items_in: int = 0
+    items_out: int = 0
+    busy_seconds: float = 0.0     # Tempo fazendo trabalho útil
+    blocked_seconds: float = 0.0  # Tempo esperando espaço na fila seguinte (backpressure)
+    max_queue_depth: int = 0      # Maior ocupação observada na fila de saída
+
+    def as_dict(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "items_per_second": round(self.items_out / elapsed, 2) if elapsed > 0 else 0.0,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+async def _put(queue: asyncio.Queue, item: Any, stats: StageStats) -> None:
+    started = time.perf_counter()
+    await queue.put(item)
+    stats.blocked_seconds += time.perf_counter() - started
+    stats.max_queue_depth = max(stats.max_queue_depth, queue.qsize())
+
+
+# --- Checkpoint ---
+
+class IngestionCheckpoint:
+    """Checkpoint em um arquivo JSON pequeno, regravado de forma atômica."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, state: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+_MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS manifest_sources (key TEXT PRIMARY KEY, document_hash TEXT NOT NULL, chunks TEXT NOT NULL);
+CREATE TEMP TABLE IF NOT EXISTS pending_sources (key TEXT PRIMARY KEY, document_hash TEXT NOT NULL, chunks TEXT NOT NULL);
+CREATE TEMP TABLE IF NOT EXISTS plan_chunks (hash TEXT PRIMARY KEY, tokens INTEGER NOT NULL);
+CREATE TEMP TABLE IF NOT EXISTS run_keys (key TEXT PRIMARY KEY, next INTEGER NOT NULL);
+"""
+
+
+class IngestionManifest:
+    """
+    Estado da última ingestão concluída, por origem: {"document_hash", "chunks": [hashes]}, em SQLite.
+    A execução em andamento grava as suas origens em uma tabela temporária da conexão (`record`),
+    que só substitui o estado concluído em `commit()`; o delta entre as duas é lido em páginas.
+    Um manifesto gravado com outra configuração (tamanho de chunk, modelo) é ignorado.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_MANIFEST_SCHEMA)
+        self._pending: List[Tuple[str, str, str]] = []
+        self._matches = False # Configuração gravada == a desta execução
+
+    def begin(self, config: Dict[str, Any]) -> None:
+        """Começa uma execução (ou dry run): descarta o que estava pendente e confere a configuração."""
+        self._pending = []
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_sources")
+            self._conn.execute("DELETE FROM plan_chunks")
+            self._conn.execute("DELETE FROM run_keys")
+            row = self._conn.execute("SELECT value FROM manifest_meta WHERE key = 'config'").fetchone()
+        self._matches = row is not None and json.loads(row[0]) == config
+
+    def claim_key(self, base: str) -> str:
+        """
+        Chave única nesta execução para um documento da origem `base`: a própria origem na primeira
+        ocorrência e "origem#N" nas seguintes, na ordem de leitura (estável entre execuções).
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT next FROM run_keys WHERE key = ?", (base,)).fetchone()
+            n = row[0] if row is not None else 1
+            key = base if n == 1 else f"{base}#{n}"
+            while n > 1 and self._conn.execute("SELECT 1 FROM run_keys WHERE key = ?", (key,)).fetchone():
+                n += 1 # Outra origem já se chama "origem#N"
+                key = f"{base}#{n}"
+            self._conn.execute("INSERT OR REPLACE INTO run_keys (key, next) VALUES (?, ?)", (base, n + 1))
+            if key != base:
+                self._conn.execute("INSERT OR IGNORE INTO run_keys (key, next) VALUES (?, 2)", (key,))
+        return key
+
+    def previous(self, key: str) -> Optional[Dict[str, Any]]:
+        """Entrada da origem na última execução concluída (None se nova ou com outra configuração)."""
+        if not self._matches:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT document_hash, chunks FROM manifest_sources WHERE key = ?", (key,)).fetchone()
+        return {"document_hash": row[0], "chunks": json.loads(row[1])} if row is not None else None
+
+    def record(self, key: str, doc_hash: str, chunks: List[str]) -> None:
+        """Registra a origem nesta execução; gravado na tabela temporária a cada _MANIFEST_PAGE origens."""
+        self._pending.append((key, doc_hash, json.dumps(chunks)))
+        if len(self._pending) >= _MANIFEST_PAGE:
+            self._flush()
+
+    def plan_chunk(self, chunk_hash: str, tokens: int) -> None:
+        """Dry run: chunk que a execução embedaria (sem repetição entre documentos)."""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO plan_chunks (hash, tokens) VALUES (?, ?)", (chunk_hash, tokens))
+
+    def plan_chunks_page(self, after: str, limit: int = 500) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._conn.execute("SELECT hash, tokens FROM plan_chunks WHERE hash > ? ORDER BY hash LIMIT ?",
+                                      (after, limit)).fetchall()
+
+    def changed_page(self, after: str, limit: int = 500) -> List[Tuple[str, List[str], List[str]]]:
+        """Origens novas ou alteradas nesta execução, após `after`: (origem, chunks novos, chunks anteriores)."""
+        self._flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.key, p.chunks, s.chunks FROM pending_sources p "
+                "LEFT JOIN manifest_sources s ON ? AND s.key = p.key "
+                "WHERE p.key > ? AND (s.key IS NULL OR s.document_hash != p.document_hash) ORDER BY p.key LIMIT ?",
+                (self._matches, after, limit),
+            ).fetchall()
+        return [(key, json.loads(new), json.loads(old) if old is not None else []) for key, new, old in rows]
+
+    def removed_page(self, after: str, limit: int = 500) -> List[Tuple[str, List[str]]]:
+        """Origens da última execução concluída que não apareceram nesta: (origem, chunks anteriores)."""
+        if not self._matches:
+            return []
+        self._flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.key, s.chunks FROM manifest_sources s WHERE s.key > ? "
+                "AND NOT EXISTS (SELECT 1 FROM pending_sources p WHERE p.key = s.key) ORDER BY s.key LIMIT ?",
+                (after, limit),
+            ).fetchall()
+        return [(key, json.loads(chunks)) for key, chunks in rows]
+
+    def commit(self, config: Dict[str, Any], prune: bool) -> None:
+        """
+        Torna esta execução o estado concluído, em uma transação. Sem `prune`, as origens que não
+        apareceram continuam como estavam.
+        """
+        self._flush()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            if prune or not self._matches:
+                self._conn.execute("DELETE FROM manifest_sources")
+            self._conn.execute("INSERT OR REPLACE INTO manifest_sources SELECT key, document_hash, chunks FROM pending_sources")
+            self._conn.execute("INSERT OR REPLACE INTO manifest_meta (key, value) VALUES ('config', ?)", (json.dumps(config),))
+            self._conn.execute("COMMIT")
+            self._conn.execute("DELETE FROM pending_sources")
+        self._matches = True
+
+    def discard(self) -> None:
+        """Descarta o que esta execução registrou (ex: dry run), sem tocar no estado concluído."""
+        self._pending = []
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_sources")
+            self._conn.execute("DELETE FROM plan_chunks")
+            self._conn.execute("DELETE FROM run_keys")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO pending_sources (key, document_hash, chunks) VALUES (?, ?, ?)",
+                                   pending)
+            self._conn.execute("COMMIT")
+
+
+# --- Destinos (sinks) ---
+
+class LocalIndexSink:
+    """Grava no índice vetorial local; a versão só é publicada em `finalize()`."""
+
+    name = "local_index"
+    full_rewrite = True # Cada execução publica uma versão completa
+
+    def __init__(self, index_dir: str, dim: int, quantization: str = "float32"):
+        self.index_dir = index_dir
+        self.dim = dim
+        self.quantization = quantization
+        self.writer: Optional[LocalIndexWriter] = None
+
+    async def open(self, resume_state: Optional[Dict[str, Any]], next_seq: int) -> None:
+        self.writer = LocalIndexWriter(self.index_dir, self.dim, self.quantization,
+                                       staging="ingestion", resume_state=resume_state)
+
+    async def write(self, rows: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        rows = [{"id": row["id"], "content": row["content"], "metadata": row["metadata"]} for row in rows]
+        await asyncio.to_thread(self.writer.add, rows, embeddings)
+
+    async def state(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.writer.state)
+
+    async def apply_delta(self, replaced: Dict[str, List[str]], removed: List[str]) -> None:
+        pass # A nova versão já contém só os chunks atuais
+
+    async def finalize(self) -> None:
+        await asyncio.to_thread(self.writer.finalize)
+
+    async def close(self) -> None:
+        self.writer.close()
+
+
+class PostgresSink:
+    """
+    Grava em public.documents em lotes com `executemany` do asyncpg (um único round trip
+    em pipeline por lote), usando um statement preparado uma vez por execução.
+    O embedding vai como texto e é convertido com `::text::vector`,
+    pois o asyncpg não tem codec binário para o tipo `vector` do pgvector.
+    Cada linha leva `ingest_run`/`ingest_seq` no metadata; ao retomar, as linhas da mesma
+    execução gravadas depois do checkpoint (seq >= next_seq) são apagadas antes de continuar.
+    Com `pool` (resources.DatabasePool), usa uma conexão do pool compartilhado durante a execução.
+    Reindexação incremental: cada linha também leva `source_id`/`content_hash`; linhas de chunks
+    que já existem (`existing`) não são regravadas e `apply_delta` apaga os órfãos em lote.
+    """
+
+    name = "postgres"
+    full_rewrite = False
+
+    def __init__(self, dsn: str, pool: Optional[Any] = None):
+        self.dsn = dsn
+        self.pool = pool
+        self.run_id: Optional[str] = None
+        self._conn = None
+        self._insert = None
+        self._release: Optional[contextlib.AsyncExitStack] = None
+
+    async def open(self, resume_state: Optional[Dict[str, Any]], next_seq: int) -> None:
+        if self.pool is not None:
+            self._release = contextlib.AsyncExitStack()
+            self._conn = await self._release.enter_async_context(self.pool.acquire())
+        else:
+            import asyncpg # Import tardio: dependência só necessária com Postgres configurado
+            self._conn = await asyncpg.connect(self.dsn)
+        if resume_state is not None:
+            self.run_id = resume_state["run_id"]
+            await self._conn.execute(
+                "DELETE FROM public.documents WHERE metadata->>'ingest_run' = $1 AND (metadata->>'ingest_seq')::bigint >= $2",
+                self.run_id, next_seq,
+            )
+        else:
+            self.run_id = f"run-{time.time_ns()}"
+        self._insert = await self._conn.prepare(INSERT_DOCUMENT_SQL)
+
+    async def write(self, rows: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        records = [
+            (row["content"],
+             json.dumps({**row["metadata"], "ingest_run": self.run_id, "ingest_seq": row["seq"],
+                         "source_id": row["source_id"], "content_hash": row["hash"]}),
+             to_vector_literal(vector))
+            for row, vector in zip(rows, embeddings) if not row.get("existing")
+        ]
+        if records:
+            await self._insert.executemany(records)
+
+    async def apply_delta(self, replaced: Dict[str, List[str]], removed: List[str]) -> None:
+        """
+        Apaga, de outras execuções, os chunks das origens alteradas que não estão em `replaced[origem]`
+        (os mantidos) e todas as linhas das origens `removed`. Linhas antigas, sem `source_id`,
+        são reconhecidas pelo metadata["source"]. Chamado uma vez por página do delta.
+        """
+        if replaced:
+            await self._conn.executemany(
+                "DELETE FROM public.documents WHERE coalesce(metadata->>'source_id', metadata->>'source') = $1 "
+                "AND metadata->>'ingest_run' IS DISTINCT FROM $2 "
+                "AND NOT (coalesce(metadata->>'content_hash', '') = ANY($3::text[]))",
+                [(source, self.run_id, kept) for source, kept in replaced.items()],
+            )
+        if removed:
+            await self._conn.execute(
+                "DELETE FROM public.documents WHERE coalesce(metadata->>'source_id', metadata->>'source') = ANY($1::text[])",
+                removed,
+            )
+
+    async def state(self) -> Dict[str, Any]:
+        return {"run_id": self.run_id}
+
+    async def finalize(self) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._release is not None:
+            release, self._release, self._conn = self._release, None, None
+            await release.aclose() # Devolve a conexão ao pool
+        elif self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+
+# --- Pipeline ---
+
+class IngestionPipeline:
+    """
+    Executa leitura -> chunking -> embeddings -> gravação com filas limitadas entre os estágios.
+    `run()` retorna a quantidade de chunks gravados, o delta em relação à execução anterior
+    e as métricas de cada estágio.
+    Com `manifest`, a execução é incremental; com `embedding_cache`, embeddings já calculados
+    são reaproveitados. Com `prune`, a execução descreve o corpus inteiro: origens que não
+    aparecem nela são removidas dos destinos.
+    """
+
+    def __init__(self, sinks: List[Any], checkpoint: IngestionCheckpoint, *,
+                 manifest: Optional[IngestionManifest] = None, embedding_cache: Optional[EmbeddingCache] = None,
+                 prune: bool = True,
+                 chunk_size: int = 1000, chunk_overlap: int = 200, chunk_workers: Optional[int] = None,
+                 embed_token_budget: int = 8000, embed_max_items: int = 256, embed_concurrency: int = 2,
+                 queue_size: int = 64, checkpoint_every: int = 10):
+        self.sinks = sinks
+        self.checkpoint = checkpoint
+        self.manifest = manifest
+        self.embedding_cache = embedding_cache
+        self.prune = prune
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_workers = (os.cpu_count() or 1) if chunk_workers is None else chunk_workers
+        self.embed_token_budget = embed_token_budget
+        self.embed_max_items = embed_max_items
+        self.embed_concurrency = embed_concurrency
+        self.queue_size = queue_size
+        self.checkpoint_every = checkpoint_every # Lotes gravados entre checkpoints
+        self.stats = {name: StageStats(name) for name in ("read", "chunk", "embed", "store")}
+        self.delta = _new_delta()
+        self._full_rewrite = any(sink.full_rewrite for sink in sinks)
+        self._manifest: Optional[IngestionManifest] = None # Manifesto em uso (temporário sem `manifest`)
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """O que, se mudar, invalida o manifesto (os chunks mudam ou os embeddings deixam de valer)."""
+        return {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap,
+                "embedding_model": embedding_service.EMBEDDING_MODEL}
+
+    async def plan(self, documents: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Dry run: calcula o delta que `run()` aplicaria e quantos embeddings (e tokens, estimados)
+        ele pediria ao provedor, sem gravar nada. Lê e divide os documentos em uma thread.
+        """
+        with self._open_manifest() as manifest:
+            return await asyncio.to_thread(self._plan, manifest, documents)
+
+    def _plan(self, manifest: IngestionManifest, documents: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        manifest.begin(self.config)
+        try:
+            delta = _new_delta()
+            count = 0
+            for doc in documents:
+                count += 1
+                doc_hash = document_hash(doc)
+                key = manifest.claim_key(document_key(doc, doc_hash))
+                entry = manifest.previous(key)
+                unchanged = entry is not None and entry["document_hash"] == doc_hash
+                delta["documents_unchanged" if unchanged else "documents_changed" if entry else "documents_new"] += 1
+                if unchanged:
+                    manifest.record(key, doc_hash, entry["chunks"])
+                    delta["chunks_reused"] += len(entry["chunks"])
+                    if not self._full_rewrite:
+                        continue
+                old = set(entry["chunks"]) if entry else set()
+                chunks = hash_chunks(split_text(doc["content"], self.chunk_size, self.chunk_overlap))
+                if not unchanged:
+                    manifest.record(key, doc_hash, [chunk_hash for chunk_hash, _ in chunks])
+                    reused = sum(1 for chunk_hash, _ in chunks if chunk_hash in old)
+                    delta["chunks_reused"] += reused
+                    delta["chunks_new"] += len(chunks) - reused
+                    if entry:
+                        delta["chunks_orphaned"] += len(old - {chunk_hash for chunk_hash, _ in chunks})
+                for chunk_hash, text in chunks:
+                    if self._full_rewrite or chunk_hash not in old:
+                        manifest.plan_chunk(chunk_hash, estimate_tokens(text))
+            if self.prune:
+                after = ""
+                while page := manifest.removed_page(after, _MANIFEST_PAGE):
+                    for key, chunks in page:
+                        delta["documents_removed"] += 1
+                        delta["chunks_orphaned"] += len(chunks)
+                    after = page[-1][0]
+            needed = cached = tokens_needed = 0
+            after = ""
+            while page := manifest.plan_chunks_page(after, _MANIFEST_PAGE):
+                in_cache = self.embedding_cache.contains_many(h for h, _ in page) if self.embedding_cache is not None else set()
+                for chunk_hash, tokens in page:
+                    if chunk_hash in in_cache:
+                        cached += 1
+                    else:
+                        needed += 1
+                        tokens_needed += tokens
+                after = page[-1][0]
+        finally:
+            manifest.discard()
+        delta["embeddings_cached"] = cached
+        del delta["embeddings_computed"]
+        return {"dry_run": True, "documents": count, "embeddings_needed": needed,
+                "estimated_tokens": tokens_needed, "delta": delta}
+
+    @contextlib.contextmanager
+    def _open_manifest(self) -> Iterator[IngestionManifest]:
+        """O manifesto configurado ou, sem ele, um temporário vazio (todas as origens contam como novas)."""
+        if self.manifest is not None:
+            yield self.manifest
+            return
+        with tempfile.TemporaryDirectory(prefix="ingestion-") as tmp:
+            manifest = IngestionManifest(os.path.join(tmp, "manifest.sqlite"))
+            try:
+                yield manifest
+            finally:
+                manifest.close()
+
+    async def run(self, documents: Iterable[Dict[str, Any]], resume: bool = True) -> Dict[str, Any]:
+        with self._open_manifest() as manifest:
+            self._manifest = manifest
+            try:
+                return await self._run(documents, resume)
+            finally:
+                self._manifest = None
+
+    async def _run(self, documents: Iterable[Dict[str, Any]], resume: bool) -> Dict[str, Any]:
+        state = self.checkpoint.load() if resume else None
+        if state is None:
+            self.checkpoint.clear()
+        next_seq = state["next_seq"] if state else 0
+        stored = state["stored"] if state else 0
+        sink_states = state["sinks"] if state else {}
+        self._manifest.begin(self.config)
+        for sink in self.sinks:
+            await sink.open(sink_states.get(sink.name), next_seq)
+        if next_seq:
+            logger.info(f"[ingestion] Retomando a partir do documento {next_seq}.")
+
+        docs_q: asyncio.Queue = asyncio.Queue(self.queue_size)
+        chunks_q: asyncio.Queue = asyncio.Queue(self.queue_size * 8)
+        embedded_q: asyncio.Queue = asyncio.Queue(self.embed_concurrency * 2)
+        executor = ProcessPoolExecutor(self.chunk_workers) if self.chunk_workers > 0 else None
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(self._read(documents, next_seq, docs_q)),
+            asyncio.create_task(self._chunk(docs_q, chunks_q, executor)),
+            asyncio.create_task(self._embed(chunks_q, embedded_q)),
+            asyncio.create_task(self._store(embedded_q, next_seq, stored)),
+        ]
+        try:
+            stored = (await asyncio.gather(*tasks))[-1]
+            async for replaced, removed in self._delta_pages():
+                for sink in self.sinks:
+                    await sink.apply_delta(replaced, removed)
+            for sink in self.sinks:
+                await sink.finalize()
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for sink in self.sinks:
+                await sink.close()
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if self.manifest is not None:
+            await asyncio.to_thread(self.manifest.commit, self.config, self.prune)
+        self.checkpoint.clear()
+        elapsed = time.perf_counter() - started
+        report = {name: stats.as_dict(elapsed) for name, stats in self.stats.items()}
+        documents_count = self.stats["read"].items_in
+        logger.info(f"[ingestion] {stored} chunks de {documents_count} documentos gravados em {elapsed:.2f}s. "
+                    f"Delta: {self.delta}. Estágios: {report}")
+        return {"indexed_count": stored, "documents": documents_count, "elapsed_seconds": round(elapsed, 3),
+                "delta": dict(self.delta), "stages": report}
+
+    async def _delta_pages(self) -> AsyncIterator[Tuple[Dict[str, List[str]], List[str]]]:
+        """
+        O delta lido do manifesto em páginas de até _MANIFEST_PAGE origens: por origem alterada, os
+        hashes mantidos da execução anterior; e as origens removidas. Emite ao menos uma página.
+        """
+        replaced: Dict[str, List[str]] = {}
+        removed: List[str] = []
+        emitted = False
+        after = ""
+        while page := await asyncio.to_thread(self._manifest.changed_page, after, _MANIFEST_PAGE):
+            for key, new, old in page:
+                replaced[key] = sorted(set(new) & set(old))
+                self.delta["chunks_orphaned"] += len(set(old) - set(new))
+            after = page[-1][0]
+            if len(replaced) >= _MANIFEST_PAGE:
+                yield replaced, []
+                replaced, emitted = {}, True
+        after = ""
+        while self.prune and (page := await asyncio.to_thread(self._manifest.removed_page, after, _MANIFEST_PAGE)):
+            for key, chunks in page:
+                removed.append(key)
+                self.delta["documents_removed"] += 1
+                self.delta["chunks_orphaned"] += len(chunks)
+                if len(replaced) + len(removed) >= _MANIFEST_PAGE:
+                    yield replaced, removed
+                    replaced, removed, emitted = {}, [], True
+            after = page[-1][0]
+        if replaced or removed or not emitted:
+            yield replaced, removed
+
+    def _record_document(self, key: str, doc_hash: str, chunks: List[Tuple[str, str]]) -> Set[str]:
+        """Registra o documento (alterado ou novo) no manifesto desta execução; retorna os hashes anteriores."""
+        entry = self._manifest.previous(key)
+        old = set(entry["chunks"]) if entry else set()
+        self._manifest.record(key, doc_hash, [chunk_hash for chunk_hash, _ in chunks])
+        reused = sum(1 for chunk_hash, _ in chunks if chunk_hash in old)
+        self.delta["chunks_reused"] += reused
+        self.delta["chunks_new"] += len(chunks) - reused
+        return old
+
+    async def _read(self, documents: Iterable[Dict[str, Any]], skip: int, out: asyncio.Queue) -> None:
+        stats = self.stats["read"]
+        iterator = iter(documents)
+        seq = 0
+        while True:
+            t0 = time.perf_counter()
+            doc = await asyncio.to_thread(next, iterator, _DONE) # Leitura de arquivo é bloqueante
+            if doc is _DONE:
+                stats.busy_seconds += time.perf_counter() - t0
+                break
+            doc_hash = document_hash(doc)
+            key = self._manifest.claim_key(document_key(doc, doc_hash))
+            entry = self._manifest.previous(key)
+            unchanged = entry is not None and entry["document_hash"] == doc_hash
+            self.delta["documents_unchanged" if unchanged else "documents_changed" if entry else "documents_new"] += 1
+            if unchanged and (seq < skip or not self._full_rewrite):
+                self._manifest.record(key, doc_hash, entry["chunks"]) # Nada a gravar: os chunks continuam nos destinos
+                self.delta["chunks_reused"] += len(entry["chunks"])
+            elif seq < skip:
+                # Gravado antes da falha; só os hashes são necessários para o manifesto
+                chunks = await asyncio.to_thread(split_text, doc["content"], self.chunk_size, self.chunk_overlap)
+                self._record_document(key, doc_hash, hash_chunks(chunks))
+            stats.busy_seconds += time.perf_counter() - t0
+            stats.items_in += 1
+            if seq >= skip and not (unchanged and not self._full_rewrite):
+                await _put(out, (seq, doc, key, doc_hash, unchanged), stats)
+                stats.items_out += 1
+            seq += 1
+        await _put(out, _DONE, stats)
+
+    async def _chunk(self, inp: asyncio.Queue, out: asyncio.Queue, executor: Optional[ProcessPoolExecutor]) -> None:
+        """Chunking no process pool; até `chunk_workers * 2` documentos em voo, saída em ordem."""
+        stats = self.stats["chunk"]
+        loop = asyncio.get_running_loop()
+        in_flight: deque = deque()
+
+        async def emit_oldest() -> None:
+            seq, doc, key, doc_hash, unchanged, future = in_flight.popleft()
+            t0 = time.perf_counter()
+            chunks = hash_chunks(await future)
+            if unchanged: # Só chega aqui para destinos reescritos por inteiro; embeddings vêm do cache
+                self._manifest.record(key, doc_hash, [chunk_hash for chunk_hash, _ in chunks])
+                self.delta["chunks_reused"] += len(chunks)
+                old = {chunk_hash for chunk_hash, _ in chunks}
+            else:
+                old = self._record_document(key, doc_hash, chunks)
+                if not self._full_rewrite:
+                    chunks = [(chunk_hash, text) for chunk_hash, text in chunks if chunk_hash not in old]
+            stats.busy_seconds += time.perf_counter() - t0
+            metadata = doc.get("metadata") or {}
+            for i, (chunk_hash, text) in enumerate(chunks):
+                chunk = {"seq": seq, "last": i == len(chunks) - 1, "content": text, "metadata": metadata,
+                         "hash": chunk_hash, "source_id": key, "existing": chunk_hash in old}
+                await _put(out, chunk, stats)
+                stats.items_out += 1
+
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                break
+            seq, doc, key, doc_hash, unchanged = item
+            stats.items_in += 1
+            args = (doc["content"], self.chunk_size, self.chunk_overlap)
+            if executor is not None:
+                future = loop.run_in_executor(executor, split_text, *args)
+            else:
+                future = loop.create_future()
+                future.set_result(split_text(*args))
+            in_flight.append((seq, doc, key, doc_hash, unchanged, future))
+            if len(in_flight) >= max(1, self.chunk_workers * 2):
+                await emit_oldest()
+        while in_flight:
+            await emit_oldest()
+        await _put(out, _DONE, stats)
+
+    async def _embed(self, inp: asyncio.Queue, out: asyncio.Queue) -> None:
+        """
+        Agrupa chunks por orçamento de tokens; até `embed_concurrency` chamadas em voo, saída em ordem.
+        Só chunks ausentes do EmbeddingCache (e sem repetição no lote) vão para o provedor.
+        """
+        stats = self.stats["embed"]
+        in_flight: deque = deque()
+        cache = self.embedding_cache
+
+        async def embed(batch: List[Dict[str, Any]]):
+            t0 = time.perf_counter()
+            hashes = [chunk["hash"] for chunk in batch]
+            vectors = await asyncio.to_thread(cache.get_many, hashes) if cache is not None else {}
+            missing = {}
+            for chunk in batch:
+                if chunk["hash"] not in vectors:
+                    missing.setdefault(chunk["hash"], chunk["content"])
+            if missing:
+                computed = dict(zip(missing, await embedding_service.embed_bulk(list(missing.values()))))
+                if cache is not None:
+                    await asyncio.to_thread(cache.put_many, computed)
+                vectors.update(computed)
+            self.delta["embeddings_computed"] += len(missing)
+            self.delta["embeddings_cached"] += len(set(hashes)) - len(missing)
+            telemetry.INGESTION_EMBEDDINGS.inc(len(missing), result="computed")
+            telemetry.INGESTION_EMBEDDINGS.inc(len(set(hashes)) - len(missing), result="cached")
+            embeddings = np.stack([vectors[chunk_hash] for chunk_hash in hashes]).astype(np.float32, copy=False)
+            stats.busy_seconds += time.perf_counter() - t0
+            return batch, embeddings
+
+        async def submit(batch: List[Dict[str, Any]]) -> None:
+            in_flight.append(asyncio.create_task(embed(batch)))
+            if len(in_flight) >= self.embed_concurrency:
+                await emit_oldest()
+
+        async def emit_oldest() -> None:
+            batch, embeddings = await in_flight.popleft()
+            await _put(out, (batch, embeddings), stats)
+            stats.items_out += len(batch)
+
+        batch: List[Dict[str, Any]] = []
+        batch_tokens = 0
+        try:
+            while True:
+                chunk = await inp.get()
+                if chunk is _DONE:
+                    break
+                stats.items_in += 1
+                tokens = estimate_tokens(chunk["content"])
+                if batch and (batch_tokens + tokens > self.embed_token_budget or len(batch) >= self.embed_max_items):
+                    await submit(batch)
+                    batch, batch_tokens = [], 0
+                batch.append(chunk)
+                batch_tokens += tokens
+            if batch:
+                await submit(batch)
+            while in_flight:
+                await emit_oldest()
+        finally:
+            for task in in_flight:
+                task.cancel()
+        await _put(out, _DONE, stats)
+
+    async def _store(self, inp: asyncio.Queue, next_seq: int, stored: int):
+        """Grava os lotes em todos os sinks e salva checkpoints em fronteiras de documento."""
+        stats = self.stats["store"]
+        batches_since_checkpoint = 0
+        while True:
+            item = await inp.get()
+            if item is _DONE:
+                break
+            batch, embeddings = item
+            stats.items_in += len(batch)
+            t0 = time.perf_counter()
+            rows = [{"id": stored + i, "seq": c["seq"], "content": c["content"], "metadata": c["metadata"],
+                     "hash": c["hash"], "source_id": c["source_id"], "existing": c["existing"]}
+                    for i, c in enumerate(batch)]
+            # Chunks do último documento, se ele não terminou neste lote, são gravados depois
+            # do checkpoint, para que o checkpoint corresponda apenas a documentos completos
+            tail_seq = batch[-1]["seq"]
+            split = len(batch) if batch[-1]["last"] else next(i for i, c in enumerate(batch) if c["seq"] == tail_seq)
+            if split:
+                await self._write(rows[:split], embeddings[:split])
+                next_seq = tail_seq + 1 if split == len(batch) else tail_seq
+            stored += split
+            batches_since_checkpoint += 1
+            # Sem fronteira de documento neste lote (split == 0), o checkpoint fica para o próximo
+            if split and batches_since_checkpoint >= self.checkpoint_every:
+                await self._save_checkpoint(next_seq, stored)
+                batches_since_checkpoint = 0
+            if split < len(batch):
+                await self._write(rows[split:], embeddings[split:])
+                stored += len(batch) - split
+            stats.busy_seconds += time.perf_counter() - t0
+            stats.items_out += len(batch)
+        return stored
+
+    async def _write(self, rows: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        for sink in self.sinks:
+            await sink.write(rows, embeddings)
+
+    async def _save_checkpoint(self, next_seq: int, stored: int) -> None:
+        sink_states = {}
+        for sink in self.sinks:
+            sink_states[sink.name] = await sink.state()
+        self.checkpoint.save({"next_seq": next_seq, "stored": stored, "sinks": sink_states})
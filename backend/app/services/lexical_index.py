@@ -0,0 +1,155 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/lexical_index.py:
+"""
+Índice lexical (BM25) e índice de metadados, gravados na mesma versão do índice vetorial local.
+
+A busca vetorial sozinha erra identificadores exatos (códigos de produto, nomes de arquivos);
+o BM25 cobre esses casos e os dois rankings são fundidos em rag_service (RRF).
+Alternativa sem índice local: uma coluna `tsvector` em public.documents com `ts_rank`.
+
+Arquivos (no diretório da versão, ao lado de embeddings.npy):
+- lexicon.json          -> termo -> id do termo, N e comprimento médio dos documentos
+- term_offsets.npy      -> offsets [T + 1] das postings de cada termo
+- posting_rows.npy      -> linhas (int32) de cada posting, ordenadas por termo
+- posting_tfs.npy       -> frequência do termo na linha (float32)
+- doc_lengths.npy       -> quantidade de tokens por linha
+- metadata_keys.json    -> "chave=valor_json" -> [início, fim] em metadata_rows.npy
+- metadata_rows.npy     -> linhas (int32) ordenadas de cada par chave/valor
+"""
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Identificadores compostos (ex: "XPT-1000", "v2.1", "nota_fiscal") também viram um token inteiro
+_COMPOUND_RE = re.compile(r"\w+(?:[-./]\w+)+", re.UNICODE)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    text = text.lower()
+    return _WORD_RE.findall(text) + _COMPOUND_RE.findall(text)
+
+
+def _metadata_key(key: str, value: Any) -> str:
+    return f"{key}={json.dumps(value, ensure_ascii=False, sort_keys=True)}"
+
+
+def build_lexical_index(path: str, rows: Iterable[Dict[str, Any]]) -> None:
+    """Constrói e grava o BM25 e o índice de metadados a partir das linhas (na ordem do índice)."""
+    postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    metadata_postings: Dict[str, List[int]] = defaultdict(list)
+    doc_lengths: List[int] = []
+    for position, row in enumerate(rows):
+        tokens = tokenize(row["content"])
+        doc_lengths.append(len(tokens))
+        counts: Dict[str, int] = defaultdict(int)
+        for token in tokens:
+            counts[token] += 1
+        for token, tf in counts.items():
+            postings[token].append((position, tf))
+        for key, value in (row.get("metadata") or {}).items():
+            if isinstance(value, (str, int, float, bool)) or value is None:
+                metadata_postings[_metadata_key(key, value)].append(position)
+
+    terms = sorted(postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    for i, term in enumerate(terms):
+        term_offsets[i + 1] = term_offsets[i] + len(postings[term])
+    posting_rows = np.empty(int(term_offsets[-1]), dtype=np.int32)
+    posting_tfs = np.empty(int(term_offsets[-1]), dtype=np.float32)
+    for i, term in enumerate(terms):
+        start, end = term_offsets[i], term_offsets[i + 1]
+        entries = np.asarray(postings[term], dtype=np.int64)
+        posting_rows[start:end] = entries[:, 0]
+        posting_tfs[start:end] = entries[:, 1]
+    lengths = np.asarray(doc_lengths, dtype=np.int32)
+    lexicon = {
+        "terms": {term: i for i, term in enumerate(terms)},
+        "count": len(doc_lengths),
+        "avg_doc_length": float(lengths.mean()) if len(lengths) else 0.0,
+    }
+    with open(os.path.join(path, "lexicon.json"), "w", encoding="utf-8") as f:
+        json.dump(lexicon, f, ensure_ascii=False)
+    np.save(os.path.join(path, "term_offsets.npy"), term_offsets)
+    np.save(os.path.join(path, "posting_rows.npy"), posting_rows)
+    np.save(os.path.join(path, "posting_tfs.npy"), posting_tfs)
+    np.save(os.path.join(path, "doc_lengths.npy"), lengths)
+
+    metadata_keys, metadata_rows, offset = {}, [], 0
+    for key in sorted(metadata_postings):
+        positions = metadata_postings[key]
+        metadata_keys[key] = [offset, offset + len(positions)]
+        metadata_rows.extend(positions)
+        offset += len(positions)
+    with open(os.path.join(path, "metadata_keys.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata_keys, f, ensure_ascii=False)
+    np.save(os.path.join(path, "metadata_rows.npy"), np.asarray(metadata_rows, dtype=np.int32))
+
+
+class LexicalIndex:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "lexicon.json"), encoding="utf-8") as f:
+            lexicon = json.load(f)
+        self.terms: Dict[str, int] = lexicon["terms"]
+        self.count: int = lexicon["count"]
+        self.avg_doc_length: float = lexicon["avg_doc_length"] or 1.0
+        self.term_offsets = np.load(os.path.join(path, "term_offsets.npy"))
+        self.posting_rows = np.load(os.path.join(path, "posting_rows.npy"), mmap_mode="r")
+        self.posting_tfs = np.load(os.path.join(path, "posting_tfs.npy"), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(path, "doc_lengths.npy"), mmap_mode="r")
+        with open(os.path.join(path, "metadata_keys.json"), encoding="utf-8") as f:
+            self.metadata_keys: Dict[str, List[int]] = json.load(f)
+        self.metadata_rows = np.load(os.path.join(path, "metadata_rows.npy"), mmap_mode="r")
+
+    @classmethod
+    def open(cls, path: str) -> Optional["LexicalIndex"]:
+        """None para versões antigas do índice, gravadas sem a parte lexical."""
+        if not os.path.exists(os.path.join(path, "lexicon.json")):
+            return None
+        return cls(path)
+
+    def filter_rows(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Linhas (ordenadas) cujo metadata satisfaz todos os filtros.
+        Cada filtro é `chave: valor` ou `chave: [valores aceitos]`.
+        """
+        allowed: Optional[np.ndarray] = None
+        for key, accepted in filters.items():
+            values = accepted if isinstance(accepted, list) else [accepted]
+            parts = [self.metadata_rows[start:end] for start, end in
+                     (self.metadata_keys.get(_metadata_key(key, value), (0, 0)) for value in values)]
+            rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+            allowed = rows if allowed is None else np.intersect1d(allowed, rows, assume_unique=True)
+        return allowed if allowed is not None else np.arange(self.count, dtype=np.int32)
+
+    def search(self, query: str, k: int = 50, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k linhas por BM25; `allowed` restringe o ranking às linhas filtradas."""
+        term_ids = {self.terms[token] for token in tokenize(query) if token in self.terms}
+        if not term_ids or k <= 0:
+            return []
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            rows = np.asarray(self.posting_rows[start:end])
+            tfs = np.asarray(self.posting_tfs[start:end])
+            df = end - start
+            idf = np.log1p((self.count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self.doc_lengths[rows]) / self.avg_doc_length)
+            scores[rows] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        if allowed is not None:
+            mask = np.zeros(self.count, dtype=bool)
+            mask[allowed] = True
+            scores[~mask] = 0.0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) == 0:
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(position), float(scores[position])) for position in top]
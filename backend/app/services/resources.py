@@ -0,0 +1,297 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/resources.py:
+"""
+Recursos compartilhados pela app, criados no startup (lifespan do main.py) e fechados no shutdown:
+
+- Pool `asyncpg` para o Supabase/Postgres (SUPABASE_DB_CONNECTION_STRING). Cada conexão nova já
+  executa a consulta de similaridade uma vez (LIMIT 0) no hook `init`, deixando-a preparada no
+  cache de statements do asyncpg; a primeira consulta real não paga parse/plan.
+- `httpx.AsyncClient` único (HTTP/2 quando `h2` está instalado, keep-alive) para os provedores de
+  LLM/embeddings, com as conexões aquecidas no startup (HTTP_WARMUP_URLS).
+
+Ambos expõem health check e métricas de saturação (`stats()`), usadas pelas rotas /resources/*.
+Nos testes, DatabasePool aceita qualquer objeto com a interface do pool do asyncpg e o cliente
+HTTP aceita um transport do httpx (ex: `httpx.MockTransport`).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("DB_ACQUIRE_TIMEOUT_SECONDS", "5"))
+DB_MAX_IDLE_SECONDS = float(os.getenv("DB_MAX_IDLE_SECONDS", "300")) # Conexões ociosas além de min_size são fechadas
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")) # 0 com PgBouncer em modo transaction
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_WARMUP_TIMEOUT_SECONDS = 3.0
+
+SIMILARITY_SQL = """
+SELECT id, content, metadata, 1 - (embedding <=> $1::text::vector) AS score
+FROM public.documents
+WHERE $3::jsonb IS NULL OR metadata @> $3::jsonb
+ORDER BY embedding <=> $1::text::vector
+LIMIT $2
+"""
+INSERT_DOCUMENT_SQL = "INSERT INTO public.documents (content, metadata, embedding) VALUES ($1, $2::jsonb, $3::text::vector)"
+
+
+class PoolExhaustedError(Exception):
+    """Nenhuma conexão do pool ficou livre dentro de DB_ACQUIRE_TIMEOUT_SECONDS."""
+
+
+def to_vector_literal(vector: Iterable[float]) -> str:
+    """Formato texto do pgvector ('[x,y,...]'); o asyncpg não tem codec binário para `vector`."""
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+
+def _warmup_vector() -> str:
+    from .embedding_service import EMBEDDING_DIM
+    return to_vector_literal([0.0] * EMBEDDING_DIM)
+
+
+async def _init_connection(conn: Any) -> None:
+    """Hook `init` do pool: prepara a consulta de similaridade em cada conexão nova."""
+    await conn.fetch(SIMILARITY_SQL, _warmup_vector(), 0, None)
+
+
+class DatabasePool:
+    """Pool asyncpg com medição de espera e saturação."""
+
+    def __init__(self, pool: Any, acquire_timeout: float = DB_ACQUIRE_TIMEOUT_SECONDS):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self._stats = {"acquires": 0, "waiting": 0, "max_waiting": 0, "in_use": 0, "max_in_use": 0,
+                       "total_wait_seconds": 0.0, "max_wait_seconds": 0.0, "timeouts": 0}
+
+    @classmethod
+    async def create(cls, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE) -> "DatabasePool":
+        import asyncpg # Import tardio: dependência só necessária com Postgres configurado
+        # create_pool já abre `min_size` conexões (e roda o init em cada uma): são as conexões de aquecimento
+        pool = await asyncpg.create_pool(
+            dsn, min_size=min_size, max_size=max_size, init=_init_connection,
+            max_inactive_connection_lifetime=DB_MAX_IDLE_SECONDS, statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        )
+        logger.info(f"[resources] Pool Postgres criado (min={min_size}, max={max_size}).")
+        return cls(pool)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Any]:
+        stats = self._stats
+        stats["waiting"] += 1
+        stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+        started = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise PoolExhaustedError(f"Pool Postgres saturado: nenhuma conexão livre em {self.acquire_timeout}s.")
+        finally:
+            stats["waiting"] -= 1
+        waited = time.perf_counter() - started
+        stats["acquires"] += 1
+        stats["total_wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+        stats["in_use"] += 1
+        stats["max_in_use"] = max(stats["max_in_use"], stats["in_use"])
+        try:
+            yield conn
+        finally:
+            stats["in_use"] -= 1
+            await self._pool.release(conn)
+
+    async def similarity_search(self, embedding: Iterable[float], k: int,
+                                metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Top-k de public.documents por cosseno; `metadata_filter` vira `metadata @> filtro` no SQL."""
+        filter_json = json.dumps(metadata_filter) if metadata_filter else None
+        async with self.acquire() as conn:
+            records = await conn.fetch(SIMILARITY_SQL, to_vector_literal(embedding), k, filter_json)
+        return [
+            {
+                "id": record["id"],
+                "content": record["content"],
+                "metadata": json.loads(record["metadata"]) if isinstance(record["metadata"], str) else record["metadata"],
+                "score": float(record["score"]),
+            }
+            for record in records
+        ]
+
+    async def health(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            async with self.acquire() as conn:
+                await conn.fetchval("SELECT 1")
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def stats(self) -> Dict[str, Any]:
+        size, max_size = self._pool.get_size(), self._pool.get_max_size()
+        acquires = self._stats["acquires"]
+        return {
+            **self._stats,
+            "size": size,
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": max_size,
+            "saturation": round(self._stats["in_use"] / max_size, 3) if max_size else 0.0,
+            "avg_wait_ms": round(self._stats["total_wait_seconds"] / acquires * 1000, 3) if acquires else 0.0,
+        }
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Transport do httpx que conta requisições em voo (para medir a saturação do pool HTTP)."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_connections: int = HTTP_MAX_CONNECTIONS):
+        self._transport = transport
+        self.max_connections = max_connections
+        self._stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "errors": 0}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            return await self._transport.handle_async_request(request)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "max_connections": self.max_connections,
+                "saturation": round(self._stats["in_flight"] / self.max_connections, 3)}
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_http_transport(transport: Optional[httpx.AsyncBaseTransport] = None) -> InstrumentedTransport:
+    """Transport com pool de conexões (keep-alive, HTTP/2); `transport` substitui a rede (testes)."""
+    if transport is None:
+        http2 = HTTP2_ENABLED
+        if http2:
+            try:
+                import h2 # noqa: F401 - necessário para httpx com http2=True
+            except ImportError:
+                logger.warning("[resources] Pacote 'h2' não instalado; cliente HTTP usando HTTP/1.1.")
+                http2 = False
+        limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                              keepalive_expiry=HTTP_KEEPALIVE_SECONDS)
+        transport = httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=1)
+    return InstrumentedTransport(transport)
+
+
+def create_http_client(transport: InstrumentedTransport) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+    )
+
+
+def _default_warmup_urls() -> List[str]:
+    configured = os.getenv("HTTP_WARMUP_URLS")
+    if configured is not None:
+        return [url.strip() for url in configured.split(",") if url.strip()]
+    # Por padrão, só aquece o provedor que de fato será usado
+    return ["https://api.openai.com/v1/models"] if os.getenv("OPENAI_API_KEY") else []
+
+
+class Resources:
+    def __init__(self, db: Optional[DatabasePool], http_transport: InstrumentedTransport, db_error: Optional[str] = None):
+        self.db = db
+        self.http_transport = http_transport
+        self.http = create_http_client(http_transport)
+        self.db_error = db_error # Motivo de o pool não existir apesar de configurado
+
+    async def warm_up_http(self, urls: Iterable[str]) -> None:
+        """Abre (TLS + HTTP/2) as conexões com os provedores; falhas não impedem o startup."""
+        async def touch(url: str) -> None:
+            try:
+                await self.http.head(url, timeout=HTTP_WARMUP_TIMEOUT_SECONDS)
+            except httpx.HTTPError as e:
+                logger.warning(f"[resources] Aquecimento de '{url}' falhou: {e}")
+        await asyncio.gather(*(touch(url) for url in urls))
+
+    async def health(self) -> Dict[str, Any]:
+        if self.db is not None:
+            database = await self.db.health()
+        elif self.db_error is not None:
+            database = {"ok": False, "error": self.db_error}
+        else:
+            database = {"ok": True, "configured": False}
+        http = {"ok": not self.http.is_closed}
+        return {"ok": database["ok"] and http["ok"], "database": database, "http": http}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "database": self.db.stats() if self.db is not None else None,
+            "http": self.http_transport.stats(),
+        }
+
+    async def close(self) -> None:
+        await self.http.aclose()
+        if self.db is not None:
+            await self.db.close()
+
+
+async def create_resources(dsn: Optional[str] = None, warmup_urls: Optional[List[str]] = None,
+                           http_transport: Optional[httpx.AsyncBaseTransport] = None) -> Resources:
+    dsn = dsn if dsn is not None else os.getenv("SUPABASE_DB_CONNECTION_STRING", "")
+    db, db_error = None, None
+    if "postgres:" in dsn or "postgresql:" in dsn:
+        try:
+            db = await DatabasePool.create(dsn)
+        except Exception as e:
+            # A API sobe mesmo assim (RAG local, Crews, Guardrails); /resources/health reporta o erro
+            db_error = str(e)
+            logger.error(f"[resources] Não foi possível criar o pool Postgres: {e}")
+    resources = Resources(db, create_http_transport(http_transport), db_error)
+    await resources.warm_up_http(_default_warmup_urls() if warmup_urls is None else warmup_urls)
+    return resources
+
+
+_resources: Optional[Resources] = None
+_resources_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def get_resources() -> Resources:
+    """Recursos do event loop atual, criados sob demanda (ou pelo lifespan da app)."""
+    global _resources, _resources_loop
+    loop = asyncio.get_running_loop()
+    if _resources is None or _resources_loop is not loop:
+        # Loop anterior encerrado (ex: testes): suas conexões não podem ser reaproveitadas
+        _resources, _resources_loop = await create_resources(), loop
+    return _resources
+
+
+async def get_db_pool() -> Optional[DatabasePool]:
+    return (await get_resources()).db
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    return (await get_resources()).http
+
+
+async def shutdown_resources() -> None:
+    global _resources, _resources_loop
+    if _resources is not None:
+        await _resources.close()
+        _resources, _resources_loop = None, None
@@ -0,0 +1,321 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/session_store.py:
+"""
+Memória de conversa do RAG, por `RagQueryInput.session_id`.
+
+Cada sessão guarda só o necessário para o próximo turno, com custo constante por turno:
+- os últimos RAG_SESSION_RECENT_TURNS turnos na íntegra (respostas truncadas);
+- um resumo acumulado dos turnos mais antigos (rolling summary, limitado em caracteres);
+- o embedding da última pergunta (float16), os ids dos chunks recuperados recentemente e as
+  fontes do último turno, para que perguntas de continuação reaproveitem a recuperação
+  (ver rag_service._session_retrieval) em vez de reembedar o histórico.
+
+Em memória: LRU com limite de sessões, de bytes por sessão e de bytes no total.
+Opcionalmente, as sessões também são gravadas em um backend chave-valor com a interface do
+redis-py (`get`, `set(name, value, ex=...)`, `delete`): SQLite local (RAG_SESSION_DB_PATH) ou
+Redis (RAG_SESSION_REDIS_URL). Sessões que saem da memória por eviction voltam do backend.
+As chamadas ao backend (bloqueantes) rodam fora do event loop, em uma única thread dedicada:
+gravações e leituras acontecem na ordem em que foram pedidas, sem que um turno antigo sobrescreva um novo.
+"""
+import asyncio
+import base64
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_SECONDS = float(os.getenv("RAG_SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_MAX_SESSIONS = int(os.getenv("RAG_SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_BYTES = int(os.getenv("RAG_SESSION_MAX_BYTES", str(32 * 1024 * 1024))) # Todas as sessões em memória
+SESSION_MAX_SESSION_BYTES = int(os.getenv("RAG_SESSION_MAX_SESSION_BYTES", str(32 * 1024)))
+SESSION_RECENT_TURNS = int(os.getenv("RAG_SESSION_RECENT_TURNS", "3")) # Turnos mantidos na íntegra
+SESSION_SUMMARY_MAX_CHARS = int(os.getenv("RAG_SESSION_SUMMARY_MAX_CHARS", "2000"))
+SESSION_ANSWER_MAX_CHARS = 1000 # Resposta guardada por turno recente
+SESSION_MAX_CHUNK_IDS = 50 # Ids de chunks recuperados lembrados por sessão (mais recentes)
+SESSION_DB_PATH = os.getenv("RAG_SESSION_DB_PATH") # Backend SQLite opcional
+SESSION_REDIS_URL = os.getenv("RAG_SESSION_REDIS_URL") # Backend Redis opcional (requer o pacote redis)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s")
+_SESSION_OVERHEAD_BYTES = 512 # Estimativa do custo fixo de cada sessão (objetos Python)
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    chunk_ids: List[int] = field(default_factory=list) # Mais recentes primeiro
+    last_sources: List[Dict[str, Any]] = field(default_factory=list)
+    last_embedding: Optional[np.ndarray] = None # float16
+    corpus_version: Optional[str] = None # Versão do corpus dos chunk_ids/last_sources
+    turn_count: int = 0
+    updated_at: float = 0.0
+
+    def context(self) -> str:
+        """Histórico para o prompt: resumo dos turnos antigos + turnos recentes. Tamanho limitado."""
+        parts = [f"Resumo da conversa até aqui:\n{self.summary}"] if self.summary else []
+        parts.extend(f"Usuário: {turn.question}\nAssistente: {turn.answer}" for turn in self.turns)
+        return "\n\n".join(parts)
+
+    def similarity(self, embedding: np.ndarray) -> float:
+        """Cosseno entre `embedding` e a última pergunta (ambos normalizados); 0 sem histórico."""
+        if self.last_embedding is None:
+            return 0.0
+        return float(self.last_embedding.astype(np.float32) @ np.asarray(embedding, dtype=np.float32))
+
+    def size_bytes(self) -> int:
+        text = len(self.summary) + sum(len(turn.question) + len(turn.answer) for turn in self.turns)
+        sources = sum(len(source.get("content") or "") + 128 for source in self.last_sources)
+        embedding = self.last_embedding.nbytes if self.last_embedding is not None else 0
+        return _SESSION_OVERHEAD_BYTES + 2 * text + sources + embedding + 8 * len(self.chunk_ids)
+
+    def to_json(self) -> str:
+        data = {
+            "summary": self.summary,
+            "turns": [[turn.question, turn.answer] for turn in self.turns],
+            "chunk_ids": self.chunk_ids,
+            "last_sources": self.last_sources,
+            "last_embedding": base64.b64encode(self.last_embedding.tobytes()).decode("ascii")
+            if self.last_embedding is not None else None,
+            "corpus_version": self.corpus_version,
+            "turn_count": self.turn_count,
+            "updated_at": self.updated_at,
+        }
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    @classmethod
+    def from_json(cls, session_id: str, raw: str) -> "Session":
+        data = json.loads(raw)
+        embedding = data.get("last_embedding")
+        return cls(
+            session_id=session_id,
+            summary=data["summary"],
+            turns=[Turn(question, answer) for question, answer in data["turns"]],
+            chunk_ids=data["chunk_ids"],
+            last_sources=data["last_sources"],
+            last_embedding=np.frombuffer(base64.b64decode(embedding), dtype=np.float16).copy() if embedding else None,
+            corpus_version=data["corpus_version"],
+            turn_count=data["turn_count"],
+            updated_at=data["updated_at"],
+        )
+
+
+def _summarize_turn(turn: Turn) -> str:
+    # TODO Fase 7: resumir com o LLM (resumo anterior + turno -> novo resumo), fora do caminho da resposta
+    first_sentence = _SENTENCE_RE.split(turn.answer.strip(), maxsplit=1)[0]
+    return f"- {turn.question.strip()[:200]} -> {first_sentence[:200]}"
+
+
+def _append_summary(summary: str, line: str, max_chars: int) -> str:
+    """Acrescenta uma linha ao resumo, descartando as linhas mais antigas acima de `max_chars`."""
+    lines = (summary.split("\n") if summary else []) + [line]
+    while len(lines) > 1 and sum(len(l) + 1 for l in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)[-max_chars:]
+
+
+class SqliteSessionBackend:
+    """Backend chave-valor em SQLite com a mesma interface usada do redis-py (get/set com ex/delete)."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rag_sessions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        self._writes = 0
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM rag_sessions WHERE key = ?", (name,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, name: str, value: str, ex: Optional[float] = None) -> None:
+        expires_at = time.time() + ex if ex else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO rag_sessions (key, value, expires_at) VALUES (?, ?, ?)",
+                               (name, value, expires_at))
+            self._writes += 1
+            if self._writes % 1000 == 0: # Limpeza ocasional das chaves expiradas
+                self._conn.execute("DELETE FROM rag_sessions WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, name: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM rag_sessions WHERE key = ?", (name,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class SessionStore:
+    def __init__(self, backend: Any = None, max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES,
+                 max_session_bytes: int = SESSION_MAX_SESSION_BYTES, ttl_seconds: float = SESSION_TTL_SECONDS,
+                 recent_turns: int = SESSION_RECENT_TURNS, summary_max_chars: int = SESSION_SUMMARY_MAX_CHARS):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_session_bytes = max_session_bytes
+        self.ttl_seconds = ttl_seconds
+        self.recent_turns = recent_turns
+        self.summary_max_chars = summary_max_chars
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict() # Ordem LRU: mais antiga primeiro
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._stats = {"hits": 0, "backend_hits": 0, "misses": 0, "turns": 0, "evictions": 0, "expirations": 0,
+                       "summarized_turns": 0, "backend_errors": 0}
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store") if backend is not None else None
+
+    async def get(self, session_id: str) -> Optional[Session]:
+        session = self._get_in_memory(session_id)
+        if session is not None:
+            return session
+        if self.backend is not None:
+            try:
+                raw = await self._backend_call(self.backend.get, self._backend_key(session_id))
+            except Exception as e:
+                self._stats["backend_errors"] += 1
+                logger.warning(f"[session_store] Falha ao ler a sessão '{session_id}' do backend: {e}")
+                raw = None
+            if raw is not None:
+                session = self._sessions.get(session_id) # Outro turno pode tê-la carregado durante a leitura
+                if session is None:
+                    session = Session.from_json(session_id, raw)
+                    self._put(session)
+                self._stats["backend_hits"] += 1
+                return session
+        self._stats["misses"] += 1
+        return None
+
+    async def record_turn(self, session_id: str, question: str, answer: str, sources: List[Dict[str, Any]],
+                          embedding: Optional[np.ndarray], corpus_version: Optional[str]) -> Session:
+        """Registra um turno concluído, resumindo os turnos que saem da janela recente."""
+        session = await self.get(session_id) or Session(session_id)
+        session.turns.append(Turn(question, answer[:SESSION_ANSWER_MAX_CHARS]))
+        while len(session.turns) > self.recent_turns:
+            self._fold_oldest_turn(session)
+        if session.corpus_version != corpus_version: # Ids de outra versão do índice não valem mais
+            session.chunk_ids = []
+        new_ids = [source["id"] for source in sources if source.get("id") is not None]
+        session.chunk_ids = (new_ids + [i for i in session.chunk_ids if i not in new_ids])[:SESSION_MAX_CHUNK_IDS]
+        session.last_sources = sources
+        session.last_embedding = np.asarray(embedding, dtype=np.float16) if embedding is not None else None
+        session.corpus_version = corpus_version
+        session.turn_count += 1
+        session.updated_at = time.time()
+        # Limite por sessão: resume mais turnos e, se ainda não couber, descarta as fontes do último turno
+        while session.size_bytes() > self.max_session_bytes and session.turns:
+            self._fold_oldest_turn(session)
+        if session.size_bytes() > self.max_session_bytes:
+            session.last_sources = []
+        self._stats["turns"] += 1
+        self._put(session)
+        if self.backend is not None:
+            payload = session.to_json() # Serializada aqui: a sessão pode mudar enquanto a gravação espera
+            try:
+                await self._backend_call(self.backend.set, self._backend_key(session_id), payload, ex=int(self.ttl_seconds))
+            except Exception as e:
+                self._stats["backend_errors"] += 1
+                logger.warning(f"[session_store] Falha ao gravar a sessão '{session_id}' no backend: {e}")
+        return session
+
+    async def delete(self, session_id: str) -> bool:
+        existed = session_id in self._sessions
+        if existed:
+            self._remove(session_id)
+        if self.backend is not None:
+            await self._backend_call(self.backend.delete, self._backend_key(session_id))
+        return existed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "max_session_bytes": self.max_session_bytes,
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+        }
+
+    # --- Auxiliares ---
+
+    @staticmethod
+    def _backend_key(session_id: str) -> str:
+        return f"rag:session:{session_id}"
+
+    async def _backend_call(self, method, *args, **kwargs) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._io, functools.partial(method, *args, **kwargs))
+
+    def _get_in_memory(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.ttl_seconds:
+            self._remove(session_id)
+            self._stats["expirations"] += 1
+            return None
+        self._sessions.move_to_end(session_id)
+        self._stats["hits"] += 1
+        return session
+
+    def _fold_oldest_turn(self, session: Session) -> None:
+        session.summary = _append_summary(session.summary, _summarize_turn(session.turns.pop(0)), self.summary_max_chars)
+        self._stats["summarized_turns"] += 1
+
+    def _put(self, session: Session) -> None:
+        if session.session_id in self._sessions:
+            self._remove(session.session_id)
+        size = session.size_bytes()
+        while self._sessions and (len(self._sessions) >= self.max_sessions or self._bytes + size > self.max_bytes):
+            self._remove(next(iter(self._sessions))) # Continua no backend, se houver
+            self._stats["evictions"] += 1
+        self._sessions[session.session_id] = session
+        self._sizes[session.session_id] = size
+        self._bytes += size
+
+    def _remove(self, session_id: str) -> None:
+        del self._sessions[session_id]
+        self._bytes -= self._sizes.pop(session_id)
+
+
+def _create_backend() -> Any:
+    if SESSION_REDIS_URL:
+        try:
+            import redis # Import tardio: dependência opcional
+            return redis.Redis.from_url(SESSION_REDIS_URL, decode_responses=True)
+        except ImportError:
+            logger.warning("[session_store] Pacote redis não instalado; ignorando RAG_SESSION_REDIS_URL.")
+    if SESSION_DB_PATH:
+        return SqliteSessionBackend(SESSION_DB_PATH)
+    return None
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore(_create_backend())
+    return _store
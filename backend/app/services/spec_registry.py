@@ -0,0 +1,187 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/spec_registry.py:
+"""
+Registro das specs Guardrails de app/specs, compiladas uma única vez e compartilhadas entre requisições.
+
+- Arquivos `.rail` são registrados pelo nome do arquivo (ex: "example_spec.rail").
+- Módulos `.py` registram cada subclasse de `BaseModel` definida neles pelo nome da classe
+  (ex: "UserProfileSpec").
+
+`load()` roda no startup (lifespan do main.py). `refresh()` compara o mtime dos arquivos e
+recompila apenas os que mudaram; `watch()` chama `refresh()` periodicamente (hot reload).
+O dicionário de specs é substituído por inteiro a cada recarga (copy-on-write), então uma
+requisição em andamento sempre vê um conjunto consistente, sem locks no caminho de leitura.
+"""
+import asyncio
+import functools
+import importlib
+import inspect
+import logging
+import os
+import threading
+import time
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+logger = logging.getLogger(__name__)
+
+SPECS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "specs")
+SPECS_PACKAGE = "app.specs"
+RELOAD_INTERVAL_SECONDS = float(os.getenv("SPECS_RELOAD_INTERVAL", "2")) # 0 desativa o hot reload
+
+
+class CompiledSpec:
+    """Spec pronta para uso: modelo Pydantic (se houver) e o `AsyncGuard` já construído."""
+
+    def __init__(self, name: str, path: str, kind: str, model: Optional[Type[BaseModel]], guard: Any):
+        self.name = name
+        self.path = path
+        self.kind = kind # "pydantic" ou "rail"
+        self.model = model
+        self.guard = guard # None se guardrails-ai não estiver instalado
+
+    def validate_fast(self, raw_output: str) -> Optional[Dict[str, Any]]:
+        """
+        Caminho rápido: valida a saída com o validador compilado do Pydantic (pydantic-core),
+        sem passar pelo Guard. Retorna None se não houver modelo ou se a saída for inválida.
+        """
+        if self.model is None:
+            return None
+        try:
+            return self.model.model_validate_json(raw_output).model_dump()
+        except ValidationError:
+            return None
+
+    @functools.cached_property
+    def _field_adapters(self) -> Dict[str, TypeAdapter]:
+        # Tipo + restrições (ge, le, ...) de cada campo, para validar campos isolados
+        return {
+            name: TypeAdapter(Annotated[(field.annotation, *field.metadata)] if field.metadata else field.annotation)
+            for name, field in self.model.model_fields.items()
+        }
+
+    def validate_field(self, name: str, value: Any) -> Optional[str]:
+        """Valida um único campo de nível superior (saída parcial). Retorna a mensagem de erro ou None."""
+        if self.model is None:
+            return None
+        adapter = self._field_adapters.get(name)
+        if adapter is None:
+            return f"campo inesperado '{name}'" if self.model.model_config.get("extra") == "forbid" else None
+        try:
+            adapter.validate_python(value)
+        except ValidationError as e:
+            return f"campo '{name}' inválido: {e.errors()[0]['msg']}"
+        return None
+
+
+def _compile_guard(kind: str, path: str, model: Optional[Type[BaseModel]]) -> Any:
+    try:
+        from guardrails import AsyncGuard # Import tardio: dependência pesada e opcional em testes
+    except ImportError:
+        logger.warning("[spec_registry] guardrails-ai não instalado; specs sem Guard (apenas caminho rápido Pydantic).")
+        return None
+    if kind == "rail":
+        return AsyncGuard.for_rail(path)
+    return AsyncGuard.for_pydantic(output_class=model)
+
+
+class SpecRegistry:
+    def __init__(self, specs_dir: str = SPECS_DIR, package: str = SPECS_PACKAGE):
+        self.specs_dir = specs_dir
+        self.package = package
+        self._specs: Dict[str, CompiledSpec] = {}
+        self._files: Dict[str, Tuple[float, List[str]]] = {} # arquivo -> (mtime, specs que ele define)
+        self.compile_seconds = 0.0
+        self.reloads = 0
+
+    def get(self, name: str) -> Optional[CompiledSpec]:
+        return self._specs.get(name)
+
+    def names(self) -> List[str]:
+        return sorted(self._specs)
+
+    def load(self) -> int:
+        """Descobre e compila todas as specs (descarta o estado anterior)."""
+        self._specs, self._files = {}, {}
+        self.refresh()
+        logger.info(f"[spec_registry] {len(self._specs)} specs compiladas em {self.compile_seconds:.3f}s: {self.names()}")
+        return len(self._specs)
+
+    def refresh(self) -> bool:
+        """Recompila arquivos novos ou alterados e remove specs de arquivos apagados."""
+        current = {
+            name: os.path.getmtime(os.path.join(self.specs_dir, name))
+            for name in os.listdir(self.specs_dir)
+            if (name.endswith(".rail") or name.endswith(".py")) and not name.startswith("__")
+        }
+        changed = [name for name, mtime in current.items() if self._files.get(name, (None,))[0] != mtime]
+        removed = [name for name in self._files if name not in current]
+        if not changed and not removed:
+            return False
+
+        specs, files = dict(self._specs), dict(self._files)
+        for filename in removed + changed:
+            for spec_name in files.pop(filename, (0.0, []))[1]:
+                specs.pop(spec_name, None)
+        started = time.perf_counter()
+        for filename in changed:
+            try:
+                compiled = self._compile_file(filename)
+            except Exception as e:
+                # Mantém a versão anterior em uso; o erro aparece no log até o arquivo ser corrigido
+                logger.error(f"[spec_registry] Falha ao compilar '{filename}': {e}", exc_info=True)
+                previous = self._files.get(filename, (0.0, []))[1]
+                specs.update({name: self._specs[name] for name in previous})
+                files[filename] = (current[filename], previous) # Só tenta de novo se o arquivo mudar outra vez
+                continue
+            for spec in compiled:
+                specs[spec.name] = spec
+            files[filename] = (current[filename], [spec.name for spec in compiled])
+        self.compile_seconds += time.perf_counter() - started
+        self._specs, self._files = specs, files # Troca atômica para os leitores
+        if self.reloads or removed:
+            logger.info(f"[spec_registry] Specs recarregadas ({changed + removed}).")
+        self.reloads += 1
+        return True
+
+    async def watch(self, interval: float = RELOAD_INTERVAL_SECONDS) -> None:
+        """Hot reload por polling de mtime (barato: um stat por arquivo)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"[spec_registry] Erro no hot reload: {e}", exc_info=True)
+
+    def _compile_file(self, filename: str) -> List[CompiledSpec]:
+        path = os.path.join(self.specs_dir, filename)
+        if filename.endswith(".rail"):
+            if os.path.getsize(path) == 0:
+                return []
+            return [CompiledSpec(filename, path, "rail", None, _compile_guard("rail", path, None))]
+
+        module_name = f"{self.package}.{filename[:-3]}"
+        module = importlib.import_module(module_name)
+        if filename in self._files: # Arquivo alterado: reimporta o código novo
+            module = importlib.reload(module)
+        return [
+            CompiledSpec(name, path, "pydantic", model, _compile_guard("pydantic", path, model))
+            for name, model in inspect.getmembers(module, inspect.isclass)
+            if issubclass(model, BaseModel) and model is not BaseModel and model.__module__ == module.__name__
+        ]
+
+
+_registry: Optional[SpecRegistry] = None
+_registry_lock = threading.Lock() # O pré-aquecimento carrega o registro em uma thread
+
+
+def get_registry() -> SpecRegistry:
+    """Registro compartilhado; carregado no pré-aquecimento do startup ou, na falta dele, no primeiro uso."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = SpecRegistry()
+                registry.load()
+                _registry = registry
+    return _registry
@@ -0,0 +1,409 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/services/vector_index.py:
+"""
+Índice vetorial local (ANN) para o RAG, persistido em disco e lido via memory-map.
+
+Layout de uma versão do índice (diretório `<index_dir>/v<timestamp>/`):
+- manifest.json      -> dimensão, quantidade de linhas, quantização e nlist
+- embeddings.npy     -> matriz [N, D] float32 (ou int8 quando quantizado)
+- scales.npy         -> escala por linha (apenas int8)
+- centroids.npy      -> centróides IVF [nlist, D] (ausente se nlist == 0)
+- list_offsets.npy   -> offsets [nlist + 1] de cada lista IVF em list_rows.npy
+- list_rows.npy      -> índices das linhas ordenados por lista IVF
+- rows.jsonl         -> uma linha JSON por chunk ({id, content, metadata})
+- row_offsets.npy    -> offsets [N + 1] em bytes de cada linha de rows.jsonl
+- lexicon.json, ...  -> índice BM25 e de metadados (ver lexical_index.py)
+
+O arquivo `<index_dir>/CURRENT` aponta para a versão ativa e é trocado de forma atômica.
+Como tudo é aberto com `mmap_mode="r"`, vários workers do uvicorn compartilham as mesmas
+páginas do page cache em vez de cada um manter sua cópia da matriz em RAM.
+"""
+import contextlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .lexical_index import LexicalIndex, build_lexical_index
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+INDEX_FORMAT_VERSION = 1
+QUANTIZATIONS = ("float32", "int8")
+
+_KEEP_VERSIONS = 2 # Versões antigas mantidas para workers que ainda não recarregaram
+_IVF_MIN_ROWS = 4096 # Abaixo disso a busca exata (brute force) é mais rápida que o IVF
+_IVF_TRAIN_SAMPLE = 20000
+_IVF_ITERATIONS = 10
+_SCAN_BLOCK_ROWS = 65536 # Linhas por bloco na busca exata / atribuição de listas
+
+
+class IndexNotFoundError(FileNotFoundError):
+    pass
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantização simétrica por linha: x ~= q * scale, com q em [-127, 127]."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _train_ivf(sample: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """K-means esférico (similaridade de cosseno) sobre uma amostra das linhas."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(_IVF_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        non_empty = counts > 0
+        centroids[non_empty] = _normalize_rows(sums[non_empty])
+    return centroids
+
+
+def _default_nlist(count: int) -> int:
+    if count < _IVF_MIN_ROWS:
+        return 0
+    return int(min(4096, max(16, round(np.sqrt(count)))))
+
+
+class LocalIndexWriter:
+    """
+    Escreve uma nova versão do índice de forma incremental (streaming).
+    `add()` apenas anexa embeddings e linhas em disco, então a memória fica constante
+    independentemente do tamanho do corpus. `finalize()` quantiza, treina o IVF,
+    publica a versão em CURRENT e retorna o caminho dela.
+    """
+
+    def __init__(self, index_dir: str, dim: int, quantization: str = "float32", nlist: Optional[int] = None,
+                 staging: Optional[str] = None, resume_state: Optional[Dict[str, int]] = None):
+        """
+        `staging` fixa o nome do diretório temporário (ex: ingestão retomável); por padrão é único.
+        `resume_state` (retornado por `state()`) reabre esse diretório truncando-o até o ponto salvo.
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantização inválida '{quantization}'. Use uma de {QUANTIZATIONS}.")
+        self.index_dir = index_dir
+        self.dim = dim
+        self.quantization = quantization
+        self.nlist = nlist
+        self.count = 0
+        self._rows_bytes = 0
+        os.makedirs(index_dir, exist_ok=True)
+        self.version = f"v{time.time_ns()}"
+        self.path = os.path.join(index_dir, self.version)
+        self._tmp_path = os.path.join(index_dir, f"{staging}.tmp") if staging else self.path + ".tmp"
+        raw_path = os.path.join(self._tmp_path, "embeddings.f32")
+        rows_path = os.path.join(self._tmp_path, "rows.jsonl")
+        row_offsets_path = os.path.join(self._tmp_path, "row_offsets.i64")
+        if resume_state is not None and os.path.isdir(self._tmp_path):
+            # Descarta o que foi escrito depois do último checkpoint
+            self.count, self._rows_bytes = resume_state["count"], resume_state["rows_bytes"]
+            os.truncate(raw_path, self.count * dim * 4)
+            os.truncate(rows_path, self._rows_bytes)
+            os.truncate(row_offsets_path, (self.count + 1) * 8)
+            self._raw_file = open(raw_path, "ab")
+            self._rows_file = open(rows_path, "ab")
+            self._row_offsets_file = open(row_offsets_path, "ab")
+            logger.info(f"[vector_index] Retomando escrita em '{self._tmp_path}' a partir de {self.count} linhas.")
+        else:
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+            os.makedirs(self._tmp_path)
+            self._raw_file = open(raw_path, "wb")
+            self._rows_file = open(rows_path, "wb")
+            self._row_offsets_file = open(row_offsets_path, "wb")
+            self._row_offsets_file.write(np.int64(0).tobytes())
+
+    def add(self, rows: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        embeddings = _normalize_rows(embeddings)
+        if embeddings.shape != (len(rows), self.dim):
+            raise ValueError(f"Esperado embeddings com shape {(len(rows), self.dim)}, recebido {embeddings.shape}.")
+        self._raw_file.write(embeddings.tobytes())
+        offsets = np.empty(len(rows), dtype=np.int64)
+        for i, row in enumerate(rows):
+            line = json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n"
+            self._rows_file.write(line)
+            self._rows_bytes += len(line)
+            offsets[i] = self._rows_bytes
+        self._row_offsets_file.write(offsets.tobytes())
+        self.count += len(rows)
+
+    def state(self) -> Dict[str, int]:
+        """Grava em disco (fsync) o que foi adicionado e retorna o ponto de retomada."""
+        for handle in (self._raw_file, self._rows_file, self._row_offsets_file):
+            handle.flush()
+            os.fsync(handle.fileno())
+        return {"count": self.count, "rows_bytes": self._rows_bytes}
+
+    def close(self) -> None:
+        """Fecha os arquivos mantendo o diretório temporário (para retomar depois)."""
+        for handle in (self._raw_file, self._rows_file, self._row_offsets_file):
+            handle.close()
+
+    def abort(self) -> None:
+        self.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    def finalize(self) -> str:
+        self.close()
+        tmp = self._tmp_path
+        count, dim = self.count, self.dim
+        raw_path = os.path.join(tmp, "embeddings.f32")
+        raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(count, dim)) if count else np.zeros((0, dim), dtype=np.float32)
+
+        # 1. Matriz final (float32 ou int8 + escalas), escrita em blocos
+        dtype = np.int8 if self.quantization == "int8" else np.float32
+        embeddings = np.lib.format.open_memmap(os.path.join(tmp, "embeddings.npy"), mode="w+", dtype=dtype, shape=(count, dim))
+        scales = None
+        if self.quantization == "int8":
+            scales = np.lib.format.open_memmap(os.path.join(tmp, "scales.npy"), mode="w+", dtype=np.float32, shape=(count,))
+        for start in range(0, count, _SCAN_BLOCK_ROWS):
+            block = np.asarray(raw[start:start + _SCAN_BLOCK_ROWS])
+            if scales is not None:
+                embeddings[start:start + len(block)], scales[start:start + len(block)] = _quantize_int8(block)
+            else:
+                embeddings[start:start + len(block)] = block
+
+        # 2. Listas IVF (treino em amostra, atribuição em blocos)
+        nlist = self.nlist if self.nlist is not None else _default_nlist(count)
+        nlist = min(nlist, count)
+        if nlist > 0:
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(count, size=min(count, _IVF_TRAIN_SAMPLE), replace=False))
+            centroids = _train_ivf(np.asarray(raw[sample_rows]), nlist)
+            labels = np.empty(count, dtype=np.int32)
+            for start in range(0, count, _SCAN_BLOCK_ROWS):
+                block = np.asarray(raw[start:start + _SCAN_BLOCK_ROWS])
+                labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            list_rows = np.argsort(labels, kind="stable").astype(np.int64)
+            list_offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=nlist)))).astype(np.int64)
+            np.save(os.path.join(tmp, "centroids.npy"), centroids)
+            np.save(os.path.join(tmp, "list_rows.npy"), list_rows)
+            np.save(os.path.join(tmp, "list_offsets.npy"), list_offsets)
+
+        # 3. Offsets das linhas, índice lexical (BM25 + metadados) e manifest
+        row_offsets = np.fromfile(os.path.join(tmp, "row_offsets.i64"), dtype=np.int64)
+        np.save(os.path.join(tmp, "row_offsets.npy"), row_offsets)
+        with open(os.path.join(tmp, "rows.jsonl"), encoding="utf-8") as f:
+            build_lexical_index(tmp, (json.loads(line) for line in f))
+        del raw, embeddings, scales
+        os.remove(raw_path)
+        os.remove(os.path.join(tmp, "row_offsets.i64"))
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "dim": dim,
+            "count": count,
+            "quantization": self.quantization,
+            "nlist": nlist,
+            "created_at": time.time(),
+        }
+        with open(os.path.join(tmp, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        # 4. Publica a versão: rename do diretório + troca atômica do ponteiro CURRENT
+        os.replace(tmp, self.path)
+        pointer_tmp = os.path.join(self.index_dir, CURRENT_FILE + ".tmp")
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(self.version)
+        os.replace(pointer_tmp, os.path.join(self.index_dir, CURRENT_FILE))
+        _prune_old_versions(self.index_dir, keep=self.version)
+        logger.info(f"[vector_index] Versão {self.version} publicada com {count} linhas (quantização={self.quantization}, nlist={nlist}).")
+        return self.path
+
+
+def _prune_old_versions(index_dir: str, keep: str) -> None:
+    versions = sorted(name for name in os.listdir(index_dir) if name.startswith("v") and not name.endswith(".tmp"))
+    stale = [name for name in versions if name != keep][:-(_KEEP_VERSIONS - 1) or None]
+    for name in stale:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def build_index(index_dir: str, rows: List[Dict[str, Any]], embeddings: np.ndarray,
+                quantization: str = "float32", nlist: Optional[int] = None) -> str:
+    """Atalho para construir e publicar um índice a partir de dados já em memória."""
+    writer = LocalIndexWriter(index_dir, dim=np.asarray(embeddings).shape[1], quantization=quantization, nlist=nlist)
+    try:
+        writer.add(rows, embeddings)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.finalize()
+
+
+def current_version(index_dir: str) -> Optional[str]:
+    """Versão apontada por `<index_dir>/CURRENT` (None se nada foi publicado)."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _top_k(positions: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    if len(positions) == 0:
+        return []
+    k = min(k, len(positions))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(positions[i]), float(scores[i])) for i in top]
+
+
+class LocalVectorIndex:
+    """Versão publicada do índice, aberta somente leitura via memory-map."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = os.path.basename(path)
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        self.dim: int = self.manifest["dim"]
+        self.count: int = self.manifest["count"]
+        self.nlist: int = self.manifest["nlist"]
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r") if self.manifest["quantization"] == "int8" else None
+        if self.nlist > 0:
+            self.centroids = np.load(os.path.join(path, "centroids.npy"))
+            self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+            self.list_rows = np.load(os.path.join(path, "list_rows.npy"), mmap_mode="r")
+        self.row_offsets = np.load(os.path.join(path, "row_offsets.npy"), mmap_mode="r")
+        self._rows_handle = open(os.path.join(path, "rows.jsonl"), "rb")
+        self._rows_mmap = mmap.mmap(self._rows_handle.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+        self.lexical: Optional[LexicalIndex] = LexicalIndex.open(path)
+        self._users = 0 # Consultas em andamento (ver in_use)
+        self._retired = False
+
+    @classmethod
+    def open(cls, index_dir: str) -> "LocalVectorIndex":
+        """Abre a versão apontada por `<index_dir>/CURRENT`."""
+        version = current_version(index_dir)
+        if version is None:
+            raise IndexNotFoundError(f"Nenhum índice publicado em '{index_dir}'. Execute load_and_index_data().")
+        return cls(os.path.join(index_dir, version))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        if self._rows_mmap is not None:
+            self._rows_mmap.close()
+        self._rows_handle.close()
+
+    @contextlib.contextmanager
+    def in_use(self) -> Iterator["LocalVectorIndex"]:
+        """Marca uma consulta em andamento; um índice aposentado só fecha quando a última termina."""
+        self._users += 1
+        try:
+            yield self
+        finally:
+            self._users -= 1
+            if self._retired and self._users == 0:
+                self.close()
+
+    def retire(self) -> None:
+        """Chamado quando uma nova versão substitui esta: fecha agora ou ao fim da última consulta."""
+        self._retired = True
+        if self._users == 0:
+            self.close()
+
+    def row(self, position: int) -> Dict[str, Any]:
+        start, end = int(self.row_offsets[position]), int(self.row_offsets[position + 1])
+        return json.loads(self._rows_mmap[start:end])
+
+    def _score(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        block = np.asarray(self.embeddings[rows] if rows is not None else self.embeddings)
+        if self.scales is None:
+            return block @ query
+        scales = np.asarray(self.scales[rows] if rows is not None else self.scales)
+        return (block.astype(np.float32) @ query) * scales
+
+    def _score_many(self, rows, queries: np.ndarray) -> np.ndarray:
+        """Scores [linhas, consultas] com uma única multiplicação de matrizes."""
+        block = np.asarray(self.embeddings[rows])
+        if self.scales is None:
+            return block @ queries.T
+        return (block.astype(np.float32) @ queries.T) * np.asarray(self.scales[rows])[:, None]
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> Optional[np.ndarray]:
+        """Linhas das `nprobe` listas IVF mais próximas (None = busca exata)."""
+        if self.nlist == 0 or nprobe >= self.nlist:
+            return None
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists])
+
+    def search(self, query: Iterable[float], k: int = 5, nprobe: int = 8,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Retorna até `k` pares (posição da linha, similaridade de cosseno), do mais similar ao menos.
+        `allowed` (linhas ordenadas, ex: LexicalIndex.filter_rows) restringe a busca antes do
+        scoring: o subconjunto é pontuado por inteiro, sem IVF, então o filtro nunca esvazia o top-k.
+        """
+        if self.count == 0 or k <= 0:
+            return []
+        query = _normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        candidates = self._candidates(query, nprobe) if allowed is None else None
+        if allowed is not None:
+            positions_parts, score_parts = [], []
+            for start in range(0, len(allowed), _SCAN_BLOCK_ROWS):
+                rows = np.asarray(allowed[start:start + _SCAN_BLOCK_ROWS])
+                positions_parts.append(rows)
+                score_parts.append(self._score(rows, query))
+            if not positions_parts:
+                return []
+            positions, scores = np.concatenate(positions_parts), np.concatenate(score_parts)
+        elif candidates is not None:
+            positions = np.sort(candidates) # Acesso sequencial ao memory-map
+            scores = self._score(positions, query)
+        else:
+            positions_parts, score_parts = [], []
+            for start in range(0, self.count, _SCAN_BLOCK_ROWS):
+                rows = np.arange(start, min(start + _SCAN_BLOCK_ROWS, self.count))
+                block_scores = self._score(slice(start, start + len(rows)), query)
+                top = np.argpartition(-block_scores, min(k, len(rows)) - 1)[:k]
+                positions_parts.append(rows[top])
+                score_parts.append(block_scores[top])
+            positions, scores = np.concatenate(positions_parts), np.concatenate(score_parts)
+        return _top_k(positions, scores, k)
+
+    def search_many(self, queries: np.ndarray, k: int = 5, nprobe: int = 8) -> List[List[Tuple[int, float]]]:
+        """
+        Mesmo resultado de `search` (sem `allowed`) para cada linha de `queries`, mas com o trabalho
+        compartilhado entre as consultas: centróides e linhas candidatas (união das listas IVF
+        visitadas, ou o corpus inteiro em blocos) são pontuados para todas de uma vez.
+        """
+        queries = _normalize_rows(np.asarray(queries, dtype=np.float32).reshape(len(queries), -1))
+        if self.count == 0 or k <= 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        if self.nlist > 0 and nprobe < self.nlist:
+            lists = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+            per_query = [np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in row])
+                         for row in lists]
+            positions = np.unique(np.concatenate(per_query)) # Ordenadas: acesso sequencial ao memory-map
+            scores = self._score_many(positions, queries)
+            return [_top_k(candidates, scores[np.searchsorted(positions, candidates), j], k)
+                    for j, candidates in enumerate(per_query)]
+        positions_parts: List[List[np.ndarray]] = [[] for _ in range(len(queries))]
+        score_parts: List[List[np.ndarray]] = [[] for _ in range(len(queries))]
+        for start in range(0, self.count, _SCAN_BLOCK_ROWS):
+            rows = np.arange(start, min(start + _SCAN_BLOCK_ROWS, self.count))
+            block_scores = self._score_many(slice(start, start + len(rows)), queries)
+            top = np.argpartition(-block_scores, min(k, len(rows)) - 1, axis=0)[:k]
+            for j in range(len(queries)):
+                positions_parts[j].append(rows[top[:, j]])
+                score_parts[j].append(block_scores[top[:, j], j])
+        return [_top_k(np.concatenate(positions_parts[j]), np.concatenate(score_parts[j]), k) for j in range(len(queries))]
@@ -0,0 +1,69 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/settings.py:
+"""
+Configuração da app, montada uma única vez por processo (`get_settings()` é cacheado).
+
+Concentra o que antes ficava espalhado no topo do main.py: o ajuste do sys.path e a leitura
+dos dois arquivos .env (backend/.env e .env.local da raiz do projeto). Os serviços continuam
+lendo suas variáveis com os.getenv; como get_settings() roda antes de qualquer serviço ser
+importado, os valores dos .env já estão no ambiente quando eles são carregados.
+"""
+import functools
+import os
+import sys
+from dataclasses import dataclass
+from typing import Tuple
+
+from dotenv import load_dotenv
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(APP_DIR) # /path/to/atlas/backend
+ROOT_DIR = os.path.dirname(BACKEND_DIR) # /path/to/atlas
+
+
+@dataclass(frozen=True)
+class Settings:
+    backend_dotenv_path: str
+    backend_dotenv_found: bool
+    openai_api_key: str
+    supabase_dsn: str
+    frontend_url: str
+    host: str
+    port: int
+    prewarm: bool # Importa os stacks pesados em segundo plano logo após o startup
+    allowed_origins: Tuple[str, ...]
+
+    @property
+    def openai_key_present(self) -> bool:
+        return len(self.openai_api_key) > 5
+
+    @property
+    def supabase_conn_present(self) -> bool:
+        return "postgres:" in self.supabase_dsn
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    # Permite imports absolutos 'from app...' quando o uvicorn roda da raiz (uvicorn backend.app.main:app)
+    # ou de dentro de backend/ (uvicorn app.main:app)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    backend_dotenv_path = os.path.join(BACKEND_DIR, ".env")
+    load_dotenv(dotenv_path=backend_dotenv_path)
+    load_dotenv(dotenv_path=os.path.join(ROOT_DIR, ".env.local"), override=False) # Não sobrescreve vars já carregadas
+
+    frontend_url = os.getenv("NEXT_PUBLIC_SITE_URL", "http://localhost:3000")
+    origins = [
+        frontend_url, # URL principal do frontend (lida do .env.local da raiz)
+        "http://localhost:8000", # Permitir acesso da própria API (para testes/docs)
+    ]
+    return Settings(
+        backend_dotenv_path=backend_dotenv_path,
+        backend_dotenv_found=os.path.exists(backend_dotenv_path),
+        openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+        supabase_dsn=os.getenv("SUPABASE_DB_CONNECTION_STRING", ""),
+        frontend_url=frontend_url,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        prewarm=os.getenv("APP_PREWARM", "true").lower() == "true",
+        allowed_origins=tuple(sorted(set(filter(None, origins)))),
+    )
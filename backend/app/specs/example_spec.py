@@ -0,0 +1,12 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/specs/example_spec.py:
+# Specs Guardrails em Pydantic: toda subclasse de BaseModel definida neste pacote é registrada
+# pelo nome da classe (ex: spec_name="UserProfileSpec") em app/services/spec_registry.py.
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class UserProfileSpec(BaseModel):
+    name: str = Field(..., description="Nome completo do usuário")
+    age: int = Field(..., ge=0, le=150, description="Idade em anos")
+    interests: List[str] = Field(default_factory=list, description="Lista de interesses do usuário")
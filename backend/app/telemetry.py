@@ -0,0 +1,319 @@
+# Copie e cole para criar/atualizar o arquivo backend/app/telemetry.py:
+"""
+Instrumentação do caminho quente das rotas de IA.
+
+- `span("rag.retrieve")` mede um estágio e alimenta o histograma `ai_stage_duration_seconds`
+  (e cria um span OpenTelemetry quando a exportação está ativa).
+- Contadores/histogramas em memória, expostos em `/metrics` no formato texto do Prometheus.
+- `TelemetryMiddleware` (ASGI puro, não interfere em respostas streaming) mede cada requisição por
+  rota e, com PROFILING_ENABLED, liga um profiler por amostragem quando a requisição traz o header
+  `X-Profile: 1`; o resultado (pilhas no formato "collapsed" dos flame graphs) fica em
+  `/metrics/profiles/{id}`, com o id devolvido no header `X-Profile-Id`. O profiler amostra a thread
+  do event loop inteira: o perfil cobre o processo durante a janela da requisição, incluindo as
+  outras requisições concorrentes (para isolar uma, perfile com o servidor sem outra carga).
+
+Só usa a biblioteca padrão (o import continua barato para app.main). Com METRICS_ENABLED=false e
+sem OTEL_EXPORTER_OTLP_ENDPOINT, `span()` devolve um context manager vazio compartilhado.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true" # Expõe pilhas: só em ambientes internos
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_STORED = 20
+PROFILE_HEADER = b"x-profile"
+OTEL_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock() # Também é chamado das threads das Crews
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {} # contagens por bucket (+Inf no fim), soma, total
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_label = f'le="{le}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, bucket_label)} {cumulative:g}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]:.6f}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]:g}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: "OrderedDict[str, Any]" = OrderedDict()
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("ai_stage_duration_seconds", "Duração de cada estágio do caminho quente.", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "Duração das requisições HTTP (até o fim do corpo).",
+                                     ("route", "method", "status"))
+LLM_TOKENS = REGISTRY.counter("ai_llm_tokens_total", "Tokens gerados pelo LLM.", ("service",))
+RAG_CACHE_LOOKUPS = REGISTRY.counter("ai_rag_cache_lookups_total", "Consultas ao cache de respostas do RAG por resultado.", ("result",))
+RAG_SESSION_RETRIEVALS = REGISTRY.counter("ai_rag_session_retrievals_total",
+                                          "Recuperações do RAG por reaproveitamento da sessão (full, narrow, skip).", ("mode",))
+INGESTION_EMBEDDINGS = REGISTRY.counter("ai_ingestion_embeddings_total",
+                                        "Embeddings da ingestão calculados no provedor ou vindos do cache.", ("result",))
+GUARDRAILS_VALIDATIONS = REGISTRY.counter("ai_guardrails_validations_total", "Validações por spec, caminho e resultado.",
+                                          ("spec", "path", "outcome"))
+GUARDRAILS_REASKS = REGISTRY.counter("ai_guardrails_reasks_total", "Re-asks feitos ao LLM pelo Guard.", ("spec",))
+GUARDRAILS_CANDIDATES = REGISTRY.counter("ai_guardrails_candidates_total", "Candidatos do modo multi-candidato por resultado.",
+                                         ("spec", "outcome"))
+ADMISSION_REJECTIONS = REGISTRY.counter("ai_admission_rejections_total", "Requisições/chamadas recusadas por sobrecarga.",
+                                        ("scope", "reason"))
+
+
+# --- Spans ---
+
+_tracer: Any = None # Tracer OpenTelemetry (configure_tracing)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("stage", "attributes", "_started", "_otel_span")
+
+    def __init__(self, stage: str, attributes: Dict[str, Any]):
+        self.stage = stage
+        self.attributes = attributes
+        self._otel_span = None
+
+    def __enter__(self) -> "_Span":
+        if _tracer is not None:
+            # start_span (e não start_as_current_span): o span pode atravessar yields de um gerador
+            # retomado em outra task, onde resetar o contexto atual falharia
+            self._otel_span = _tracer.start_span(self.stage, attributes=self.attributes)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        STAGE_SECONDS.observe(time.perf_counter() - self._started, stage=self.stage)
+        if self._otel_span is not None:
+            if exc is not None and exc_type is not GeneratorExit:
+                self._otel_span.record_exception(exc)
+            self._otel_span.end()
+
+
+def span(stage: str, **attributes: Any) -> Any:
+    """Context manager que mede o estágio `stage` (ex: "rag.embed")."""
+    if not METRICS_ENABLED and _tracer is None:
+        return _NOOP_SPAN
+    return _Span(stage, attributes)
+
+
+def configure_tracing(app: Any) -> bool:
+    """Exportação OpenTelemetry (OTLP/HTTP) quando OTEL_EXPORTER_OTLP_ENDPOINT está definido."""
+    global _tracer
+    if not OTEL_ENDPOINT:
+        return False
+    try:
+        # Imports tardios: só carregados com a exportação ativa
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        logger.warning(f"[telemetry] OpenTelemetry indisponível ({e}); exportação de traces desativada.")
+        return False
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "atlas-ai-backend")}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter())) # Lê endpoint/headers das variáveis OTEL_*
+    trace.set_tracer_provider(provider)
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=provider, excluded_urls="metrics")
+    _tracer = trace.get_tracer("atlas.ai")
+    logger.info(f"[telemetry] Exportando traces OpenTelemetry para {OTEL_ENDPOINT}.")
+    return True
+
+
+# --- Profiler por amostragem ---
+
+class SamplingProfiler:
+    """
+    Amostra, a partir de outra thread, a pilha da thread alvo (o event loop) a cada intervalo.
+    Não separa tasks: tudo o que o loop executa na janela entra nas amostras.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: "_Tally[str]" = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Para a amostragem e retorna as pilhas no formato collapsed ("a;b;c contagem")."""
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    return _profiles.get(profile_id)
+
+
+def _store_profile(profile_id: str, collapsed: str) -> None:
+    _profiles[profile_id] = collapsed
+    while len(_profiles) > PROFILE_MAX_STORED:
+        _profiles.popitem(last=False)
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    """Template da rota (/api/v1/crew-jobs/{job_id}) em vez do path real, para não explodir a cardinalidade."""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    path = scope["path"]
+    if route.path_regex.match(path):
+        return route.path
+    # Versões recentes do FastAPI expõem a rota do router incluído sem o prefixo do include_router:
+    # recupera o prefixo como o trecho do path anterior à parte que a rota casa
+    for i, char in enumerate(path):
+        if char == "/" and i > 0 and route.path_regex.match(path[i:]):
+            return path[:i] + route.path
+    return route.path
+
+
+class TelemetryMiddleware:
+    """Middleware ASGI: latência por rota/método/status e profiler sob demanda."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profiler, profile_id = None, None
+        if PROFILING_ENABLED and dict(scope.get("headers") or []).get(PROFILE_HEADER) in (b"1", b"true"):
+            profile_id = uuid.uuid4().hex
+            profiler = SamplingProfiler(threading.get_ident())
+            profiler.start()
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile_id is not None:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route=_route_template(scope),
+                                    method=scope["method"], status=status_code)
+            if profiler is not None:
+                _store_profile(profile_id, await asyncio.to_thread(profiler.stop)) # join fora do event loop
@@ -0,0 +1,65 @@
+# backend/benchmarks/bench_generate_structured.py
+"""
+Compara a latência de /generate-structured com specs frias (spec descoberta e Guard compilado
+a cada requisição, como antes do registro) e quentes (registro compilado uma vez no startup).
+As latências simuladas do LLM são zeradas para isolar o custo de carregar/compilar a spec.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_generate_structured [--requests 200] [--spec UserProfileSpec]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.services import guardrails_service, spec_registry
+
+
+async def _measure(client: AsyncClient, spec_name: str, requests: int) -> list:
+    payload = {"prompt": "Extraia dados do usuário", "spec_name": spec_name}
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.post("/api/v1/generate-structured", json=payload)
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+def _summary(label: str, latencies: list) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    return f"{label:<6} média={statistics.mean(ordered):7.2f}ms  p50={statistics.median(ordered):7.2f}ms  p95={p95:7.2f}ms"
+
+
+async def main(requests: int, spec_name: str) -> None:
+    guardrails_service.PLACEHOLDER_LLM_SECONDS = 0.0
+    original_get_registry = spec_registry.get_registry
+
+    def cold_registry() -> spec_registry.SpecRegistry:
+        registry = spec_registry.SpecRegistry()
+        registry.load()
+        return registry
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        spec_registry.get_registry = cold_registry
+        cold = await _measure(client, spec_name, requests)
+        spec_registry.get_registry = original_get_registry
+        original_get_registry() # Aquecimento, como no lifespan
+        warm = await _measure(client, spec_name, requests)
+
+    print(f"/generate-structured com spec '{spec_name}' ({requests} requisições cada)")
+    print(_summary("fria", cold))
+    print(_summary("quente", warm))
+    print(f"ganho médio: {statistics.mean(cold) / statistics.mean(warm):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--spec", default="UserProfileSpec")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.spec))
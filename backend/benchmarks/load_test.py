@@ -0,0 +1,249 @@
+# backend/benchmarks/load_test.py
+"""
+Teste de carga da API com concorrência controlada, totalmente offline (backends de benchmarks/stubs.py).
+
+Cenários: /api/v1/rag-query, /api/v1/run-crew e /api/v1/generate-structured. Para cada um, reporta
+throughput, latências p50/p95/p99, lag do event loop e memória (RSS) de cada worker. Cada worker é um
+processo com sua própria instância da app (como um worker do uvicorn), dirigido via ASGITransport,
+então o que se mede é o caminho da requisição dentro da app, sem rede nem servidor HTTP.
+
+Uso (a partir de backend/):
+    python -m benchmarks.load_test                                  # compara com benchmarks/baseline.json
+    python -m benchmarks.load_test --write-baseline                 # grava um novo baseline
+    python -m benchmarks.load_test --scenario rag-query --concurrency 64 --llm-first-token-ms 300
+
+Sai com código 1 se algum cenário regredir além de `--tolerance` em relação ao baseline
+(latências maiores ou throughput menor) ou se houver respostas com erro.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from benchmarks.stubs import StubLatencies, build_stub_index, install_stubs, question_for
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+LOOP_LAG_INTERVAL = 0.01 # Intervalo de amostragem do lag do event loop (s)
+DEFAULT_CORPUS_SIZE = 2000
+# Métricas comparadas com o baseline: (nome, True se "maior é melhor")
+COMPARED_METRICS = [("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)]
+
+
+def _rag_request(i: int, corpus_size: int) -> Tuple[str, Dict[str, Any]]:
+    return "/api/v1/rag-query", {"question": question_for(i, corpus_size)}
+
+
+def _crew_request(i: int, corpus_size: int) -> Tuple[str, Dict[str, Any]]:
+    return "/api/v1/run-crew", {"topic": f"Análise de mercado {i}", "parameters": {}}
+
+
+def _structured_request(i: int, corpus_size: int) -> Tuple[str, Dict[str, Any]]:
+    return "/api/v1/generate-structured", {"prompt": f"Extraia o perfil do usuário {i}", "spec_name": "UserProfileSpec"}
+
+
+SCENARIOS: Dict[str, Callable[[int, int], Tuple[str, Dict[str, Any]]]] = {
+    "rag-query": _rag_request,
+    "run-crew": _crew_request,
+    "generate-structured": _structured_request,
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por interpolação linear (q em [0, 100])."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _rss_mb() -> float:
+    """RSS atual do processo (Linux); cai para o pico (ru_maxrss) em outros sistemas."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    """Mede o atraso do event loop: quanto um sleep de LOOP_LAG_INTERVAL passa do tempo pedido."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        samples.append(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL) * 1000)
+
+
+async def _drive(scenario: str, requests: int, concurrency: int, corpus_size: int) -> Dict[str, Any]:
+    make_request = SCENARIOS[scenario]
+    latencies: List[float] = []
+    errors = 0
+    next_request = iter(range(requests))
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+
+    async def client_loop(client: AsyncClient) -> None:
+        nonlocal errors
+        for i in next_request: # Iterador compartilhado: cada requisição sai para um único cliente
+            path, payload = make_request(i, corpus_size)
+            started = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        path, payload = make_request(0, corpus_size)
+        await client.post(path, json=payload) # Aquecimento (registro de specs, batcher, imports)
+        monitor = asyncio.create_task(_monitor_loop_lag(lag_samples, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+    return {"latencies_ms": latencies, "errors": errors, "elapsed_seconds": elapsed,
+            "loop_lag_ms": lag_samples, "rss_mb": _rss_mb()}
+
+
+def run_worker(scenario: str, requests: int, concurrency: int, latencies: Dict[str, Any],
+               index_dir: Optional[str], corpus_size: int, log_level: str = "WARNING") -> Dict[str, Any]:
+    """Um worker: processo com a app, os stubs instalados e `concurrency` clientes simultâneos."""
+    root_logger = logging.getLogger()
+    previous_level = root_logger.level
+    root_logger.setLevel(log_level) # Os logs INFO por requisição dominariam a medição
+    try:
+        with install_stubs(StubLatencies(**latencies), index_dir=index_dir):
+            return asyncio.run(_drive(scenario, requests, concurrency, corpus_size))
+    finally:
+        root_logger.setLevel(previous_level)
+
+
+def summarize(worker_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [value for result in worker_results for value in result["latencies_ms"]]
+    lag = [value for result in worker_results for value in result["loop_lag_ms"]]
+    elapsed = max(result["elapsed_seconds"] for result in worker_results)
+    return {
+        "requests": len(latencies),
+        "errors": sum(result["errors"] for result in worker_results),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "loop_lag_p99_ms": round(percentile(lag, 99), 2),
+        "loop_lag_max_ms": round(max(lag, default=0.0), 2),
+        "rss_mb_per_worker": [round(result["rss_mb"], 1) for result in worker_results],
+    }
+
+
+def run_scenario(scenario: str, requests: int, concurrency: int, workers: int, latencies: StubLatencies,
+                 index_dir: Optional[str], corpus_size: int, log_level: str = "WARNING") -> Dict[str, Any]:
+    """Divide requisições e concorrência entre `workers` processos e agrega as métricas."""
+    args = [(scenario, requests // workers + (w < requests % workers), max(1, concurrency // workers),
+             latencies.as_dict(), index_dir, corpus_size, log_level) for w in range(workers)]
+    if workers == 1:
+        return summarize([run_worker(*args[0])])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return summarize(list(pool.map(run_worker, *zip(*args))))
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Lista de regressões (vazia se tudo estiver dentro da tolerância)."""
+    regressions = []
+    for scenario, current in results.items():
+        if current["errors"]:
+            regressions.append(f"{scenario}: {current['errors']} respostas com erro")
+        reference = baseline.get("scenarios", {}).get(scenario)
+        if reference is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            expected, value = reference[metric], current[metric]
+            if higher_is_better and value < expected * (1 - tolerance):
+                regressions.append(f"{scenario}: {metric} caiu de {expected} para {value}")
+            elif not higher_is_better and value > expected * (1 + tolerance):
+                regressions.append(f"{scenario}: {metric} subiu de {expected} para {value}")
+    return regressions
+
+
+def _print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'cenário':<22}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'lag p99':>9}{'lag máx':>9}  RSS/worker (MB)"
+    print(header)
+    print("-" * len(header))
+    for scenario, r in results.items():
+        print(f"{scenario:<22}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+              f"{r['loop_lag_p99_ms']:>9}{r['loop_lag_max_ms']:>9}  {r['rss_mb_per_worker']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append",
+                        help="Cenário a executar (repetível; padrão: todos)")
+    parser.add_argument("--requests", type=int, default=400, help="Requisições por cenário")
+    parser.add_argument("--concurrency", type=int, default=32, help="Clientes simultâneos (somando os workers)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos, cada um com sua instância da app")
+    parser.add_argument("--corpus-size", type=int, default=DEFAULT_CORPUS_SIZE, help="Chunks no índice local (0 = RAG placeholder)")
+    for field in fields(StubLatencies):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=type(field.default), default=field.default)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--write-baseline", action="store_true", help="Grava os resultados como novo baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Regressão relativa tolerada (0.25 = 25%%)")
+    parser.add_argument("--json", action="store_true", help="Imprime os resultados em JSON")
+    parser.add_argument("--log-level", default="WARNING", help="Nível de log da app durante a medição")
+    args = parser.parse_args(argv)
+
+    latencies = StubLatencies(**{field.name: getattr(args, field.name) for field in fields(StubLatencies)})
+    config = {"requests": args.requests, "concurrency": args.concurrency, "workers": args.workers,
+              "corpus_size": args.corpus_size, "latencies": latencies.as_dict()}
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="bench-index-") as tmp:
+        index_dir = None
+        if args.corpus_size > 0:
+            index_dir = os.path.join(tmp, "index")
+            build_stub_index(index_dir, args.corpus_size)
+        for scenario in args.scenario or list(SCENARIOS):
+            results[scenario] = run_scenario(scenario, args.requests, args.concurrency, args.workers,
+                                             latencies, index_dir, args.corpus_size, args.log_level)
+
+    if args.json:
+        print(json.dumps({"config": config, "scenarios": results}, indent=2, ensure_ascii=False))
+    else:
+        _print_report(results)
+
+    if args.write_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "scenarios": results}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline gravado em {args.baseline}")
+        return 0
+    baseline: Dict[str, Any] = {}
+    if not os.path.exists(args.baseline):
+        print(f"Baseline '{args.baseline}' não encontrado; use --write-baseline para criá-lo.")
+    else:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("AVISO: configuração diferente da usada no baseline; apenas erros serão verificados.")
+            baseline = {}
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSÃO: {regression}")
+    if not regressions:
+        print(f"Sem regressões em relação ao baseline (tolerância {args.tolerance:.0%}).")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
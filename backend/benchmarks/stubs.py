@@ -0,0 +1,124 @@
+# backend/benchmarks/stubs.py
+"""
+Substitutos locais e determinísticos para os backends externos, com latência injetada configurável.
+Permitem rodar os benchmarks totalmente offline:
+
+- LLM (RAG e Guardrails)  -> respostas fixas, latência do primeiro token + latência por token
+- API de embeddings       -> embeddings por feature hashing (embedding_service._hash_embedding)
+- pgvector                -> índice local (vector_index) com um corpus sintético + latência de rede
+- Crew                    -> passos bloqueantes (time.sleep), como um `crew.kickoff()` real
+
+`install_stubs()` é um context manager: ao sair, restaura todos os módulos da app.
+"""
+import asyncio
+import contextlib
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+import numpy as np
+
+from app.services import crew_service, embedding_service, guardrails_service, rag_service
+from app.services.vector_index import LocalVectorIndex, build_index
+
+
+@dataclass
+class StubLatencies:
+    embed_ms: float = 20.0 # Chamada à API de embeddings (por lote do micro-batcher)
+    vector_ms: float = 15.0 # Ida e volta ao pgvector
+    llm_first_token_ms: float = 100.0 # Tempo até o primeiro token do LLM
+    llm_token_ms: float = 2.0 # Intervalo entre tokens
+    answer_tokens: int = 20 # Tokens por resposta do RAG
+    crew_step_ms: float = 50.0 # Cada um dos 3 passos bloqueantes da Crew
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def synthetic_documents(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Corpus sintético determinístico, com códigos de produto para a busca lexical."""
+    rng = np.random.default_rng(seed)
+    words = ["sensor", "bomba", "válvula", "pressão", "vazão", "temperatura", "instalação", "manutenção",
+             "garantia", "firmware", "calibração", "alarme", "painel", "relatório", "consumo", "ruído"]
+    categories = ["industrial", "residencial", "agrícola", "hospitalar"]
+    documents = []
+    for i in range(count):
+        body = " ".join(rng.choice(words, size=40))
+        category = categories[i % len(categories)]
+        documents.append({
+            "id": i,
+            "content": f"Produto XPT-{i:05d} ({category}): {body}.",
+            "metadata": {"source": f"catalogo/xpt-{i:05d}.md", "category": category},
+        })
+    return documents
+
+
+def question_for(i: int, corpus_size: int) -> str:
+    return f"Qual a especificação de vazão do produto XPT-{(i * 7919) % corpus_size:05d}?"
+
+
+def build_stub_index(index_dir: str, corpus_size: int) -> str:
+    """Publica em `index_dir` um índice local com o corpus sintético (o "pgvector" dos benchmarks)."""
+    documents = synthetic_documents(corpus_size)
+    embeddings = np.stack([embedding_service._hash_embedding(doc["content"]) for doc in documents])
+    return build_index(index_dir, documents, embeddings)
+
+
+@contextlib.contextmanager
+def install_stubs(latencies: StubLatencies, index_dir: Optional[str] = None,
+                  answer_cache: bool = False) -> Iterator[None]:
+    """
+    Troca os backends externos pelos substitutos locais. Com `index_dir` (ver build_stub_index),
+    o RAG usa o índice local; sem ele, segue o caminho placeholder do rag_service.
+    `answer_cache=False` desativa o cache de respostas para medir o caminho completo.
+    """
+
+    async def embed_texts(texts: List[str]) -> np.ndarray:
+        await asyncio.sleep(latencies.embed_ms / 1000)
+        if not texts:
+            return np.zeros((0, embedding_service.EMBEDDING_DIM), dtype=np.float32)
+        return np.stack([embedding_service._hash_embedding(text) for text in texts])
+
+    original_search = rag_service._search_local_index
+
+    async def search_local_index(*args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+        await asyncio.sleep(latencies.vector_ms / 1000)
+        return await original_search(*args, **kwargs)
+
+    async def generate_answer(question: str, sources: List[Dict[str, Any]], index: Any,
+                              history: str = "") -> AsyncIterator[str]:
+        await asyncio.sleep(latencies.llm_first_token_ms / 1000)
+        for i in range(latencies.answer_tokens):
+            if i:
+                await asyncio.sleep(latencies.llm_token_ms / 1000)
+            yield f"token{i} "
+
+    def kickoff_crew(topic: str, parameters: Optional[Dict[str, Any]] = None,
+                     on_log: Optional[Callable[[str], None]] = None) -> Tuple[Any, List[str]]:
+        logs = []
+        for step in ("pesquisa", "análise", "redação"):
+            time.sleep(latencies.crew_step_ms / 1000)
+            logs.append(f"INFO: passo '{step}' concluído.")
+            if on_log is not None:
+                on_log(logs[-1])
+        return {"summary": f"Resultado (stub) para '{topic}'."}, logs
+
+    with contextlib.ExitStack() as stack:
+        patch = lambda target, name, value: stack.enter_context(mock.patch.object(target, name, value))
+        patch(embedding_service, "embed_texts", embed_texts)
+        patch(rag_service, "_search_local_index", search_local_index)
+        patch(rag_service, "_generate_answer", generate_answer)
+        if not answer_cache:
+            patch(rag_service, "CACHE_MAX_BYTES", 0)
+        patch(crew_service, "kickoff_crew", kickoff_crew)
+        patch(guardrails_service, "PLACEHOLDER_LLM_SECONDS", latencies.llm_first_token_ms / 1000)
+        index = LocalVectorIndex.open(index_dir) if index_dir else None
+        patch(rag_service, "LOCAL_INDEX_DIR", index_dir)
+        patch(rag_service, "_local_index", index)
+        patch(rag_service, "_index_loading", False)
+        try:
+            yield
+        finally:
+            if index is not None:
+                index.close()
@@ -0,0 +1,134 @@
+# backend/tests/test_admission.py
+import asyncio
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app.main import app
+from app.services import admission, guardrails_service, rag_service
+
+
+@pytest.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_limiter_decreases_on_slow_calls_and_recovers():
+    limiter = admission.AdaptiveLimiter("test", max_limit=10, latency_target=0.05, backoff=0.5)
+    started = await limiter.acquire()
+    limiter.release(started - 1.0) # Chamada bem acima da latência alvo
+    assert limiter.limit == 5
+    # Chamadas que começaram antes da redução não reduzem de novo
+    limiter.in_flight += 1
+    limiter.release(started - 1.0)
+    assert limiter.limit == 5
+    for _ in range(10):
+        limiter.release(await limiter.acquire())
+    assert 5 < limiter.limit <= 10
+
+
+@pytest.mark.asyncio
+async def test_limiter_fails_fast_when_queue_is_full():
+    limiter = admission.AdaptiveLimiter("test", max_limit=1, latency_target=1.0, max_queue=1)
+    first = await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire(timeout=1.0))
+    await asyncio.sleep(0)
+    with pytest.raises(admission.OverloadedError):
+        await limiter.acquire(timeout=1.0) # Fila cheia: recusa sem esperar
+    limiter.release(first)
+    limiter.release(await waiter) # A vaga foi repassada ao primeiro da fila
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_waiters_outlast_queue_timeout_and_yield_to_interactive_calls():
+    limiter = admission.AdaptiveLimiter("test", max_limit=1, latency_target=1.0, max_queue=1)
+    first = await limiter.acquire()
+    bulk = asyncio.create_task(limiter.acquire(timeout=float("inf"), bulk=True))
+    await asyncio.sleep(0.05)
+    interactive = asyncio.create_task(limiter.acquire(timeout=1.0)) # Chegou depois, mas passa na frente
+    await asyncio.sleep(0)
+    limiter.release(first)
+    limiter.release(await interactive)
+    limiter.release(await bulk)
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["rejected"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_provider_calls_do_not_shrink_the_limit():
+    gate = admission.ProviderGate("test", admission.AdaptiveLimiter("test", max_limit=4, latency_target=0.01))
+
+    async def abandoned_call():
+        async with gate.call(tokens=1):
+            await asyncio.sleep(10)
+
+    calls = [asyncio.create_task(abandoned_call()) for _ in range(4)]
+    await asyncio.sleep(0.05) # Acima da latência alvo, mas quem desistiu foi o cliente
+    for call in calls:
+        call.cancel()
+    await asyncio.gather(*calls, return_exceptions=True)
+    assert gate.limiter.stats()["limit"] == 4 and gate.limiter.stats()["decreases"] == 0
+    assert gate.limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_additive_increase_wakes_every_waiter_that_now_fits():
+    limiter = admission.AdaptiveLimiter("test", max_limit=4, latency_target=1.0, max_queue=4)
+    limiter.limit = 1.0
+    first = await limiter.acquire()
+    waiters = [asyncio.create_task(limiter.acquire(timeout=1.0)) for _ in range(2)]
+    await asyncio.sleep(0)
+    limiter.limit = 2.5 # Próxima liberação rápida leva o limite a 2.9: duas vagas
+    limiter.release(first)
+    await asyncio.wait_for(asyncio.gather(*waiters), timeout=0.5) # Sem esperar outra liberação
+    assert limiter.stats()["in_flight"] == 2
+
+
+def test_token_bucket_wait_grows_with_deficit():
+    bucket = admission.TokenBucket(per_minute=60) # 1 token/s
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_provider_rate_limit_rejects_when_wait_exceeds_deadline():
+    gate = admission.ProviderGate("llm", admission.AdaptiveLimiter("llm", 4, 10.0), tpm=600)
+    async with gate.call(600, admission.Deadline(5)):
+        pass
+    with pytest.raises(admission.OverloadedError) as exc_info:
+        async with gate.call(100, admission.Deadline(1)): # 100 tokens a 10/s: 10s de espera
+            pass
+    assert exc_info.value.retry_after > 1
+
+
+def test_short_deadline_trims_reasks():
+    assert guardrails_service._affordable_reasks(3, admission.Deadline(2.5), llm_latency=1.0) == 2
+    assert guardrails_service._affordable_reasks(3, None, llm_latency=1.0) == 3
+
+
+@pytest.mark.asyncio
+async def test_saturated_route_returns_503_with_retry_after(async_client: AsyncClient, monkeypatch):
+    controller = admission.create_controller()
+    controller.routes["rag"] = admission.AdaptiveLimiter("rag", max_limit=1, latency_target=1.0, max_queue=0)
+    monkeypatch.setattr(admission, "get_controller", lambda: controller)
+    permit = await controller.admit("rag") # Ocupa a única vaga
+    response = await async_client.post("/api/v1/rag-query", json={"question": "teste"})
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    permit.release()
+    response = await async_client.post("/api/v1/rag-query", json={"question": "teste"})
+    assert response.status_code == 200
+    assert controller.routes["rag"].in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_deadline_returns_504(async_client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(rag_service, "CACHE_MAX_BYTES", 0)
+    response = await async_client.post("/api/v1/rag-query", json={"question": "teste de prazo"},
+                                       headers={"X-Request-Timeout": "0.01"})
+    assert response.status_code == 504
@@ -0,0 +1,51 @@
+# backend/tests/test_answer_cache.py
+import time
+
+import numpy as np
+
+from app.services.answer_cache import SemanticAnswerCache
+
+DIM = 8
+
+def _unit(*values):
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+# --- Testes do cache de respostas ---
+
+def test_exact_and_semantic_hits_are_counted():
+    cache = SemanticAnswerCache(DIM, similarity_threshold=0.9)
+    cache.put("O que é Supabase?", _unit(1, 0), "BaaS", [{"source": "a.md"}], corpus_version="v1", latency_seconds=0.5)
+
+    assert cache.get_exact("  o que é   SUPABASE? ", "v1") == ("BaaS", [{"source": "a.md"}])
+    assert cache.get_similar(_unit(1, 0.1), "v1") == ("BaaS", [{"source": "a.md"}])
+    assert cache.get_similar(_unit(0, 1), "v1") is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["saved_seconds"] == 1.0
+    assert stats["hit_ratio"] == round(2 / 3, 4)
+
+def test_corpus_version_change_invalidates_entries():
+    cache = SemanticAnswerCache(DIM)
+    cache.put("pergunta", _unit(1), "resposta", [], corpus_version="v1", latency_seconds=0.1)
+    assert cache.get_exact("pergunta", "v2") is None
+    assert cache.stats()["entries"] == 0
+
+def test_ttl_expiration(monkeypatch):
+    cache = SemanticAnswerCache(DIM, ttl_seconds=10)
+    cache.put("pergunta", _unit(1), "resposta", [], corpus_version=None, latency_seconds=0.1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get_exact("pergunta", None) is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_respects_byte_cap():
+    cache = SemanticAnswerCache(DIM, max_bytes=3 * (DIM * 4 + 256 + 20))
+    for i in range(100):
+        cache.put(f"pergunta {i}", _unit(1, i), f"r{i}", [], corpus_version=None, latency_seconds=0.1)
+        assert cache.stats()["bytes"] <= cache.max_bytes
+    assert cache.get_exact("pergunta 99", None) == ("r99", [])
+    assert cache.get_exact("pergunta 0", None) is None
+    assert cache.stats()["evictions"] > 0
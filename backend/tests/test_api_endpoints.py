@@ -1,4 +1,9 @@
 # backend/tests/test_api_endpoints.py
+import json
+import pathlib
+import re
+import warnings
+
 import pytest
 from httpx import AsyncClient, ASGITransport # <<< Importar ASGITransport
 # Importa a app FastAPI
@@ -91,4 +96,93 @@ async def test_generate_structured_placeholder_success(async_client: AsyncClient
 ])
 async def test_rag_query_invalid_input(async_client: AsyncClient, payload: dict):
     response = await async_client.post("/api/v1/rag-query", json=payload)
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_rag_cache_stats_after_repeated_query(async_client: AsyncClient):
+    payload = {"question": "Isto é um teste do cache?"}
+    for _ in range(2):
+        response = await async_client.post("/api/v1/rag-query", json=payload)
+        assert response.status_code == 200
+    response = await async_client.get("/api/v1/rag-cache/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["exact_hits"] >= 1
+    assert "hit_ratio" in data
+
+# --- Testes dos endpoints de streaming (NDJSON) ---
+
+@pytest.mark.asyncio
+async def test_rag_query_stream_emits_sources_then_tokens(async_client: AsyncClient):
+    payload = {"question": "O que é Supabase? (stream)"}
+    response = await async_client.post("/api/v1/rag-query/stream", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]["type"] == "sources"
+    assert events[-1]["type"] == "done"
+    tokens = [event["text"] for event in events if event["type"] == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == events[-1]["answer"] == "Supabase é um Backend como Serviço (BaaS) incrível!"
+
+@pytest.mark.asyncio
+async def test_generate_structured_stream_emits_fields(async_client: AsyncClient):
+    payload = {"prompt": "Extraia dados do usuário", "spec_name": "UserProfileSpec"}
+    response = await async_client.post("/api/v1/generate-structured/stream", json=payload)
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["name"] for event in events if event["type"] == "field"] == ["name", "age", "interests"]
+    assert events[-1] == {"type": "done", "validated_data": {"name": "Placeholder User", "age": 30, "interests": ["AI", "Cloud"]}}
+
+@pytest.mark.asyncio
+async def test_generate_structured_stream_validation_error(async_client: AsyncClient):
+    payload = {"prompt": "x", "spec_name": "InvalidSpecExample"}
+    response = await async_client.post("/api/v1/generate-structured/stream", json=payload)
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert len(events) == 1
+    assert events[0]["type"] == "error"
+    assert "InvalidSpecExample" in events[0]["error"]
+
+# --- Testes dos endpoints em lote (NDJSON) ---
+
+@pytest.mark.asyncio
+async def test_rag_query_batch_deduplicates_and_reports_each_item(async_client: AsyncClient):
+    items = [{"question": "O que é Supabase? (lote)"}, {"question": "teste em lote"}, {"question": "O que é Supabase? (lote)"}]
+    response = await async_client.post("/api/v1/rag-query/batch", json={"items": items})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0] == {"type": "accepted", "items": 3, "unique": 2}
+    results = {event["index"]: event for event in events if event["type"] == "result"}
+    assert sorted(results) == [0, 1, 2]
+    assert results[0]["answer"] == results[2]["answer"] == "Supabase é um Backend como Serviço (BaaS) incrível!"
+    assert results[2]["duplicate"] is True
+    assert events[-1] == {"type": "done", "items": 3, "unique": 2, "succeeded": 3, "failed": 0}
+
+@pytest.mark.asyncio
+async def test_generate_structured_batch_reports_partial_failures(async_client: AsyncClient):
+    items = [{"prompt": "Extraia dados do usuário", "spec_name": "UserProfileSpec"},
+             {"prompt": "x", "spec_name": "InvalidSpecExample"}]
+    response = await async_client.post("/api/v1/generate-structured/batch", json={"items": items})
+    assert response.status_code == 200
+    events = {event["index"]: event for event in map(json.loads, response.text.splitlines()) if "index" in event}
+    assert events[0]["type"] == "result" and events[0]["validated_data"]["name"] == "Placeholder User"
+    assert events[1]["type"] == "error" and events[1]["status_code"] == 422
+    assert "InvalidSpecExample" in events[1]["error"]
+
+@pytest.mark.asyncio
+async def test_batch_rejects_empty_item_list(async_client: AsyncClient):
+    response = await async_client.post("/api/v1/rag-query/batch", json={"items": []})
+    assert response.status_code == 422
+
+def test_status_constants_used_by_app_exist_in_installed_starlette():
+    # Os nomes em `starlette.status` mudam entre versões (ex: HTTP_422_UNPROCESSABLE_CONTENT não existe
+    # no starlette fixado em requirements.txt); com as versões fixadas, pega nomes que quebrariam em produção
+    from starlette import status
+    app_dir = pathlib.Path(__file__).resolve().parents[1] / "app"
+    names = {name for path in app_dir.rglob("*.py") for name in re.findall(r"status\.(HTTP_\w+)", path.read_text(encoding="utf-8"))}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore") # Nomes antigos seguem disponíveis (com aviso) nas versões novas
+        missing = sorted(name for name in names if not hasattr(status, name))
+    assert names and missing == []
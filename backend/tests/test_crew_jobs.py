@@ -0,0 +1,194 @@
+# backend/tests/test_crew_jobs.py
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app.main import app
+from app.services import crew_jobs, crew_service
+from app.services.crew_jobs import CrewJobManager
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(crew_jobs, "DB_PATH", path)
+    monkeypatch.setattr(crew_jobs, "_manager", None)
+    return path
+
+async def _wait_finished(manager: CrewJobManager, job_id: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while manager.get(job_id)["status"] not in crew_jobs.FINISHED_STATUSES:
+        assert time.monotonic() < deadline, "Job não terminou a tempo"
+        await asyncio.sleep(0.02)
+    return manager.get(job_id)
+
+# --- Testes do manager de jobs ---
+
+@pytest.mark.asyncio
+async def test_priority_and_per_tenant_limit(db_path, monkeypatch):
+    order, running, peak = [], {"a": 0}, {"a": 0}
+    lock = threading.Lock()
+
+    def fake_kickoff(topic, parameters=None, on_log=None):
+        with lock:
+            order.append(topic)
+            if topic.startswith("a"):
+                running["a"] += 1
+                peak["a"] = max(peak["a"], running["a"])
+        time.sleep(0.05)
+        with lock:
+            if topic.startswith("a"):
+                running["a"] -= 1
+        return {"topic": topic}, []
+
+    monkeypatch.setattr(crew_service, "kickoff_crew", fake_kickoff)
+    manager = CrewJobManager(db_path, max_workers=1, max_per_tenant=1)
+    jobs = [await manager.submit("baixa", priority=0), await manager.submit("alta", priority=10)]
+    await manager.start() # Jobs já enfileirados: o de maior prioridade roda primeiro
+    for job in jobs:
+        await _wait_finished(manager, job["job_id"])
+    assert order == ["alta", "baixa"]
+    await manager.shutdown()
+
+    manager = CrewJobManager(db_path, max_workers=3, max_per_tenant=1)
+    await manager.start()
+    jobs = [await manager.submit(f"a{i}", tenant_id="a") for i in range(3)]
+    for job in jobs:
+        await _wait_finished(manager, job["job_id"])
+    assert peak["a"] == 1
+    await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_interrupted_jobs_are_requeued_after_restart(db_path):
+    manager = CrewJobManager(db_path) # Sem start(): simula um processo que caiu com o job em execução
+    job = await manager.submit("Análise de mercado")
+    expired = time.time() - crew_jobs.LEASE_SECONDS - 1
+    manager.store.update(job["job_id"], status=crew_jobs.RUNNING, started_at=expired, heartbeat_at=expired)
+    manager.store.close()
+
+    manager = CrewJobManager(db_path)
+    await manager.start()
+    finished = await _wait_finished(manager, job["job_id"])
+    assert finished["status"] == crew_jobs.SUCCEEDED
+    assert finished["result"]["summary"] == "Resultado placeholder para a análise do tópico 'Análise de mercado'."
+    assert finished["logs"][-1] == "INFO: Crew para 'Análise de mercado' finalizada."
+    await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_job_runs_once_with_workers_sharing_the_database(db_path, monkeypatch):
+    runs = []
+
+    def fake_kickoff(topic, parameters=None, on_log=None):
+        runs.append(topic)
+        time.sleep(0.05)
+        return {"topic": topic}, []
+
+    monkeypatch.setattr(crew_service, "kickoff_crew", fake_kickoff)
+    job = await CrewJobManager(db_path).submit("Compartilhado")
+    alive = await CrewJobManager(db_path).submit("Em execução em outro processo")
+    CrewJobManager(db_path).store.claim(alive["job_id"], time.time()) # Heartbeat recente: não é órfão
+
+    managers = [CrewJobManager(db_path), CrewJobManager(db_path)] # Dois processos sobre o mesmo banco
+    for manager in managers:
+        await manager.start()
+    finished = await _wait_finished(managers[0], job["job_id"])
+    await asyncio.sleep(0.1)
+    assert finished["status"] == crew_jobs.SUCCEEDED
+    assert runs == ["Compartilhado"]
+    assert managers[0].get(alive["job_id"])["status"] == crew_jobs.RUNNING
+    for manager in managers:
+        await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_concurrent_log_streams_receive_every_line(db_path, monkeypatch):
+    def fake_kickoff(topic, parameters=None, on_log=None):
+        for i in range(5):
+            on_log(f"linha {i}")
+            time.sleep(0.01)
+        return {"topic": topic}, []
+
+    async def follow(job_id):
+        return [event async for event in manager.stream_logs(job_id)]
+
+    monkeypatch.setattr(crew_service, "kickoff_crew", fake_kickoff)
+    manager = CrewJobManager(db_path)
+    await manager.start()
+    job = await manager.submit("Logs")
+    streams = await asyncio.wait_for(asyncio.gather(*(follow(job["job_id"]) for _ in range(3))), timeout=5)
+    for events in streams:
+        assert [event["line"] for event in events[:-1]] == [f"linha {i}" for i in range(5)]
+        assert events[-1]["type"] == "done"
+    assert manager._log_versions == {} # Nada fica para trás depois que o job termina
+    await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_worker_survives_store_errors_and_runs_next_job(db_path, monkeypatch):
+    monkeypatch.setattr(crew_service, "kickoff_crew", lambda topic, parameters=None, on_log=None: ({"topic": topic}, []))
+    manager = CrewJobManager(db_path, max_workers=1)
+    original_update, failures = manager.store.update, []
+
+    def flaky_update(job_id, **fields):
+        if not failures:
+            failures.append(job_id)
+            raise sqlite3.OperationalError("database is locked")
+        original_update(job_id, **fields)
+
+    monkeypatch.setattr(manager.store, "update", flaky_update)
+    await manager.start()
+    first = await manager.submit("Primeiro")
+    second = await manager.submit("Segundo")
+    assert (await _wait_finished(manager, first["job_id"]))["status"] == crew_jobs.FAILED # Marcado no tratamento do worker
+    assert (await _wait_finished(manager, second["job_id"]))["status"] == crew_jobs.SUCCEEDED
+    await manager.shutdown()
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_running_crews_and_then_drops_their_logs(db_path, monkeypatch):
+    release, errors = threading.Event(), []
+
+    def slow_kickoff(topic, parameters=None, on_log=None):
+        on_log("antes")
+        release.wait(5)
+        try:
+            on_log("depois do shutdown")
+        except Exception as e:
+            errors.append(e)
+        return {"topic": topic}, []
+
+    monkeypatch.setattr(crew_service, "kickoff_crew", slow_kickoff)
+    monkeypatch.setattr(crew_jobs, "SHUTDOWN_GRACE_SECONDS", 0.1)
+    manager = CrewJobManager(db_path)
+    await manager.start()
+    job = await manager.submit("Lenta")
+    while not manager.store.get(job["job_id"])["logs"]:
+        await asyncio.sleep(0.01)
+    await manager.shutdown() # A crew passa do prazo de espera
+    release.set()
+    await asyncio.sleep(0.1)
+    assert errors == []
+
+# --- Testes dos endpoints de jobs ---
+
+@pytest.mark.asyncio
+async def test_submit_and_follow_crew_job(db_path):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+        response = await client.post("/api/v1/crew-jobs", json={"topic": "Tendências", "priority": 5})
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "queued"
+
+        response = await client.get(f"/api/v1/crew-jobs/{job['job_id']}/logs")
+        assert response.status_code == 200
+        events = [line for line in response.text.splitlines()]
+        assert '"type": "done"' in events[-1]
+        assert sum('"type": "log"' in line for line in events) == 4
+
+        response = await client.get(f"/api/v1/crew-jobs/{job['job_id']}")
+        assert response.json()["status"] == "succeeded"
+
+        response = await client.get("/api/v1/crew-jobs/inexistente")
+        assert response.status_code == 404
+    await crew_jobs.shutdown_job_manager()
@@ -0,0 +1,56 @@
+# backend/tests/test_embedding_service.py
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import embedding_service
+from app.services.embedding_service import EmbeddingBatcher
+
+@pytest.fixture
+def upstream_calls(monkeypatch):
+    """Registra cada chamada ao provedor de embeddings (embed_texts)."""
+    calls = []
+    original = embedding_service.embed_texts
+
+    async def recording_embed(texts):
+        calls.append(list(texts))
+        return await original(texts)
+
+    monkeypatch.setattr(embedding_service, "embed_texts", recording_embed)
+    return calls
+
+# --- Testes do micro-batcher ---
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_coalesced_and_deduplicated(upstream_calls):
+    batcher = EmbeddingBatcher(max_batch=64, max_wait_ms=20)
+    questions = [f"pergunta {i % 5}" for i in range(20)]
+    results = await asyncio.gather(*(batcher.embed([q]) for q in questions))
+
+    assert len(upstream_calls) == 1
+    assert sorted(upstream_calls[0]) == sorted(set(questions))
+    for question, result in zip(questions, results):
+        np.testing.assert_allclose(result[0], embedding_service._hash_embedding(question))
+    stats = batcher.stats()
+    assert stats["deduplicated"] == 15
+    assert stats["max_queue_depth"] == 5
+    assert stats["queue_depth"] == 0
+
+@pytest.mark.asyncio
+async def test_full_batches_are_sent_without_waiting(upstream_calls):
+    batcher = EmbeddingBatcher(max_batch=4, max_wait_ms=10_000)
+    result = await asyncio.wait_for(batcher.embed([f"texto {i}" for i in range(8)]), timeout=1)
+    assert result.shape == (8, embedding_service.EMBEDDING_DIM)
+    assert [len(call) for call in upstream_calls] == [4, 4]
+
+@pytest.mark.asyncio
+async def test_upstream_error_is_propagated_to_all_waiters(monkeypatch):
+    async def failing_embed(texts):
+        raise RuntimeError("provedor indisponível")
+
+    monkeypatch.setattr(embedding_service, "embed_texts", failing_embed)
+    batcher = EmbeddingBatcher(max_batch=8, max_wait_ms=5)
+    results = await asyncio.gather(batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert batcher.stats()["errors"] == 1
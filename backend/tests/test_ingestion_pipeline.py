@@ -0,0 +1,191 @@
+# backend/tests/test_ingestion_pipeline.py
+import pytest
+
+from app.services import embedding_service, ingestion_pipeline
+from app.services.embedding_cache import EmbeddingCache
+from app.services.ingestion_pipeline import (IngestionCheckpoint, IngestionManifest, IngestionPipeline, LocalIndexSink,
+                                             split_text)
+from app.services.vector_index import LocalVectorIndex
+
+DIM = embedding_service.EMBEDDING_DIM
+
+def _documents(count: int):
+    # Documentos de tamanhos variados (alguns vazios) para gerar lotes que cruzam documentos
+    return [{"content": f"documento {i} " * (i % 7) * 40, "metadata": {"source": f"doc_{i}.md"}} for i in range(count)]
+
+def _pipeline(tmp_path, **kwargs):
+    sink = LocalIndexSink(str(tmp_path / "index"), DIM)
+    checkpoint = IngestionCheckpoint(str(tmp_path / "checkpoint.json"))
+    options = dict(chunk_size=200, chunk_overlap=20, chunk_workers=0, embed_token_budget=300, queue_size=2, checkpoint_every=1)
+    options.update(kwargs)
+    return IngestionPipeline([sink], checkpoint, **options), checkpoint
+
+def _expected_chunks(documents):
+    return [chunk for doc in documents for chunk in split_text(doc["content"], 200, 20)]
+
+# --- Testes do pipeline de ingestão ---
+
+@pytest.mark.asyncio
+async def test_pipeline_indexes_all_chunks_in_order_and_reports_stages(tmp_path):
+    documents = _documents(30)
+    pipeline, checkpoint = _pipeline(tmp_path, chunk_workers=2)
+    report = await pipeline.run(documents)
+
+    expected = _expected_chunks(documents)
+    assert report["indexed_count"] == len(expected)
+    assert report["documents"] == 30
+    assert set(report["stages"]) == {"read", "chunk", "embed", "store"}
+    assert report["stages"]["store"]["items_out"] == len(expected)
+    assert checkpoint.load() is None # Removido ao concluir
+
+    index = LocalVectorIndex.open(str(tmp_path / "index"))
+    assert [index.row(i)["content"] for i in range(len(index))] == expected
+    assert [index.row(i)["id"] for i in range(len(index))] == list(range(len(expected)))
+
+@pytest.mark.asyncio
+async def test_pipeline_resumes_from_checkpoint_after_failure(tmp_path, monkeypatch):
+    documents = _documents(40)
+    original_embed = embedding_service.embed_texts
+    calls = {"count": 0}
+
+    async def flaky_embed(texts):
+        calls["count"] += 1
+        if calls["count"] == 6:
+            raise RuntimeError("Falha simulada no provedor de embeddings")
+        return await original_embed(texts)
+
+    monkeypatch.setattr(embedding_service, "embed_texts", flaky_embed)
+    pipeline, checkpoint = _pipeline(tmp_path)
+    with pytest.raises(RuntimeError):
+        await pipeline.run(documents)
+    state = checkpoint.load()
+    assert state is not None and state["next_seq"] > 0
+
+    pipeline, checkpoint = _pipeline(tmp_path)
+    report = await pipeline.run(documents)
+    assert report["stages"]["read"]["items_out"] == 40 - state["next_seq"] # Documentos já gravados são pulados
+
+    expected = _expected_chunks(documents)
+    index = LocalVectorIndex.open(str(tmp_path / "index"))
+    assert report["indexed_count"] == len(index) == len(expected)
+    assert [index.row(i)["content"] for i in range(len(index))] == expected
+
+# --- Testes da reindexação incremental ---
+
+class _RecordingSink:
+    """Destino incremental (como o PostgresSink) que só registra o que recebe."""
+    name = "recording"
+    full_rewrite = False
+
+    def __init__(self):
+        self.rows, self.deltas = [], []
+
+    async def open(self, resume_state, next_seq): pass
+    async def write(self, rows, embeddings): self.rows.extend(row for row in rows if not row["existing"])
+    async def state(self): return {}
+    async def apply_delta(self, replaced, removed): self.deltas.append((replaced, removed))
+    async def finalize(self): pass
+    async def close(self): pass
+
+def _incremental_pipeline(tmp_path, sinks, **kwargs):
+    return IngestionPipeline(
+        sinks, IngestionCheckpoint(str(tmp_path / "checkpoint.json")),
+        manifest=IngestionManifest(str(tmp_path / "manifest.sqlite")),
+        embedding_cache=EmbeddingCache(str(tmp_path / "embeddings.sqlite")),
+        chunk_size=200, chunk_overlap=20, chunk_workers=0, embed_token_budget=300, **kwargs,
+    )
+
+def _sources(count: int):
+    return [{"content": " ".join(f"fonte {i} frase {j}." for j in range(30)), "metadata": {"source": f"f{i}.md"}}
+            for i in range(count)]
+
+@pytest.mark.asyncio
+async def test_token_budgeted_batches_reach_the_provider_unsplit(tmp_path, monkeypatch):
+    calls = []
+    original_embed = embedding_service.embed_texts
+
+    async def recording_embed(texts):
+        calls.append(len(texts))
+        return await original_embed(texts)
+
+    monkeypatch.setattr(embedding_service, "embed_texts", recording_embed)
+    # Mais textos que o teto do micro-batcher das consultas (EMBED_MAX_BATCH)
+    documents = [{"content": f"texto curto {i}", "metadata": {"source": f"doc_{i}.md"}} for i in range(100)]
+    pipeline, _ = _pipeline(tmp_path, embed_token_budget=10_000)
+    await pipeline.run(documents)
+    assert calls == [100]
+
+@pytest.mark.asyncio
+async def test_reindex_embeds_only_changed_chunks_and_rewrites_local_index(tmp_path):
+    documents = _sources(5)
+    first = await _incremental_pipeline(tmp_path, [LocalIndexSink(str(tmp_path / "index"), DIM)]).run(documents)
+    assert first["delta"]["documents_new"] == 5
+    assert first["delta"]["embeddings_computed"] == len(_expected_chunks(documents))
+
+    documents[2] = {**documents[2], "content": documents[2]["content"] + " Parágrafo novo no fim."}
+    plan = await _incremental_pipeline(tmp_path, [LocalIndexSink(str(tmp_path / "index"), DIM)]).plan(documents)
+    report = await _incremental_pipeline(tmp_path, [LocalIndexSink(str(tmp_path / "index"), DIM)]).run(documents)
+    assert report["delta"]["documents_changed"] == 1 and report["delta"]["documents_unchanged"] == 4
+    assert 0 < report["delta"]["embeddings_computed"] <= 2 # Só os chunks do fim do documento alterado
+    assert plan["embeddings_needed"] == report["delta"]["embeddings_computed"]
+    assert plan["delta"]["chunks_orphaned"] == report["delta"]["chunks_orphaned"] >= 1
+
+    # O índice local é reescrito por inteiro, com os embeddings do cache
+    index = LocalVectorIndex.open(str(tmp_path / "index"))
+    assert [index.row(i)["content"] for i in range(len(index))] == _expected_chunks(documents)
+    index.close()
+
+@pytest.mark.asyncio
+async def test_incremental_sink_receives_only_delta_and_orphans(tmp_path):
+    documents = _sources(4)
+    sink = _RecordingSink()
+    await _incremental_pipeline(tmp_path, [sink]).run(documents)
+    assert len(sink.rows) == len(_expected_chunks(documents))
+
+    changed = documents[1]["content"].replace("frase 29.", "frase vinte e nove.")
+    documents = [documents[0], {**documents[1], "content": changed}, documents[3]] # f2.md removido
+    sink = _RecordingSink()
+    plan = await _incremental_pipeline(tmp_path, [sink]).plan(documents)
+    report = await _incremental_pipeline(tmp_path, [sink]).run(documents)
+    assert report["stages"]["read"]["items_out"] == 1 # Documentos inalterados nem são chunkados
+    assert {row["source_id"] for row in sink.rows} == {"f1.md"}
+    assert plan["embeddings_needed"] == report["delta"]["embeddings_computed"] == len(sink.rows)
+    (replaced, removed), = sink.deltas
+    assert removed == ["f2.md"]
+    assert set(replaced) == {"f1.md"}
+    assert len(replaced["f1.md"]) == len(split_text(changed, 200, 20)) - len(sink.rows) # Chunks mantidos
+
+@pytest.mark.asyncio
+async def test_manifest_delta_is_paged_and_kept_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingestion_pipeline, "_MANIFEST_PAGE", 2)
+    documents = _sources(5)
+    await _incremental_pipeline(tmp_path, [_RecordingSink()]).run(documents)
+
+    documents = [{**doc, "content": doc["content"] + " Atualizado."} for doc in documents[:3]] # f3.md e f4.md removidos
+    sink = _RecordingSink()
+    await _incremental_pipeline(tmp_path, [sink]).run(documents)
+    assert all(len(replaced) + len(removed) <= 2 for replaced, removed in sink.deltas)
+    assert sorted(key for replaced, _ in sink.deltas for key in replaced) == ["f0.md", "f1.md", "f2.md"]
+    assert sorted(key for _, removed in sink.deltas for key in removed) == ["f3.md", "f4.md"]
+
+    # Sem prune, as origens ausentes continuam no manifesto
+    await _incremental_pipeline(tmp_path, [_RecordingSink()], prune=False).run(documents[:1])
+    manifest = IngestionManifest(str(tmp_path / "manifest.sqlite"))
+    manifest.begin(_incremental_pipeline(tmp_path, []).config)
+    assert manifest.previous("f2.md") is not None and manifest.previous("f3.md") is None
+    manifest.close()
+
+@pytest.mark.asyncio
+async def test_documents_sharing_a_source_are_not_rewritten_on_reindex(tmp_path):
+    # Uma página por documento, todas com a mesma origem e sem source_id
+    pages = [{"content": " ".join(f"página {p} frase {j}." for j in range(30)), "metadata": {"source": "manual.pdf"}}
+             for p in range(3)]
+    first = _RecordingSink()
+    await _incremental_pipeline(tmp_path, [first]).run(pages)
+    assert {row["source_id"] for row in first.rows} == {"manual.pdf", "manual.pdf#2", "manual.pdf#3"}
+
+    sink = _RecordingSink()
+    report = await _incremental_pipeline(tmp_path, [sink]).run(pages)
+    assert sink.rows == []
+    assert report["delta"]["documents_unchanged"] == 3 and report["delta"]["documents_changed"] == 0
+    assert sink.deltas == [({}, [])]
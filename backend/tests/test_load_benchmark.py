@@ -0,0 +1,24 @@
+# backend/tests/test_load_benchmark.py
+from benchmarks import load_test
+from benchmarks.stubs import StubLatencies, build_stub_index
+
+def test_load_test_runs_offline_against_stubs(tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_stub_index(index_dir, corpus_size=50)
+    latencies = StubLatencies(embed_ms=1, vector_ms=1, llm_first_token_ms=1, llm_token_ms=0, answer_tokens=3, crew_step_ms=1)
+    for scenario in load_test.SCENARIOS:
+        result = load_test.run_scenario(scenario, requests=12, concurrency=4, workers=1,
+                                        latencies=latencies, index_dir=index_dir, corpus_size=50)
+        assert result["requests"] == 12
+        assert result["errors"] == 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+        assert result["throughput_rps"] > 0
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = {"scenarios": {"rag-query": {"throughput_rps": 100.0, "p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0}}}
+    within = {"rag-query": {"errors": 0, "throughput_rps": 90.0, "p50_ms": 11.0, "p95_ms": 22.0, "p99_ms": 33.0}}
+    assert load_test.compare(within, baseline, tolerance=0.25) == []
+
+    slower = {"rag-query": {"errors": 1, "throughput_rps": 50.0, "p50_ms": 10.0, "p95_ms": 40.0, "p99_ms": 30.0}}
+    regressions = load_test.compare(slower, baseline, tolerance=0.25)
+    assert len(regressions) == 3 # erros, throughput e p95
@@ -0,0 +1,226 @@
+# backend/tests/test_rag_service.py
+import numpy as np
+import pytest
+
+from app.services import rag_service
+from app.services.vector_index import LocalVectorIndex, build_index
+
+# --- Fixture: rag_service apontando para um índice local temporário ---
+@pytest.fixture
+def local_index_dir(tmp_path, monkeypatch):
+    index_dir = str(tmp_path / "index")
+    monkeypatch.setattr(rag_service, "LOCAL_INDEX_DIR", index_dir)
+    monkeypatch.setattr(rag_service, "_local_index", None)
+    monkeypatch.setattr(rag_service, "_index_loading", False)
+    monkeypatch.setattr(rag_service, "_index_initialized", False)
+    monkeypatch.setattr(rag_service, "_index_pointer", None)
+    monkeypatch.setattr(rag_service, "_index_checked_at", 0.0)
+    return index_dir
+
+# --- Testes do índice vetorial local ---
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_vector_index_search_returns_nearest_rows(tmp_path, quantization):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(5000, 32)).astype(np.float32)
+    rows = [{"id": i, "content": f"chunk {i}", "metadata": {}} for i in range(len(embeddings))]
+    build_index(str(tmp_path), rows, embeddings, quantization=quantization)
+
+    index = LocalVectorIndex.open(str(tmp_path))
+    assert index.nlist > 0 # Corpus grande o suficiente para usar IVF
+    hits = index.search(embeddings[42], k=3, nprobe=index.nlist)
+    assert hits[0][0] == 42
+    assert index.row(hits[0][0])["content"] == "chunk 42"
+    index.close()
+
+@pytest.mark.parametrize("quantization", ["float32", "int8"])
+def test_vector_index_search_many_matches_single_searches(tmp_path, quantization):
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(5000, 32)).astype(np.float32)
+    rows = [{"id": i, "content": f"chunk {i}", "metadata": {}} for i in range(len(embeddings))]
+    build_index(str(tmp_path), rows, embeddings, quantization=quantization)
+
+    index = LocalVectorIndex.open(str(tmp_path))
+    queries = rng.normal(size=(6, 32)).astype(np.float32)
+    for nprobe in (4, index.nlist): # IVF e busca exata
+        batch = index.search_many(queries, k=5, nprobe=nprobe)
+        for query, hits in zip(queries, batch):
+            expected = index.search(query, k=5, nprobe=nprobe)
+            assert [p for p, _ in hits] == [p for p, _ in expected]
+            assert [s for _, s in hits] == pytest.approx([s for _, s in expected], abs=1e-5)
+    index.close()
+
+# --- Testes do rag_service com índice local ---
+
+@pytest.mark.asyncio
+async def test_query_raises_not_ready_before_indexing(local_index_dir):
+    await rag_service.initialize_vector_store()
+    with pytest.raises(rag_service.VectorStoreNotReadyError):
+        await rag_service.query_knowledge_base("O que é Supabase?")
+
+@pytest.mark.asyncio
+async def test_query_raises_not_ready_while_loading(local_index_dir, monkeypatch):
+    monkeypatch.setattr(rag_service, "_index_loading", True)
+    with pytest.raises(rag_service.VectorStoreNotReadyError):
+        await rag_service.query_knowledge_base("O que é Supabase?")
+
+@pytest.mark.asyncio
+async def test_load_and_index_then_query_local_index(local_index_dir):
+    result = await rag_service.load_and_index_data()
+    assert result["status"] == "success"
+    assert result["indexed_count"] == 3
+
+    answer, sources = await rag_service.query_knowledge_base("O que é Supabase?")
+    assert sources[0]["source"] == "docs/supabase_intro.md"
+    assert "Supabase" in answer
+
+    # Um novo processo (worker) abre a mesma versão publicada em disco
+    await rag_service.initialize_vector_store()
+    _, sources = await rag_service.query_knowledge_base("busca por similaridade com pgvector")
+    assert sources[0]["source"] == "docs/pgvector.md"
+
+@pytest.mark.asyncio
+async def test_worker_reopens_index_published_by_another_process(local_index_dir, monkeypatch):
+    monkeypatch.setattr(rag_service, "INDEX_CHECK_SECONDS", 0.0)
+    await rag_service.load_and_index_data()
+    old_index = rag_service._local_index
+
+    # Outro worker publica uma nova versão direto no disco; esta consulta ainda usa a versão antiga
+    with old_index.in_use():
+        rows = [{"id": 0, "content": "Corpus novo publicado por outro worker.", "metadata": {"source": "docs/novo.md"}}]
+        build_index(local_index_dir, rows, np.ones((1, rag_service.embedding_service.EMBEDDING_DIM), np.float32))
+        _, sources = await rag_service.query_knowledge_base("O que mudou?")
+        assert sources[0]["source"] == "docs/novo.md"
+        assert rag_service._local_index.version != old_index.version
+        assert not old_index._rows_handle.closed # Aposentado, mas ainda em uso
+    assert old_index._rows_handle.closed
+
+@pytest.mark.asyncio
+async def test_cached_answer_is_dropped_when_another_worker_reindexes(local_index_dir, monkeypatch):
+    monkeypatch.setattr(rag_service, "INDEX_CHECK_SECONDS", 0.0)
+    await rag_service.load_and_index_data()
+    first, _ = await rag_service.query_knowledge_base("O que é Supabase?")
+    cached, _ = await rag_service.query_knowledge_base("O que é Supabase?")
+    assert cached == first
+
+    rows = [{"id": 0, "content": "Supabase agora tem uma descrição nova.", "metadata": {"source": "docs/novo.md"}}]
+    build_index(local_index_dir, rows, np.ones((1, rag_service.embedding_service.EMBEDDING_DIM), np.float32))
+    answer, sources = await rag_service.query_knowledge_base("O que é Supabase?")
+    assert sources[0]["source"] == "docs/novo.md"
+    assert "descrição nova" in answer
+
+@pytest.mark.asyncio
+async def test_closing_stream_early_stops_generation_without_caching():
+    events = rag_service.stream_knowledge_base("Pergunta interrompida pelo cliente")
+    assert (await anext(events))["type"] == "sources"
+    assert (await anext(events))["type"] == "token"
+    await events.aclose() # Equivalente ao cliente desconectar no meio do stream
+
+    misses = rag_service.get_cache_stats()["misses"]
+    async for event in rag_service.stream_knowledge_base("Pergunta interrompida pelo cliente"):
+        assert event.get("cached") is not True
+    assert rag_service.get_cache_stats()["misses"] == misses + 1
+
+# --- Testes da recuperação híbrida (BM25 + vetorial) ---
+
+def test_lexical_index_finds_exact_identifiers_and_filters_metadata(tmp_path):
+    rows = [
+        {"id": 0, "content": "Manual do sensor XPT-1000 e da bomba XPT-2000.", "metadata": {"source": "a.md", "lang": "pt"}},
+        {"id": 1, "content": "Guia de instalação do sensor XPT-2000.", "metadata": {"source": "b.md", "lang": "pt"}},
+        {"id": 2, "content": "Installation guide for sensor XPT-2000.", "metadata": {"source": "c.md", "lang": "en"}},
+    ]
+    embeddings = np.random.default_rng(0).normal(size=(len(rows), 8)).astype(np.float32)
+    build_index(str(tmp_path), rows, embeddings)
+    index = LocalVectorIndex.open(str(tmp_path))
+
+    assert index.lexical.search("qual a vazão da XPT-1000?")[0][0] == 0
+    allowed = index.lexical.filter_rows({"lang": "en"})
+    assert allowed.tolist() == [2]
+    assert [p for p, _ in index.lexical.search("sensor XPT-2000", allowed=allowed)] == [2]
+    assert [p for p, _ in index.search(embeddings[0], k=3, allowed=allowed)] == [2]
+    assert index.lexical.filter_rows({"source": ["a.md", "c.md"], "lang": "pt"}).tolist() == [0]
+    index.close()
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = rag_service._reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]])
+    assert [position for position, _ in fused][:2] == [1, 3]
+
+def test_hybrid_search_decodes_only_rows_it_can_return(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_service, "_reranker", False) # Sem cross-encoder
+    embeddings = np.random.default_rng(2).normal(size=(200, 8)).astype(np.float32)
+    rows = [{"id": i, "content": f"chunk número {i}", "metadata": {}} for i in range(len(embeddings))]
+    build_index(str(tmp_path), rows, embeddings)
+    index = LocalVectorIndex.open(str(tmp_path))
+    decoded = []
+    row = index.row
+    monkeypatch.setattr(index, "row", lambda position: decoded.append(position) or row(position))
+
+    hits = rag_service._hybrid_search(index, "chunk número 7", embeddings[7], 3, None)
+    assert len(hits) == 3 and len(decoded) == 3
+    index.close()
+
+@pytest.mark.asyncio
+async def test_query_with_metadata_filters(local_index_dir):
+    await rag_service.load_and_index_data()
+    _, sources = await rag_service.query_knowledge_base("O que é Supabase?", filters={"source": "docs/fastapi.md"})
+    assert [source["source"] for source in sources] == ["docs/fastapi.md"]
+
+# --- Testes de conversas (session_id) ---
+
+@pytest.mark.asyncio
+async def test_follow_up_in_session_reuses_retrieval_and_sends_history(local_index_dir, monkeypatch):
+    from app import telemetry
+    from app.services import session_store
+    monkeypatch.setattr(session_store, "_store", session_store.SessionStore())
+    await rag_service.load_and_index_data()
+    histories = []
+    generate_answer = rag_service._generate_answer
+
+    async def spy(question, sources, index, history=""):
+        histories.append(history)
+        async for token in generate_answer(question, sources, index, history):
+            yield token
+    monkeypatch.setattr(rag_service, "_generate_answer", spy)
+
+    _, first_sources = await rag_service.query_knowledge_base("O que é Supabase?", session_id="conversa")
+    skips = telemetry.RAG_SESSION_RETRIEVALS.value(mode="skip")
+    _, sources = await rag_service.query_knowledge_base("O que é Supabase?", session_id="conversa")
+    assert sources == first_sources
+    assert telemetry.RAG_SESSION_RETRIEVALS.value(mode="skip") == skips + 1
+    assert histories[0] == "" and "Usuário: O que é Supabase?" in histories[1]
+
+    # Sem session_id, nada é lembrado entre as consultas (sem cache, para a geração rodar de novo)
+    monkeypatch.setattr(rag_service, "CACHE_MAX_BYTES", 0)
+    await rag_service.query_knowledge_base("O que é Supabase?")
+    assert histories[2] == ""
+
+    # Pergunta diferente, mas próxima: busca só entre os chunks já vistos na sessão
+    monkeypatch.setattr(rag_service, "RAG_SESSION_SKIP_THRESHOLD", 2.0)
+    monkeypatch.setattr(rag_service, "RAG_SESSION_NARROW_THRESHOLD", -1.0)
+    seen = set((await session_store.get_session_store().get("conversa")).chunk_ids)
+    _, sources = await rag_service.query_knowledge_base("busca por similaridade com pgvector", session_id="conversa")
+    assert {source["id"] for source in sources} <= seen
+
+# --- Testes de consultas em lote ---
+
+@pytest.mark.asyncio
+async def test_batch_shares_embedding_and_matches_single_queries(local_index_dir, monkeypatch):
+    monkeypatch.setattr(rag_service, "CACHE_MAX_BYTES", 0)
+    await rag_service.load_and_index_data()
+    calls = []
+    embed_coalesced = rag_service.embedding_service.embed_coalesced
+
+    async def counting_embed(texts):
+        calls.append(len(texts))
+        return await embed_coalesced(texts)
+    monkeypatch.setattr(rag_service.embedding_service, "embed_coalesced", counting_embed)
+
+    queries = [{"question": "O que é Supabase?"}, {"question": "busca por similaridade com pgvector"},
+               {"question": "framework Python", "filters": {"source": "docs/fastapi.md"}}]
+    events = [event async for event in rag_service.stream_batch(queries)]
+    assert calls == [3] # Uma única chamada de embedding para o lote
+    results = {event["index"]: event for event in events if event["type"] == "result"}
+    for i, query in enumerate(queries):
+        _, sources = await rag_service.query_knowledge_base(query["question"], query.get("filters"))
+        assert [source["id"] for source in results[i]["sources"]] == [source["id"] for source in sources]
+    assert events[-1]["succeeded"] == 3
@@ -0,0 +1,109 @@
+# backend/tests/test_resources.py
+import asyncio
+import json
+
+import httpx
+import numpy as np
+import pytest
+
+from app.services import rag_service, resources
+
+# --- Stand-in em memória para o pool do asyncpg (public.documents sem Postgres) ---
+
+class InMemoryConnection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    async def fetch(self, query, embedding, k, metadata_filter):
+        self.queries.append(query)
+        query_vector = np.array(json.loads(embedding), dtype=np.float32)
+        wanted = json.loads(metadata_filter) if metadata_filter else {}
+        scored = []
+        for i, doc in enumerate(self.documents):
+            if all(doc["metadata"].get(key) == value for key, value in wanted.items()):
+                vector = np.asarray(doc["embedding"], dtype=np.float32)
+                score = float(vector @ query_vector / (np.linalg.norm(vector) * np.linalg.norm(query_vector) or 1.0))
+                scored.append({"id": i, "content": doc["content"], "metadata": json.dumps(doc["metadata"]), "score": score})
+        return sorted(scored, key=lambda row: row["score"], reverse=True)[:k]
+
+    async def fetchval(self, query):
+        return 1
+
+class InMemoryPool:
+    def __init__(self, documents, max_size=2):
+        self.max_size = max_size
+        self._idle = [InMemoryConnection(documents) for _ in range(max_size)]
+        self._available = asyncio.Semaphore(max_size)
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self._available.acquire(), timeout)
+        return self._idle.pop()
+
+    async def release(self, conn):
+        self._idle.append(conn)
+        self._available.release()
+
+    def get_size(self): return self.max_size
+    def get_idle_size(self): return len(self._idle)
+    def get_min_size(self): return self.max_size
+    def get_max_size(self): return self.max_size
+    async def close(self): pass
+
+DOCUMENTS = [
+    {"content": "Supabase usa Postgres.", "metadata": {"source": "a.md", "lang": "pt"}, "embedding": [1.0, 0.0]},
+    {"content": "pgvector busca vetores.", "metadata": {"source": "b.md", "lang": "pt"}, "embedding": [0.0, 1.0]},
+    {"content": "FastAPI is async.", "metadata": {"source": "c.md", "lang": "en"}, "embedding": [0.7, 0.7]},
+]
+
+# --- Testes ---
+
+@pytest.mark.asyncio
+async def test_similarity_search_pushes_metadata_filter_down():
+    db = resources.DatabasePool(InMemoryPool(DOCUMENTS))
+    rows = await db.similarity_search([1.0, 0.0], k=2)
+    assert [row["metadata"]["source"] for row in rows] == ["a.md", "c.md"]
+    rows = await db.similarity_search([1.0, 0.0], k=2, metadata_filter={"lang": "en"})
+    assert [row["content"] for row in rows] == ["FastAPI is async."]
+    assert (await db.health())["ok"]
+    assert db.stats()["acquires"] == 3
+
+@pytest.mark.asyncio
+async def test_pool_saturation_metrics_and_acquire_timeout():
+    db = resources.DatabasePool(InMemoryPool(DOCUMENTS, max_size=1), acquire_timeout=0.05)
+    async with db.acquire():
+        assert db.stats()["saturation"] == 1.0
+        with pytest.raises(resources.PoolExhaustedError):
+            async with db.acquire():
+                pass
+    stats = db.stats()
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 0 and stats["waiting"] == 0
+    assert stats["max_waiting"] == 1
+
+@pytest.mark.asyncio
+async def test_http_client_warm_up_and_stats():
+    seen = []
+    transport = httpx.MockTransport(lambda request: seen.append(request.method) or httpx.Response(200))
+    res = await resources.create_resources(dsn="", warmup_urls=["https://llm.example/v1/models"], http_transport=transport)
+    try:
+        assert seen == ["HEAD"]
+        await res.http.post("https://llm.example/v1/embeddings", json={"input": ["x"]})
+        stats = res.stats()
+        assert stats["database"] is None
+        assert stats["http"]["requests"] == 2 and stats["http"]["in_flight"] == 0
+        assert (await res.health())["ok"]
+    finally:
+        await res.close()
+    assert not (await res.health())["ok"]
+
+@pytest.mark.asyncio
+async def test_rag_retrieve_uses_postgres_pool_without_local_index(monkeypatch):
+    db = resources.DatabasePool(InMemoryPool(DOCUMENTS))
+
+    async def get_db_pool():
+        return db
+
+    monkeypatch.setattr(resources, "get_db_pool", get_db_pool)
+    sources = await rag_service._retrieve("vetores", [0.0, 1.0], None, filters={"source": ["b.md", "c.md"]})
+    assert [source["source"] for source in sources] == ["b.md", "c.md"]
@@ -0,0 +1,99 @@
+# backend/tests/test_session_store.py
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import session_store
+from app.services.session_store import SessionStore, SqliteSessionBackend
+
+
+def _embedding(seed: int) -> np.ndarray:
+    vector = np.random.default_rng(seed).normal(size=16).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _sources(*ids: int):
+    return [{"id": i, "source": f"doc{i}.md", "content": f"chunk {i}", "score": 0.5} for i in ids]
+
+
+@pytest.mark.asyncio
+async def test_old_turns_are_folded_into_bounded_summary():
+    store = SessionStore(recent_turns=2, summary_max_chars=70)
+    for i in range(6):
+        await store.record_turn("s1", f"Pergunta {i}?", f"Resposta {i}. Detalhe longo que não vai para o resumo.",
+                          _sources(i), _embedding(i), "v1")
+    session = await store.get("s1")
+    assert [turn.question for turn in session.turns] == ["Pergunta 4?", "Pergunta 5?"]
+    assert "Detalhe longo" not in session.summary # Resumo extrativo: só a primeira frase
+    assert len(session.summary) <= 70
+    assert "Pergunta 3?" in session.summary and "Pergunta 0?" not in session.summary
+    assert session.chunk_ids[:2] == [5, 4] # Mais recentes primeiro
+    assert "Pergunta 5?" in session.context()
+
+
+@pytest.mark.asyncio
+async def test_store_evicts_least_recently_used_sessions():
+    store = SessionStore(max_sessions=2)
+    for session_id in ("a", "b"):
+        await store.record_turn(session_id, "Pergunta?", "Resposta.", _sources(1), _embedding(1), "v1")
+    await store.get("a") # "b" passa a ser a menos usada
+    await store.record_turn("c", "Pergunta?", "Resposta.", _sources(1), _embedding(1), "v1")
+    assert await store.get("b") is None
+    assert await store.get("a") is not None and await store.get("c") is not None
+    assert store.stats()["evictions"] == 1
+
+    store = SessionStore(max_session_bytes=2048)
+    session = await store.record_turn("big", "Pergunta?", "x" * 5000, [{"id": 1, "content": "y" * 5000}], None, "v1")
+    assert session.size_bytes() <= 2048
+    assert store.stats()["bytes"] == session.size_bytes()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_restores_evicted_sessions(tmp_path):
+    backend = SqliteSessionBackend(str(tmp_path / "sessions.db"))
+    store = SessionStore(backend=backend, max_sessions=1)
+    embedding = _embedding(7)
+    await store.record_turn("a", "O que é Supabase?", "Um BaaS.", _sources(3), embedding, "v1")
+    await store.record_turn("b", "Outra pergunta?", "Outra resposta.", _sources(4), None, "v1") # Tira "a" da memória
+
+    session = await store.get("a")
+    assert store.stats()["backend_hits"] == 1
+    assert session.turns[0].answer == "Um BaaS."
+    assert session.chunk_ids == [3]
+    assert session.similarity(embedding) > 0.99 # Embedding guardado em float16
+
+    await store.delete("a")
+    assert await store.get("a") is None
+    backend.close()
+
+
+@pytest.mark.asyncio
+async def test_backend_calls_run_off_the_event_loop():
+    class RecordingBackend(dict):
+        threads = set()
+
+        def get(self, name):
+            self.threads.add(threading.current_thread())
+            return super().get(name)
+
+        def set(self, name, value, ex=None):
+            self.threads.add(threading.current_thread())
+            self[name] = value
+
+    backend = RecordingBackend()
+    store = SessionStore(backend=backend, max_sessions=1)
+    await store.record_turn("a", "Pergunta?", "Resposta.", _sources(1), None, "v1")
+    await store.record_turn("b", "Pergunta?", "Resposta.", _sources(2), None, "v1")
+    assert (await store.get("a")).chunk_ids == [1] # Lida do backend
+    assert threading.current_thread() not in backend.threads
+
+
+def test_sqlite_backend_expires_keys(tmp_path, monkeypatch):
+    backend = SqliteSessionBackend(str(tmp_path / "sessions.db"))
+    backend.set("k", "v", ex=10)
+    assert backend.get("k") == "v"
+    now = session_store.time.time()
+    monkeypatch.setattr(session_store.time, "time", lambda: now + 11)
+    assert backend.get("k") is None
+    backend.close()
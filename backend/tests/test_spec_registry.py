@@ -0,0 +1,134 @@
+# backend/tests/test_spec_registry.py
+import asyncio
+import os
+import sys
+
+import pytest
+
+from app.services import guardrails_service, spec_registry
+from app.services.spec_registry import SpecRegistry
+
+SPEC_V1 = """
+from pydantic import BaseModel
+
+class ProductSpec(BaseModel):
+    code: str
+"""
+
+SPEC_V2 = SPEC_V1 + "    price: float\n"
+
+@pytest.fixture
+def specs_package(tmp_path, monkeypatch):
+    package_dir = tmp_path / "tmp_specs"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("")
+    (package_dir / "product_spec.py").write_text(SPEC_V1)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package_dir
+    for name in [m for m in sys.modules if m.startswith("tmp_specs")]:
+        del sys.modules[name]
+
+# --- Testes do registro de specs ---
+
+def test_registry_discovers_project_specs():
+    registry = SpecRegistry()
+    registry.load()
+    assert {"UserProfileSpec", "example_spec.rail"} <= set(registry.names())
+    spec = registry.get("UserProfileSpec")
+    assert spec.validate_fast('{"name": "Ana", "age": 31, "interests": ["IA"]}') == {"name": "Ana", "age": 31, "interests": ["IA"]}
+    assert spec.validate_fast('{"name": "Ana", "age": "muitos"}') is None
+
+def test_registry_hot_reloads_changed_spec(specs_package):
+    registry = SpecRegistry(str(specs_package), package="tmp_specs")
+    registry.load()
+    assert registry.get("ProductSpec").validate_fast('{"code": "X-1"}') == {"code": "X-1"}
+    assert registry.refresh() is False # Nada mudou: apenas stat dos arquivos
+
+    spec_file = specs_package / "product_spec.py"
+    spec_file.write_text(SPEC_V2)
+    stat = os.stat(spec_file)
+    os.utime(spec_file, (stat.st_atime, stat.st_mtime + 5))
+    assert registry.refresh() is True
+    assert registry.get("ProductSpec").validate_fast('{"code": "X-1"}') is None # 'price' agora é obrigatório
+
+    spec_file.unlink()
+    registry.refresh()
+    assert registry.get("ProductSpec") is None
+
+@pytest.mark.asyncio
+async def test_invalid_output_goes_through_guard(monkeypatch):
+    async def invalid_llm_output(prompt, spec):
+        return '{"name": "Sem idade"}'
+
+    guard_calls = []
+
+    class FakeOutcome:
+        validation_passed = False
+        error = "age ausente"
+
+    class FakeGuard:
+        async def parse(self, raw_output, num_reasks):
+            guard_calls.append(num_reasks)
+            return FakeOutcome()
+
+    monkeypatch.setattr(guardrails_service, "_call_llm", invalid_llm_output)
+    monkeypatch.setattr(spec_registry.get_registry().get("UserProfileSpec"), "guard", FakeGuard())
+    with pytest.raises(guardrails_service.GuardrailsValidationError):
+        await guardrails_service.generate_and_validate("prompt", "UserProfileSpec", num_reasks=2)
+    assert guard_calls == [2]
+
+# --- Modo multi-candidato ---
+
+def test_incremental_validator_aborts_on_first_invalid_field():
+    validator = guardrails_service.IncrementalValidator(spec_registry.get_registry().get("UserProfileSpec"))
+    assert validator.feed('{"name": "Ana, a \\"rápida\\"", ') is None
+    assert "age" in validator.feed('"age": 200, "interests": [')
+    assert guardrails_service.IncrementalValidator(spec_registry.get_registry().get("UserProfileSpec")).feed("Claro! {") is not None
+
+@pytest.mark.asyncio
+async def test_parallel_candidates_return_first_valid_and_cancel_rest(monkeypatch):
+    closed = []
+
+    async def candidate_stream(prompt, spec, candidate):
+        try:
+            if candidate == 0: # Condenado já no segundo campo
+                for chunk in ('{"name": "A", ', '"age": -1, ', '"interests": []}'):
+                    await asyncio.sleep(0.01)
+                    yield chunk
+            elif candidate == 1: # Válido e rápido
+                await asyncio.sleep(0.05)
+                yield '{"name": "Bia", "age": 28, "interests": ["IA"]}'
+            else: # Lento: deve ser cancelado
+                await asyncio.sleep(10)
+                yield "{}"
+        finally:
+            closed.append(candidate)
+
+    monkeypatch.setattr(guardrails_service, "_stream_llm", candidate_stream)
+    data, usage = await guardrails_service.generate_and_validate_with_usage(
+        "prompt", "UserProfileSpec", num_candidates=3)
+    assert data == {"name": "Bia", "age": 28, "interests": ["IA"]}
+    assert usage["winner"] == 1
+    assert (usage["candidates"], usage["completed"], usage["aborted_early"], usage["cancelled"]) == (3, 1, 1, 1)
+    assert usage["completion_tokens"] > 0
+    assert sorted(closed) == [0, 1, 2] # Todos os streams fechados (geração interrompida)
+
+@pytest.mark.asyncio
+async def test_stream_emits_each_field_before_the_llm_finishes(monkeypatch):
+    release = asyncio.Event()
+
+    async def slow_stream(prompt, spec, candidate):
+        yield '{"name": "Ana", '
+        await release.wait() # O resto só chega depois que o primeiro campo foi lido
+        yield '"age": 31, "interests": ["IA"]}'
+
+    monkeypatch.setattr(guardrails_service, "_stream_llm", slow_stream)
+    events = guardrails_service.stream_generate_and_validate("prompt", "UserProfileSpec")
+    first = await asyncio.wait_for(anext(events), timeout=1)
+    assert first == {"type": "field", "name": "name", "value": "Ana"}
+    assert not release.is_set()
+
+    release.set()
+    rest = [event async for event in events]
+    assert [(e["name"], e["value"]) for e in rest if e["type"] == "field"] == [("age", 31), ("interests", ["IA"])]
+    assert rest[-1] == {"type": "done", "validated_data": {"name": "Ana", "age": 31, "interests": ["IA"]}}
@@ -0,0 +1,31 @@
+# backend/tests/test_startup.py
+import json
+import os
+import subprocess
+import sys
+
+# Pacotes que não podem ser importados por `import app.main` (só sob demanda, via app/lazy.py)
+HEAVY_PACKAGES = ["numpy", "torch", "transformers", "sentence_transformers", "crewai", "crewai_tools",
+                  "langchain", "langchain_core", "guardrails", "chromadb", "litellm", "openai", "asyncpg"]
+# Orçamento de tempo para `import app.main` em um processo novo (segundos)
+IMPORT_BUDGET_SECONDS = float(os.getenv("APP_IMPORT_BUDGET_SECONDS", "2.0"))
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": sorted({name.split('.')[0] for name in sys.modules})}))
+"""
+
+def _import_app_main() -> dict:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", _PROBE], cwd=backend_dir, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_import_app_main_is_cheap():
+    probe = _import_app_main()
+    eager = [name for name in HEAVY_PACKAGES if name in probe["modules"]]
+    assert eager == [], f"`import app.main` carregou pacotes pesados de forma eager: {eager}"
+    assert probe["seconds"] < IMPORT_BUDGET_SECONDS, \
+        f"`import app.main` levou {probe['seconds']:.2f}s (orçamento: {IMPORT_BUDGET_SECONDS}s)"
@@ -0,0 +1,83 @@
+# backend/tests/test_telemetry.py
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from app import telemetry
+from app.main import app
+
+
+@pytest.fixture(scope="function")
+async def async_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = telemetry.MetricsRegistry().histogram("test_seconds", "Teste.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    text = "\n".join(histogram.render())
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'test_seconds_count{stage="a"} 2' in text
+
+
+def test_span_records_stage_duration():
+    with telemetry.span("test.stage"):
+        time.sleep(0.01)
+    assert telemetry.STAGE_SECONDS.count(stage="test.stage") == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_route_latency(async_client: AsyncClient):
+    assert (await async_client.get("/api/v1/ping")).status_code == 200
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Agrupado pelo template da rota, não pelo path da requisição
+    assert 'http_request_duration_seconds_count{route="/api/v1/ping",method="GET",status="200"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_unknown_id(async_client: AsyncClient):
+    assert (await async_client.get("/metrics/profiles/desconhecido")).status_code == 404
+
+
+def test_sampling_profiler_collects_target_thread_stacks():
+    done = threading.Event()
+
+    def busy_target():
+        while not done.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_target)
+    worker.start()
+    profiler = telemetry.SamplingProfiler(worker.ident, interval=0.001)
+    profiler.start()
+    time.sleep(0.05)
+    collapsed = profiler.stop()
+    done.set()
+    worker.join()
+    assert "busy_target (test_telemetry.py:" in collapsed
+
+
+@pytest.mark.asyncio
+async def test_profiled_request_stops_sampler_off_the_event_loop(async_client: AsyncClient, monkeypatch):
+    stopped_on = []
+    original_stop = telemetry.SamplingProfiler.stop
+
+    def recording_stop(self):
+        stopped_on.append(threading.get_ident())
+        return original_stop(self)
+
+    monkeypatch.setattr(telemetry, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(telemetry.SamplingProfiler, "stop", recording_stop)
+    response = await async_client.get("/api/v1/ping", headers={"X-Profile": "1"})
+    assert stopped_on and stopped_on[0] != threading.get_ident() # join do sampler não bloqueia o loop
+    profile_id = response.headers["x-profile-id"]
+    assert (await async_client.get(f"/metrics/profiles/{profile_id}")).status_code == 200
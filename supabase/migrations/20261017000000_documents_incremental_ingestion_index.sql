@@ -0,0 +1,8 @@
+-- Reindexação incremental (backend/app/services/ingestion_pipeline.py)
+
+-- Cada chunk gravado pela ingestão leva no metadata a sua origem ('source_id') e o hash do seu
+-- texto normalizado ('content_hash'). Ao reindexar, os chunks órfãos de uma origem alterada e as
+-- origens removidas são apagados em lote por essas chaves. Linhas antigas, gravadas sem 'source_id',
+-- são reconhecidas pelo 'source' (mesma expressão usada nos DELETEs do PostgresSink).
+CREATE INDEX IF NOT EXISTS documents_source_content_hash_idx ON public.documents
+  ((coalesce(metadata->>'source_id', metadata->>'source')), (metadata->>'content_hash'));